@@ -1,6 +1,5 @@
 from django.shortcuts import render
 from django.contrib.auth.decorators import login_required
-from django.contrib.auth.models import User
 from django.shortcuts import redirect
 from django.contrib.auth import logout
 
@@ -26,9 +25,9 @@ def edit_details(request):
 
 @login_required
 def delete_user(request):
-    user = User.objects.get(user_name=request.user)
+    user = request.user
     user.is_active = False
-    user.save()
+    user.save(update_fields=['is_active'])
     logout(request)
     return redirect('account:delete_confirmation')
 
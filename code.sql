@@ -139,4 +139,222 @@ FROM products
 JOIN manufacturers ON products.manufacturer_id = manufacturers.id
 JOIN product_type ON products.product_type_id = product_type.id;
 
-SELECT * FROM sum_price_view;
\ No newline at end of file
+SELECT * FROM sum_price_view;
+
+-- сводка стоимости товара, которая поддерживается триггером:
+-- по производителям и по типам товара; общей строки нет -- ее обновляла бы
+-- каждая транзакция с товаром, итог считается суммой строк производителей
+CREATE TABLE inventory_valuation (
+	id bigserial PRIMARY KEY,
+	scope varchar(16) NOT NULL,
+	scope_id bigint NOT NULL,
+	products_count bigint NOT NULL DEFAULT 0,
+	total_count bigint NOT NULL DEFAULT 0,
+	total_price numeric NOT NULL DEFAULT 0,
+	UNIQUE (scope, scope_id)
+);
+
+CREATE OR REPLACE FUNCTION inventory_valuation_add(
+	scope_data varchar, scope_id_data bigint,
+	products_data bigint, count_data bigint, price_data numeric
+)
+RETURNS void AS $$
+	INSERT INTO inventory_valuation AS iv (scope, scope_id, products_count, total_count, total_price)
+	VALUES (scope_data, scope_id_data, products_data, count_data, price_data)
+	ON CONFLICT (scope, scope_id) DO UPDATE
+	SET products_count = iv.products_count + EXCLUDED.products_count,
+		total_count = iv.total_count + EXCLUDED.total_count,
+		total_price = iv.total_price + EXCLUDED.total_price;
+$$ LANGUAGE 'sql';
+
+CREATE OR REPLACE FUNCTION inventory_valuation_update()
+    RETURNS trigger
+    LANGUAGE 'plpgsql'
+AS $BODY$
+BEGIN
+	IF TG_OP IN ('UPDATE', 'DELETE') THEN
+		PERFORM inventory_valuation_add('manufacturer', old.manufacturer_id, -1, -old.count, -old.count * old.price);
+		PERFORM inventory_valuation_add('product_type', old.product_type_id, -1, -old.count, -old.count * old.price);
+	END IF;
+	IF TG_OP IN ('INSERT', 'UPDATE') THEN
+		PERFORM inventory_valuation_add('manufacturer', new.manufacturer_id, 1, new.count, new.count * new.price);
+		PERFORM inventory_valuation_add('product_type', new.product_type_id, 1, new.count, new.count * new.price);
+	END IF;
+	RETURN NULL;
+END;
+$BODY$;
+CREATE TRIGGER inventory_valuation_trigger
+AFTER INSERT OR DELETE OR UPDATE OF count, price, manufacturer_id, product_type_id ON products
+FOR EACH ROW EXECUTE FUNCTION inventory_valuation_update();
+
+-- первоначальное заполнение сводки по уже существующему товару
+INSERT INTO inventory_valuation (scope, scope_id, products_count, total_count, total_price)
+SELECT 'manufacturer', manufacturer_id, COUNT(*), SUM(count), SUM(count * price)
+FROM products GROUP BY manufacturer_id
+UNION ALL
+SELECT 'product_type', product_type_id, COUNT(*), SUM(count), SUM(count * price)
+FROM products GROUP BY product_type_id;
+
+-- общая сумма и сумма по производителю читаются из сводки, а не считаются заново
+CREATE OR REPLACE PROCEDURE sum_count_price(inout total_price numeric DEFAULT NULL)
+LANGUAGE 'plpgsql'
+AS $$
+BEGIN
+	total_price := (SELECT COALESCE(SUM(iv.total_price), 0) FROM inventory_valuation AS iv
+				   WHERE iv.scope = 'manufacturer');
+END;
+$$;
+
+CREATE OR REPLACE PROCEDURE sum_count_price_manufactur(in manufactur_id int, inout total_price numeric DEFAULT NULL)
+LANGUAGE 'plpgsql'
+AS $$
+BEGIN
+	total_price := (SELECT iv.total_price FROM inventory_valuation AS iv
+				   WHERE iv.scope = 'manufacturer' AND iv.scope_id = manufactur_id);
+END;
+$$;
+
+SELECT SUM(total_count), SUM(total_price) FROM inventory_valuation WHERE scope = 'manufacturer';
+
+
+-- пересчет цены со скидкой только при изменении цены или скидки,
+-- а не при любом UPDATE (например, изменении количества товара)
+DROP TRIGGER price_with_discount_update_trigger ON products;
+CREATE TRIGGER price_with_discount_update_trigger BEFORE UPDATE OF price, discount_id ON products
+FOR EACH ROW EXECUTE FUNCTION price_with_discount_update();
+
+-- характеристики товара одним запросом вместо построчного цикла
+CREATE OR REPLACE FUNCTION data_value_product(id_product int)
+RETURNS TABLE (
+	name text,
+	value text
+) AS $$
+	SELECT td.name, tdv.value
+	FROM product_technical_data_value AS tdv
+	JOIN product_technical_data AS td ON tdv.technical_data_id = td.id
+	WHERE tdv.product_id = id_product
+	ORDER BY tdv.id;
+$$ LANGUAGE 'sql' STABLE;
+
+-- полнотекстовый поиск по товару: tsvector с русской морфологией,
+-- который собирается из названия, описания и значений характеристик
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE OR REPLACE FUNCTION product_search_vector(name_data text, description_data text, id_product bigint)
+RETURNS tsvector AS $$
+	SELECT setweight(to_tsvector('russian', coalesce(name_data, '')), 'A')
+		|| setweight(to_tsvector('russian', coalesce(description_data, '')), 'B')
+		|| setweight(to_tsvector('russian', coalesce(
+			(SELECT string_agg(tdv.value, ' ') FROM product_technical_data_value AS tdv
+			 WHERE tdv.product_id = id_product), '')), 'C');
+$$ LANGUAGE 'sql' STABLE;
+
+CREATE OR REPLACE FUNCTION products_search_vector_update()
+    RETURNS trigger
+    LANGUAGE 'plpgsql'
+AS $BODY$
+BEGIN
+	new.search_vector = product_search_vector(new.name, new.description, new.id);
+	RETURN new;
+END;
+$BODY$;
+CREATE TRIGGER products_search_vector_trigger BEFORE INSERT OR UPDATE OF name, description ON products
+FOR EACH ROW EXECUTE FUNCTION products_search_vector_update();
+
+-- при изменении характеристик tsvector пересчитывается один раз на товар за запрос
+CREATE OR REPLACE FUNCTION product_values_search_vector_update()
+    RETURNS trigger
+    LANGUAGE 'plpgsql'
+AS $BODY$
+BEGIN
+	UPDATE products
+	SET search_vector = product_search_vector(products.name, products.description, products.id)
+	WHERE products.id IN (SELECT DISTINCT product_id FROM changed_values);
+	RETURN NULL;
+END;
+$BODY$;
+CREATE TRIGGER product_values_search_insert_trigger AFTER INSERT ON product_technical_data_value
+REFERENCING NEW TABLE AS changed_values
+FOR EACH STATEMENT EXECUTE FUNCTION product_values_search_vector_update();
+CREATE TRIGGER product_values_search_update_trigger AFTER UPDATE ON product_technical_data_value
+REFERENCING NEW TABLE AS changed_values
+FOR EACH STATEMENT EXECUTE FUNCTION product_values_search_vector_update();
+CREATE TRIGGER product_values_search_delete_trigger AFTER DELETE ON product_technical_data_value
+REFERENCING OLD TABLE AS changed_values
+FOR EACH STATEMENT EXECUTE FUNCTION product_values_search_vector_update();
+
+-- нечеткий поиск по названию (оператор % из pg_trgm)
+CREATE INDEX products_name_trgm_idx ON products USING gin (name gin_trgm_ops);
+
+-- заполнение tsvector для уже существующего товара
+UPDATE products SET search_vector = product_search_vector(name, description, id);
+
+
+-- цена со скидкой считается по новой скидке (раньше бралась old.discount_id),
+-- а если запрос сам записал price_discount (пересчет в store.pricing одним UPDATE),
+-- триггер ее не пересчитывает и не делает подзапрос на каждую строку
+CREATE OR REPLACE FUNCTION price_with_discount_update()
+    RETURNS trigger
+    LANGUAGE 'plpgsql'
+AS $BODY$
+BEGIN
+    IF new.price_discount IS DISTINCT FROM old.price_discount THEN
+        RETURN new;
+    END IF;
+    IF new.discount_id IS NOT NULL THEN
+        new.price_discount = round(new.price - new.price * (SELECT amount FROM discount WHERE discount.id = new.discount_id)::numeric / 100, 2);
+    ELSE
+        new.price_discount = new.price;
+    END IF;
+    RETURN new;
+END;
+$BODY$;
+
+-- пересчет цены товара для уже измененных скидок
+UPDATE products SET price_discount = round(price - price * discount.amount::numeric / 100, 2)
+FROM discount
+WHERE products.discount_id = discount.id
+  AND products.price_discount <> round(price - price * discount.amount::numeric / 100, 2);
+
+
+-- журнал изменений товара для внешних систем (таблица product_changes создается
+-- миграцией Django): создание, изменение, изменение количества и удаление,
+-- в том числе массовыми UPDATE и процедурой del_product
+CREATE OR REPLACE FUNCTION product_changes_log()
+    RETURNS trigger
+    LANGUAGE 'plpgsql'
+AS $BODY$
+DECLARE
+    action_data varchar(16);
+    new_data jsonb;
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        INSERT INTO product_changes (product_id, action, data, transaction_id, changed_in)
+        VALUES (old.id, 'delete', NULL, txid_current(), now());
+        RETURN NULL;
+    END IF;
+
+    new_data := to_jsonb(new) - 'search_vector';
+    IF TG_OP = 'INSERT' THEN
+        action_data := 'create';
+    ELSIF new_data - 'count' - 'updated_in' = to_jsonb(old) - 'search_vector' - 'count' - 'updated_in' THEN
+        -- изменилось только количество (или ничего, например только search_vector)
+        IF new.count = old.count THEN
+            RETURN NULL;
+        END IF;
+        action_data := 'stock';
+    ELSE
+        action_data := 'update';
+    END IF;
+
+    INSERT INTO product_changes (product_id, action, data, transaction_id, changed_in)
+    VALUES (new.id, action_data, new_data, txid_current(), now());
+    RETURN NULL;
+END;
+$BODY$;
+CREATE TRIGGER product_changes_trigger
+AFTER INSERT OR UPDATE OR DELETE ON products
+FOR EACH ROW EXECUTE FUNCTION product_changes_log();
+
+-- поиск производителя по части названия в формах товара (store.choices, icontains)
+CREATE INDEX manufacturers_name_trgm_idx ON manufacturers USING gin (upper(name) gin_trgm_ops);
@@ -42,6 +42,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'bootstrap5',
     'store.apps.StoreConfig',
     'account.apps.AccountConfig',
@@ -49,10 +50,12 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
-    'django.contrib.sessions.middleware.SessionMiddleware',
+    'store.sessions.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'store.metrics.RequestMetricsMiddleware',
+    'store.routers.ReplicaStickinessMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -61,7 +64,7 @@ ROOT_URLCONF = 'core.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'store.metrics.TimedDjangoTemplates',
         'DIRS': [os.path.join(BASE_DIR, 'templates')],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -82,17 +85,81 @@ WSGI_APPLICATION = 'core.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/4.1/ref/settings/#databases
 
+# Соединения берутся из пула процесса (store.backends.postgresql) и в конце
+# запроса возвращаются в него. Всего соединений с БД может быть до
+# DB_POOL_SIZE на каждый процесс сервера. При DB_POOL_SIZE = 0 пул выключен,
+# тогда соединение потока живет DB_CONN_MAX_AGE секунд.
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql',
+        'ENGINE': 'store.backends.postgresql',
         'NAME': os.getenv('DB_NAME'),
         'USER': os.getenv('DB_USER'),
         'PASSWORD': os.getenv('DB_USER_PASSWORD'),
         'HOST': os.getenv('DB_HOST'),
         'PORT': os.getenv('DB_DB_PORT'),
+        'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE') or 0),
+        'CONN_HEALTH_CHECKS': os.getenv('DB_CONN_HEALTH_CHECKS', '1') != '0',
+        'POOL': {
+            'SIZE': int(os.getenv('DB_POOL_SIZE') or 10),
+            # сколько секунд ждать свободное соединение
+            'TIMEOUT': float(os.getenv('DB_POOL_TIMEOUT') or 10),
+            # соединение старше (секунд) закрывается при возврате в пул
+            'MAX_LIFETIME': int(os.getenv('DB_POOL_MAX_LIFETIME') or 1800),
+            # свободное соединение закрывается после простоя (секунд)
+            'MAX_IDLE': int(os.getenv('DB_POOL_MAX_IDLE') or 600),
+            # после простоя (секунд) соединение проверяется запросом SELECT 1
+            'CHECK_IDLE': int(os.getenv('DB_POOL_CHECK_IDLE') or 30),
+        },
     }
 }
 
+# Реплика для отчетов (store.routers): тяжелые отчеты читают с нее,
+# запись и остальное чтение идут в основную БД. Для проверки на одной
+# машине достаточно второй локальной БД (DB_REPLICA_NAME).
+if os.getenv('DB_REPLICA_HOST') or os.getenv('DB_REPLICA_NAME'):
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'NAME': os.getenv('DB_REPLICA_NAME') or DATABASES['default']['NAME'],
+        'HOST': os.getenv('DB_REPLICA_HOST') or DATABASES['default']['HOST'],
+        'PORT': os.getenv('DB_REPLICA_PORT') or DATABASES['default']['PORT'],
+        'TEST': {'MIRROR': 'default'},
+    }
+
+DATABASE_ROUTERS = ['store.routers.ReplicaRouter']
+STORE_REPLICA_DATABASES = [alias for alias in DATABASES if alias != 'default']
+# сколько секунд после записи пользователь читает с основной БД
+STORE_REPLICA_STICKY_SECONDS = int(os.getenv('STORE_REPLICA_STICKY_SECONDS') or 5)
+
+# токен внешних систем для чтения журнала изменений товара (store.changes),
+# без него журнал доступен только сотрудникам
+STORE_CHANGES_TOKEN = os.getenv('STORE_CHANGES_TOKEN') or None
+
+
+# Cache
+# https://docs.djangoproject.com/en/4.1/topics/cache/
+
+# общий кэш для всех процессов сервера (Redis), без него кэш в памяти процесса
+if os.getenv('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.getenv('REDIS_URL'),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+
+# Замеры запросов (store.metrics)
+# порог медленного SQL-запроса в мс, такие запросы пишутся в лог store.slow_query
+STORE_SLOW_QUERY_MS = float(os.getenv('STORE_SLOW_QUERY_MS')) if os.getenv('STORE_SLOW_QUERY_MS') else None
+# как часто процесс переносит накопленные замеры в общий кэш, в секундах
+STORE_METRICS_FLUSH_INTERVAL = 10
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.1/ref/settings/#auth-password-validators
@@ -142,6 +209,14 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media/')
 MEDIA_URL = '/media/'
 
+# Фоновые задачи (store.queue) выполняет команда run_tasks,
+# True -- выполнять задачи сразу в процессе сервера (без воркера)
+STORE_TASKS_EAGER = False
+
+# Сессии и пользователь читаются из кэша, в БД -- только изменения (store.sessions)
+SESSION_ENGINE = 'store.sessions'
+AUTHENTICATION_BACKENDS = ['store.sessions.CachedModelBackend']
+
 LOGIN_REDIRECT_URL = '/account/dashboard'
 LOGIN_URL = '/account/login/'
 
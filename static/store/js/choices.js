@@ -0,0 +1,124 @@
+// Подгрузка вариантов больших списков выбора (store.choices.LazySelect)
+// и параметров характеристик для выбранного типа товара.
+
+var storeChoices = (function() {
+    var MORE = '__more__';
+
+    function fetchPage(url, params) {
+        return fetch(url + '?' + new URLSearchParams(params), {
+            headers: {'X-Requested-With': 'XMLHttpRequest'}
+        }).then(function(response) { return response.json(); });
+    }
+
+    function addOption(select, value, text) {
+        var option = document.createElement('option');
+        option.value = value;
+        option.textContent = text;
+        select.appendChild(option);
+        return option;
+    }
+
+    // список с поиском: в форме выводится только выбранный вариант,
+    // остальные загружаются по страницам
+    function lazySelect(select) {
+        var search = document.createElement('input');
+        search.type = 'search';
+        search.className = 'form-control form-control-sm mb-1';
+        search.placeholder = 'Поиск';
+        select.parentNode.insertBefore(search, select);
+
+        var state = {q: '', page: 1, loaded: false, timer: null};
+
+        function load(append) {
+            fetchPage(select.dataset.choicesUrl, {q: state.q, page: state.page}).then(function(data) {
+                var selected = select.value;
+                Array.from(select.options).forEach(function(option) {
+                    if (option.value === MORE || (!append && option.value && option.value !== selected)) {
+                        option.remove();
+                    }
+                });
+                data.results.forEach(function(item) {
+                    if (String(item.id) !== selected) {
+                        addOption(select, item.id, item.text);
+                    }
+                });
+                if (data.more) {
+                    addOption(select, MORE, 'Показать еще...');
+                }
+                state.loaded = true;
+            });
+        }
+
+        select.addEventListener('focus', function() {
+            if (!state.loaded) {
+                load(false);
+            }
+        });
+        search.addEventListener('input', function() {
+            clearTimeout(state.timer);
+            state.timer = setTimeout(function() {
+                state.q = search.value;
+                state.page = 1;
+                load(false);
+            }, 300);
+        });
+
+        var previous = select.value;
+        select.addEventListener('change', function() {
+            if (select.value === MORE) {
+                select.value = previous;
+                state.page += 1;
+                load(true);
+            } else {
+                previous = select.value;
+            }
+        });
+    }
+
+    // параметры характеристик зависят от типа товара
+    var technicalData = null;
+
+    function fillTechnicalData(root) {
+        if (technicalData === null) {
+            return;
+        }
+        root.querySelectorAll('select[name$="-technical_data"]').forEach(function(select) {
+            var selected = select.value;
+            var empty = select.options.length ? select.options[0].textContent : '';
+            select.innerHTML = '';
+            addOption(select, '', empty);
+            technicalData.forEach(function(item) {
+                addOption(select, item.id, item.text);
+            });
+            select.value = selected;
+        });
+    }
+
+    function loadTechnicalData(url, productType, results, page) {
+        return fetchPage(url, {product_type: productType, page: page}).then(function(data) {
+            results = results.concat(data.results);
+            return data.more ? loadTechnicalData(url, productType, results, page + 1) : results;
+        });
+    }
+
+    function bindTechnicalData(productType, table) {
+        productType.addEventListener('change', function() {
+            loadTechnicalData(table.dataset.technicalDataUrl, productType.value, [], 1).then(function(results) {
+                technicalData = results;
+                fillTechnicalData(table);
+            });
+        });
+    }
+
+    document.addEventListener('DOMContentLoaded', function() {
+        document.querySelectorAll('select[data-choices-url]').forEach(lazySelect);
+
+        var productType = document.getElementById('id_product_type');
+        var table = document.querySelector('[data-technical-data-url]');
+        if (productType && table) {
+            bindTechnicalData(productType, table);
+        }
+    });
+
+    return {fillTechnicalData: fillTechnicalData};
+})();
@@ -1,22 +1,32 @@
 from django.contrib import admin
+from django.contrib.postgres.search import SearchQuery
+from django.db import connection
+from django.db.models import Q
+from django.utils import timezone
 
 from .models import (
     Category, Manufacturer, Product, ProductImage,
-    ProductTechnicalData, ProductTechnicalDataValue, ProductType, Discount
+    ProductTechnicalData, ProductTechnicalDataValue, ProductType, Discount,
+    ProductChange, StockMovement, Task
 )
+from .pagination import EstimatedCountPaginator
+from .search import SEARCH_CONFIG
 
 @admin.register(Discount)
 class DiscountAdmin(admin.ModelAdmin):
     list_display = ['amount', 'reason']
+    search_fields = ['reason']
 
 @admin.register(Category)
 class CatygoryAdmin(admin.ModelAdmin):
     list_display = ['name', 'slug',]
     prepopulated_fields = {'slug': ('name',)}
+    search_fields = ['name']
 
 @admin.register(Manufacturer)
 class ManufacturerAdmin(admin.ModelAdmin):
     list_display = ['name', 'country',]
+    search_fields = ['name']
 
 class ProductTechnicalDataInline(admin.TabularInline):
     model = ProductTechnicalData
@@ -24,16 +34,91 @@ class ProductTechnicalDataInline(admin.TabularInline):
 @admin.register(ProductType)
 class ProductTypeAdmin(admin.ModelAdmin):
     inlines = [ProductTechnicalDataInline,]
+    search_fields = ['name']
+
+@admin.register(ProductTechnicalData)
+class ProductTechnicalDataAdmin(admin.ModelAdmin):
+    list_display = ['name', 'product_type', 'value_type', 'unit']
+    list_select_related = ['product_type']
+    list_filter = ['product_type']
+    search_fields = ['name']
 
 class ProductImageInline(admin.TabularInline):
     model = ProductImage
+    extra = 0
 
 class ProductTechnicalDataValueInline(admin.TabularInline):
     model = ProductTechnicalDataValue
+    autocomplete_fields = ['technical_data']
+    extra = 0
 
 @admin.register(Product)
 class ProductAdmin(admin.ModelAdmin):
-    """Модель Продукта в админ панеле"""
+    """Модель Продукта в админ панеле.
+
+    Список рассчитан на большой каталог: связанные таблицы читаются
+    одним JOIN, фильтры и порядок совпадают с индексами products,
+    общее число строк без фильтров -- оценка из статистики PostgreSQL.
+    """
     list_display = ['name', 'category', 'product_type', 'price', 'warranty', 'is_active', 'count']
-    list_filter = ['is_active',]
-    inlines = [ProductTechnicalDataValueInline, ProductImageInline,]
\ No newline at end of file
+    list_select_related = ['category', 'product_type']
+    list_filter = ['is_active', 'category', 'product_type']
+    search_fields = ['name']
+    autocomplete_fields = ['category', 'product_type', 'manufacturer', 'discount']
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    inlines = [ProductTechnicalDataValueInline, ProductImageInline,]
+
+    def get_search_results(self, request, queryset, search_term):
+        # поиск по products.search_vector (индекс GIN), а не ILIKE по всей таблице
+        if connection.vendor != 'postgresql' or not search_term.strip():
+            return super().get_search_results(request, queryset, search_term)
+        condition = Q(search_vector=SearchQuery(search_term, config=SEARCH_CONFIG, search_type='websearch'))
+        if search_term.strip().isdigit():
+            condition |= Q(pk=int(search_term))
+        return queryset.filter(condition), False
+
+@admin.register(StockMovement)
+class StockMovementAdmin(admin.ModelAdmin):
+    """Журнал изменений количества товара (только просмотр)"""
+    # журнал большой: вместо JOIN с products выводится id товара
+    list_display = ['product_id', 'delta', 'count_after', 'reason', 'user', 'created_in']
+    list_select_related = ['user']
+    raw_id_fields = ['product']
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+@admin.register(ProductChange)
+class ProductChangeAdmin(admin.ModelAdmin):
+    """Журнал изменений товара для внешних систем (только просмотр)"""
+    list_display = ['product_id', 'action', 'changed_in', 'transaction_id']
+    list_filter = ['action']
+    search_fields = ['=product_id']
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+@admin.register(Task)
+class TaskAdmin(admin.ModelAdmin):
+    """Очередь фоновых задач"""
+    list_display = ['name', 'status', 'priority', 'attempts', 'run_after', 'created_in', 'finished_in']
+    list_filter = ['status', 'name']
+    readonly_fields = ['started_in', 'finished_in', 'last_error']
+    actions = ['retry']
+
+    @admin.action(description='Повторить выбранные задачи')
+    def retry(self, request, queryset):
+        updated = queryset.exclude(status=Task.RUNNING).update(
+            status=Task.QUEUED, attempts=0, run_after=timezone.now(), finished_in=None
+        )
+        self.message_user(request, f'Поставлено в очередь задач: {updated}')
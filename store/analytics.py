@@ -0,0 +1,121 @@
+from django.core.cache import cache
+from django.db.models import Avg, Count, F, Max, Min, Sum
+
+from .caching import CATALOG_VERSION, INVENTORY_VERSION, fragment_key, get_versions
+from .models import Product
+from .routers import get_read_connection
+
+# сводка кэшируется по версиям, срок ограничивает отставание реплики
+ANALYTICS_TIMEOUT = 5 * 60
+
+# разрезы сводки: имя -> (поле товара, поле названия)
+DIMENSIONS = {
+    'manufacturer': ('manufacturer_id', 'manufacturer__name'),
+    'category': ('category_id', 'category__name'),
+    'product_type': ('product_type_id', 'product_type__name'),
+}
+METRICS = (
+    'products', 'units', 'stock_value', 'avg_price', 'min_price', 'max_price', 'discounted_value'
+)
+
+# все разрезы и общий итог одним проходом по products (GROUPING SETS);
+# GROUPING(...) -- битовая маска: 0b011 -- производитель, 0b101 -- категория,
+# 0b110 -- тип товара, 0b111 -- общий итог
+ANALYTICS_SQL = '''
+SELECT GROUPING(p.manufacturer_id, p.category_id, p.product_type_id),
+       p.manufacturer_id, m.name, p.category_id, c.name, p.product_type_id, t.name,
+       COUNT(*), COALESCE(SUM(p.count), 0), COALESCE(SUM(p.price * p.count), 0),
+       ROUND(AVG(p.price), 2), MIN(p.price), MAX(p.price),
+       COALESCE(SUM(p.price_discount * p.count), 0)
+FROM products AS p
+JOIN manufacturers AS m ON m.id = p.manufacturer_id
+JOIN categorys AS c ON c.id = p.category_id
+JOIN product_type AS t ON t.id = p.product_type_id
+WHERE p.is_active
+GROUP BY GROUPING SETS (
+    (p.manufacturer_id, m.name), (p.category_id, c.name), (p.product_type_id, t.name), ()
+)
+'''
+GROUPING_DIMENSIONS = {0b011: 'manufacturer', 0b101: 'category', 0b110: 'product_type'}
+
+
+def _empty_analytics():
+    return {'total': dict.fromkeys(METRICS), **{name: [] for name in DIMENSIONS}}
+
+
+def _sort(analytics):
+    for name in DIMENSIONS:
+        analytics[name].sort(key=lambda row: (-row['stock_value'], row['name']))
+    return analytics
+
+
+def _compute_grouping_sets(connection):
+    analytics = _empty_analytics()
+    with connection.cursor() as cursor:
+        cursor.execute(ANALYTICS_SQL)
+        for row in cursor.fetchall():
+            metrics = dict(zip(METRICS, row[7:]))
+            name = GROUPING_DIMENSIONS.get(row[0])
+            if name is None:
+                analytics['total'] = metrics
+                continue
+            index = 1 + 2 * list(DIMENSIONS).index(name)
+            analytics[name].append({'id': row[index], 'name': row[index + 1], **metrics})
+    return analytics
+
+
+def _metric_aggregates():
+    return {
+        'products': Count('id'),
+        'units': Sum('count'),
+        'stock_value': Sum(F('price') * F('count')),
+        'avg_price': Avg('price'),
+        'min_price': Min('price'),
+        'max_price': Max('price'),
+        'discounted_value': Sum(F('price_discount') * F('count')),
+    }
+
+
+def _compute_by_orm(alias):
+    """Та же сводка отдельным запросом на разрез (для СУБД без GROUPING SETS)"""
+    products = Product.products.using(alias)
+    analytics = _empty_analytics()
+    analytics['total'] = products.aggregate(**_metric_aggregates())
+    for name, (field, name_field) in DIMENSIONS.items():
+        rows = products.order_by().values(field, name_field).annotate(**_metric_aggregates())
+        analytics[name] = [
+            {'id': row[field], 'name': row[name_field], **{m: row[m] for m in METRICS}}
+            for row in rows
+        ]
+    return analytics
+
+
+def compute_analytics():
+    """Сводка по товару в наличии для каждого производителя, категории и типа товара.
+
+    Для каждой строки: число позиций, единиц, стоимость запаса,
+    средняя, минимальная и максимальная цена и стоимость со скидкой.
+    Возвращает {'total': {...}, 'manufacturer': [...], 'category': [...],
+    'product_type': [...]}, строки разрезов -- по убыванию стоимости.
+    """
+    connection = get_read_connection()
+    if connection.vendor == 'postgresql':
+        analytics = _compute_grouping_sets(connection)
+    else:
+        analytics = _compute_by_orm(connection.alias)
+    for row in (analytics['total'], *[r for name in DIMENSIONS for r in analytics[name]]):
+        for metric in ('units', 'stock_value', 'discounted_value'):
+            row[metric] = row[metric] or 0
+        if row['avg_price'] is not None:
+            row['avg_price'] = round(row['avg_price'], 2)
+    return _sort(analytics)
+
+
+def get_analytics():
+    """compute_analytics() из кэша, сводка пересчитывается после изменения товара"""
+    key = fragment_key('analytics', get_versions([CATALOG_VERSION, INVENTORY_VERSION]))
+    analytics = cache.get(key)
+    if analytics is None:
+        analytics = compute_analytics()
+        cache.set(key, analytics, ANALYTICS_TIMEOUT)
+    return analytics
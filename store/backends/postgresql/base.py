@@ -0,0 +1,74 @@
+from django.db.backends.postgresql import base, creation
+from psycopg2 import extensions
+
+from store.dbpool import ConnectionPool, close_pools, get_pool
+
+
+def check_connection(conn):
+    with conn.cursor() as cursor:
+        cursor.execute('SELECT 1')
+
+
+def reset_connection(conn):
+    status = conn.get_transaction_status()
+    if status == extensions.TRANSACTION_STATUS_UNKNOWN:
+        return False
+    if status != extensions.TRANSACTION_STATUS_IDLE:
+        conn.rollback()
+    return True
+
+
+class DatabaseCreation(creation.DatabaseCreation):
+
+    def _destroy_test_db(self, test_database_name, verbosity):
+        # соединения с тестовой БД, оставшиеся в пуле, не дадут ее удалить
+        close_pools()
+        super()._destroy_test_db(test_database_name, verbosity)
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """Бэкенд PostgreSQL, который берет соединения из пула процесса.
+
+    Настройки пула -- в DATABASES[...]['POOL']: SIZE, TIMEOUT,
+    MAX_LIFETIME, MAX_IDLE, CHECK_IDLE (см. store.dbpool.ConnectionPool).
+    При SIZE = 0 пул выключен и бэкенд работает как стандартный.
+    Закрытие соединения Django (в конце запроса при CONN_MAX_AGE = 0)
+    возвращает его в пул вместо разрыва.
+    """
+    creation_class = DatabaseCreation
+
+    def get_pool(self, conn_params):
+        options = self.settings_dict.get('POOL') or {}
+        if not options.get('SIZE'):
+            return None
+        key = tuple(sorted((name, str(value)) for name, value in conn_params.items()))
+
+        def factory():
+            return ConnectionPool(
+                lambda: super(DatabaseWrapper, self).get_new_connection(conn_params),
+                check=check_connection, reset=reset_connection,
+                size=options['SIZE'],
+                timeout=options.get('TIMEOUT', 10),
+                max_lifetime=options.get('MAX_LIFETIME', 1800),
+                max_idle=options.get('MAX_IDLE', 600),
+                check_idle=options.get('CHECK_IDLE', 30),
+            )
+        return get_pool(self.alias, key, factory)
+
+    def get_new_connection(self, conn_params):
+        self.pool = self.get_pool(conn_params)
+        if self.pool is None:
+            return super().get_new_connection(conn_params)
+        return self.pool.acquire()
+
+    def _close(self):
+        pool = getattr(self, 'pool', None)
+        if self.connection is None or pool is None:
+            return super()._close()
+        with self.wrap_database_errors:
+            if self.in_atomic_block:
+                # Django продолжит ссылаться на соединение до конца
+                # транзакции, поэтому другому потоку его отдавать нельзя
+                pool.discard(self.connection)
+            else:
+                pool.release(self.connection)
@@ -0,0 +1,283 @@
+import json
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.db import connection, connections, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from .models import (Category, Discount, Manufacturer, Product, ProductImage,
+                     ProductTechnicalData, ProductTechnicalDataValue, ProductType)
+
+BENCHMARK_USER = 'benchmark'
+
+# характеристики, которые получает каждый тип товара: (название, тип значения, единица, значения)
+SPECS = (
+    ('Оперативная память', 'number', 'ГБ', ('4 ГБ', '8 ГБ', '16 ГБ', '32 ГБ', '64 ГБ')),
+    ('Накопитель', 'number', 'ГБ', ('256 ГБ', '512 ГБ', '1 ТБ', '2 ТБ')),
+    ('Цвет', 'enum', '', ('Черный', 'Белый', 'Серый', 'Синий')),
+    ('Вес', 'number', 'кг', ('0,9 кг', '1,2 кг', '1,5 кг', '2,1 кг')),
+    ('Модель процессора', 'text', '', ('A1', 'B2', 'C3', 'D4', 'E5')),
+)
+WORDS = (
+    'быстрый', 'легкий', 'тонкий', 'игровой', 'офисный', 'компактный', 'мощный',
+    'тихий', 'надежный', 'новый', 'экран', 'процессор', 'батарея', 'корпус',
+)
+
+
+def generate_catalog(products, categories=10, manufacturers=50, product_types=20,
+                     images=1, batch_size=5000, seed=0, stdout=None):
+    """Заполняет каталог синтетическими данными.
+
+    Генератор детерминирован (seed), поэтому два прогона с одинаковыми
+    параметрами дают одинаковый каталог. Товар пишется пачками
+    через bulk_create, так что можно генерировать миллионы строк.
+    Возвращает словарь с числом созданных строк.
+    """
+    rnd = random.Random(seed)
+    # префикс отличает данные разных прогонов, slug товара уникален
+    last_id = Product.objects.order_by('-id').values_list('id', flat=True).first()
+    prefix = 'bench-%s-%s' % (seed, last_id or 0)
+
+    category_ids = [c.pk for c in Category.objects.bulk_create([
+        Category(name='%s категория %s' % (prefix, n), slug='%s-category-%s' % (prefix, n))
+        for n in range(categories)
+    ])]
+    manufacturer_ids = [m.pk for m in Manufacturer.objects.bulk_create([
+        Manufacturer(name='%s производитель %s' % (prefix, n), country=rnd.choice(('Китай', 'Россия', 'Тайвань')))
+        for n in range(manufacturers)
+    ])]
+    types = ProductType.objects.bulk_create([
+        ProductType(name='%s тип %s' % (prefix, n)) for n in range(product_types)
+    ])
+    technical_data = ProductTechnicalData.objects.bulk_create([
+        ProductTechnicalData(name=name, product_type=product_type, value_type=value_type, unit=unit)
+        for product_type in types
+        for name, value_type, unit, values in SPECS
+    ])
+    specs_by_type = {}
+    for item in technical_data:
+        specs_by_type.setdefault(item.product_type_id, []).append(item)
+    spec_values = {name: values for name, value_type, unit, values in SPECS}
+
+    discounts = list(Discount.objects.values_list('id', 'amount')) or [
+        (d.pk, d.amount) for d in Discount.objects.bulk_create([
+            Discount(amount=amount, reason='Скидка %s%%' % amount) for amount in (5, 10, 20)
+        ])
+    ]
+
+    created = {'products': 0, 'values': 0, 'images': 0}
+    for start in range(0, products, batch_size):
+        batch = []
+        for n in range(start, min(start + batch_size, products)):
+            price = Decimal(rnd.randrange(100, 300000))
+            discount_id, amount = rnd.choice(discounts) if rnd.random() < 0.3 else (None, 0)
+            batch.append(Product(
+                name='%s %s %s' % (rnd.choice(WORDS).capitalize(), rnd.choice(WORDS), n),
+                slug='%s-%s' % (prefix, n),
+                description=' '.join(rnd.choice(WORDS) for _ in range(20)),
+                category_id=rnd.choice(category_ids),
+                manufacturer_id=rnd.choice(manufacturer_ids),
+                product_type_id=rnd.choice(types).pk,
+                discount_id=discount_id,
+                price=price,
+                price_discount=(price - price * amount / 100).quantize(Decimal('0.01')),
+                warranty=rnd.choice((6, 12, 24, 36)),
+                count=rnd.randrange(0, 500),
+            ))
+
+        with transaction.atomic():
+            batch = Product.objects.bulk_create(batch)
+            values = []
+            for product in batch:
+                for item in specs_by_type[product.product_type_id]:
+                    value = ProductTechnicalDataValue(
+                        product_id=product.pk, technical_data=item,
+                        value=rnd.choice(spec_values[item.name])
+                    )
+                    value.fill_typed_values(item)
+                    values.append(value)
+            ProductTechnicalDataValue.objects.bulk_create(values)
+            ProductImage.objects.bulk_create([
+                ProductImage(
+                    product_id=product.pk, image='images/benchmark.jpg',
+                    desc_image=product.name, main_image=not n
+                )
+                for product in batch
+                for n in range(images)
+            ])
+
+        created['products'] += len(batch)
+        created['values'] += len(values)
+        created['images'] += len(batch) * images
+        if stdout is not None:
+            stdout.write('Создано товаров: %s из %s' % (created['products'], products))
+
+    return created
+
+
+def get_url_scenarios():
+    """Страницы магазина для замера: {название: url}"""
+    product = Product.products.order_by('-id').only('slug').first()
+    category = Category.objects.order_by('id').only('slug').first()
+    scenarios = {
+        'product_all': reverse('store:product_all'),
+        'sum_count': reverse('store:sum_count'),
+        'time_product': reverse('store:time_product') + '?direction=stale&amount=1&unit=days',
+        'selection_manufacturer': reverse('store:selection_manufacturer'),
+        'analytics': reverse('store:analytics'),
+        'discount_search': reverse('store:discount_search'),
+        'search': reverse('store:search') + '?q=' + WORDS[0],
+    }
+    if product is not None:
+        scenarios['product_detail'] = reverse('store:product_detail', args=[product.slug])
+    if category is not None:
+        scenarios['category_list'] = reverse('store:category_list', args=[category.slug])
+    return scenarios
+
+
+def get_sql_scenarios():
+    """Функции и процедуры из code.sql: {название: (SQL, параметры)}.
+
+    Процедуры, которые меняют данные, выполняются в транзакции,
+    которая затем откатывается.
+    """
+    if connection.vendor != 'postgresql':
+        return {}
+    product_id = Product.objects.order_by('-id').values_list('id', flat=True).first()
+    manufacturer_id = Manufacturer.objects.order_by('id').values_list('id', flat=True).first()
+    return {
+        'sql:type_product': ('SELECT type_product(%s)', [product_id]),
+        'sql:data_value_product': ('SELECT * FROM data_value_product(%s)', [product_id]),
+        'sql:sum_count_price': ('CALL sum_count_price()', []),
+        'sql:sum_count_price_manufactur': ('CALL sum_count_price_manufactur(%s)', [manufacturer_id]),
+        'sql:create_manufacturer': ('CALL create_manufacturer(%s, %s)', ['benchmark', 'benchmark']),
+        'sql:del_product': ('CALL del_product(%s::int)', [product_id]),
+    }
+
+
+def _percentile(samples, percent):
+    if not samples:
+        return None
+    index = min(len(samples) - 1, int(round(percent / 100 * (len(samples) - 1))))
+    return round(samples[index], 2)
+
+
+def _run_url(client, url):
+    with CaptureQueriesContext(connection) as queries:
+        response = client.get(url)
+    return response.status_code < 400, len(queries)
+
+
+def _run_sql(sql, params):
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+        transaction.set_rollback(True)
+    return True, None
+
+
+def _worker(scenario, requests, host, own_connection=True):
+    """Выполняет сценарий requests раз и возвращает замеры"""
+    timings, queries, errors = [], [], 0
+    kind, target = scenario
+    if kind == 'url':
+        client = Client(HTTP_HOST=host)
+        client.force_login(User.objects.get(username=BENCHMARK_USER))
+    try:
+        for _ in range(requests):
+            started = time.perf_counter()
+            try:
+                if kind == 'url':
+                    ok, count = _run_url(client, target)
+                else:
+                    ok, count = _run_sql(*target)
+            except Exception:
+                ok, count = False, None
+            timings.append((time.perf_counter() - started) * 1000)
+            if count is not None:
+                queries.append(count)
+            errors += not ok
+    finally:
+        if own_connection:
+            connections.close_all()
+    return timings, queries, errors
+
+
+def run_benchmarks(requests=50, concurrency=4, only=None, host='localhost'):
+    """Прогоняет каждую страницу и процедуру в concurrency потоков.
+
+    Каждый поток делает requests запросов через свое соединение с БД.
+    Возвращает {сценарий: {'requests', 'errors', 'throughput',
+    'p50', 'p95', 'p99', 'queries'}}, время в миллисекундах.
+    """
+    User.objects.get_or_create(
+        username=BENCHMARK_USER, defaults={'is_staff': True, 'is_superuser': True}
+    )
+    scenarios = {name: ('url', url) for name, url in get_url_scenarios().items()}
+    scenarios.update({name: ('sql', target) for name, target in get_sql_scenarios().items()})
+    if only:
+        scenarios = {name: scenario for name, scenario in scenarios.items() if name in only}
+
+    results = {}
+    for name, scenario in scenarios.items():
+        started = time.perf_counter()
+        if concurrency == 1:
+            # в текущем потоке, например внутри транзакции теста
+            parts = [_worker(scenario, requests, host, own_connection=False)]
+        else:
+            with ThreadPoolExecutor(concurrency) as executor:
+                parts = list(executor.map(
+                    lambda _: _worker(scenario, requests, host), range(concurrency)
+                ))
+        elapsed = time.perf_counter() - started
+
+        timings = sorted(t for part in parts for t in part[0])
+        queries = sorted(q for part in parts for q in part[1])
+        results[name] = {
+            'requests': len(timings),
+            'errors': sum(part[2] for part in parts),
+            'throughput': round(len(timings) / elapsed, 2),
+            'p50': _percentile(timings, 50),
+            'p95': _percentile(timings, 95),
+            'p99': _percentile(timings, 99),
+            'queries': queries[len(queries) // 2] if queries else None,
+        }
+    return results
+
+
+def compare_with_baseline(results, baseline, threshold=0.2):
+    """Список регрессий относительно сохраненного прогона.
+
+    Регрессия -- p95 или число SQL-запросов выросли, либо пропускная
+    способность упала больше чем на threshold (доля), либо появились ошибки.
+    """
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        if result['errors'] > base.get('errors', 0):
+            regressions.append('%s: ошибок %s, было %s' % (name, result['errors'], base.get('errors', 0)))
+        if base.get('p95') and result['p95'] > base['p95'] * (1 + threshold):
+            regressions.append('%s: p95 %s мс, было %s мс' % (name, result['p95'], base['p95']))
+        if base.get('throughput') and result['throughput'] < base['throughput'] * (1 - threshold):
+            regressions.append('%s: %s запросов/с, было %s' % (name, result['throughput'], base['throughput']))
+        if base.get('queries') is not None and result['queries'] is not None \
+                and result['queries'] > base['queries']:
+            regressions.append('%s: SQL-запросов %s, было %s' % (name, result['queries'], base['queries']))
+    return regressions
+
+
+def load_baseline(path):
+    with open(path, encoding='utf-8') as stream:
+        return json.load(stream)
+
+
+def save_baseline(path, results):
+    with open(path, 'w', encoding='utf-8') as stream:
+        json.dump(results, stream, ensure_ascii=False, indent=2, sort_keys=True)
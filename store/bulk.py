@@ -0,0 +1,290 @@
+import csv
+import json
+from collections import defaultdict
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+from django.utils.text import slugify
+
+from .caching import bump_versions, category_version
+from .models import (Category, Discount, Manufacturer, Product, ProductType,
+                     ProductTechnicalData, ProductTechnicalDataValue)
+
+FORMATS = ('csv', 'jsonl')
+# кодировка файлов загрузки: UTF-8, метка BOM (Excel) пропускается
+ENCODING = 'utf-8-sig'
+# наибольшая цена, которая помещается в Product.price (max_digits=8, decimal_places=2)
+MAX_PRICE = Decimal('999999.99')
+# пределы IntegerField (гарантия и количество)
+MAX_INTEGER = 2 ** 31 - 1
+# описание -- TextField без ограничения, слишком длинное считается ошибкой файла
+MAX_DESCRIPTION_LENGTH = 100000
+
+# колонки файла выгрузки/загрузки, характеристики идут колонками 'spec:<название>'
+COLUMNS = (
+    'name', 'description', 'category', 'manufacturer', 'product_type',
+    'price', 'warranty', 'count', 'discount',
+)
+SPEC_PREFIX = 'spec:'
+
+MAX_ERRORS = 100
+
+
+class ImportRowError(Exception):
+    pass
+
+
+class ImportResult:
+    """Итог загрузки товара"""
+
+    def __init__(self):
+        self.created = 0
+        self.values_created = 0
+        self.skipped = 0
+        self.errors = []
+
+    def add_error(self, line, message):
+        self.skipped += 1
+        if len(self.errors) < MAX_ERRORS:
+            self.errors.append(f'Строка {line}: {message}')
+
+
+def guess_format(filename):
+    for file_format in FORMATS:
+        if filename.lower().endswith('.' + file_format):
+            return file_format
+    return None
+
+
+def read_rows(stream, file_format):
+    """Построчно читает текстовый поток CSV или JSONL.
+
+    Возвращает пары (номер строки, словарь), характеристики товара
+    собираются в словарь row['specs'].
+    """
+    if file_format == 'csv':
+        reader = csv.DictReader(stream)
+        for row in reader:
+            specs = {
+                key[len(SPEC_PREFIX):]: value
+                for key, value in row.items()
+                if key and key.startswith(SPEC_PREFIX) and value not in (None, '')
+            }
+            row = {key: value for key, value in row.items() if key in COLUMNS}
+            row['specs'] = specs
+            yield reader.line_num, row
+    elif file_format == 'jsonl':
+        for line, text in enumerate(stream, start=1):
+            if not text.strip():
+                continue
+            try:
+                row = json.loads(text)
+            except ValueError:
+                row = None
+            yield line, row
+    else:
+        raise ImportRowError(f'Неизвестный формат файла: {file_format}')
+
+
+class ProductImporter:
+    """Загрузка товара пачками через bulk_create.
+
+    Категории, производители, типы товара и технические параметры
+    сопоставляются по названию через словари, которые загружаются
+    один раз перед импортом. Каждая пачка сохраняется в своей транзакции.
+    """
+
+    def __init__(self, batch_size=1000):
+        self.batch_size = batch_size
+        self.categories = dict(Category.objects.values_list('name', 'id'))
+        self.product_types = dict(ProductType.objects.values_list('name', 'id'))
+        # название производителя не уникально, берется самый первый
+        self.manufacturers = dict(
+            Manufacturer.objects.order_by('-id').values_list('name', 'id')
+        )
+        self.discounts = Discount.objects.in_bulk()
+        self.technical_data = {
+            (technical_data.product_type_id, technical_data.name): technical_data
+            for technical_data in ProductTechnicalData.objects.only(
+                'name', 'product_type_id', 'value_type', 'unit'
+            )
+        }
+
+    def run(self, rows):
+        result = ImportResult()
+        batch = []
+        for line, row in rows:
+            try:
+                batch.append((line, self.build(row)))
+            except ImportRowError as error:
+                result.add_error(line, error)
+                continue
+            if len(batch) >= self.batch_size:
+                self.save_batch(batch, result)
+                batch = []
+        if batch:
+            self.save_batch(batch, result)
+        return result
+
+    def text(self, row, field, label, max_length):
+        """Строковое поле строки без пробелов по краям.
+
+        В JSONL поле может оказаться числом, списком или объектом,
+        это ошибка строки, а не всей загрузки.
+        """
+        value = row.get(field)
+        if value is None:
+            return ''
+        if not isinstance(value, str):
+            raise ImportRowError(f'{label}: ожидается строка')
+        value = value.strip()
+        if len(value) > max_length:
+            raise ImportRowError(f'{label}: больше {max_length} символов')
+        return value
+
+    def lookup(self, mapping, row, field, label):
+        name = self.text(row, field, label, Product._meta.get_field('name').max_length)
+        if name not in mapping:
+            raise ImportRowError(f'{label} "{name}" не найден(а)')
+        return mapping[name]
+
+    def build(self, row):
+        """Проверяет строку и возвращает (товар, характеристики)"""
+        if not isinstance(row, dict):
+            raise ImportRowError('строка не является объектом JSON')
+
+        name = self.text(row, 'name', 'Название', Product._meta.get_field('name').max_length)
+        if not name:
+            raise ImportRowError('не указано название товара')
+        description = self.text(row, 'description', 'Описание', MAX_DESCRIPTION_LENGTH)
+
+        try:
+            price = Decimal(str(row.get('price')))
+            warranty = int(row.get('warranty'))
+            count = int(row.get('count') or 0)
+        except (InvalidOperation, TypeError, ValueError):
+            raise ImportRowError('некорректная цена, гарантия или количество')
+        if not price.is_finite() or abs(warranty) > MAX_INTEGER or abs(count) > MAX_INTEGER:
+            raise ImportRowError('некорректная цена, гарантия или количество')
+        if price < 1 or price > MAX_PRICE:
+            raise ImportRowError(f'цена должна быть от 1 до {MAX_PRICE}')
+
+        discount = row.get('discount') or None
+        if discount is not None:
+            try:
+                discount = self.discounts[int(discount)]
+            except (KeyError, TypeError, ValueError):
+                raise ImportRowError(f'скидка "{row.get("discount")}" не найдена')
+
+        product_type_id = self.lookup(self.product_types, row, 'product_type', 'Тип товара')
+        product = Product(
+            name=name,
+            slug=slugify(name),
+            description=description,
+            category_id=self.lookup(self.categories, row, 'category', 'Категория'),
+            manufacturer_id=self.lookup(self.manufacturers, row, 'manufacturer', 'Производитель'),
+            product_type_id=product_type_id,
+            discount=discount,
+            price=price,
+            warranty=warranty,
+            count=count,
+        )
+        # bulk_create не вызывает Product.save(): цена со скидкой
+        # округляется так же, как при сохранении товара
+        product.price_discount = product.get_price_discount()
+
+        row_specs = row.get('specs') or {}
+        if not isinstance(row_specs, dict):
+            raise ImportRowError('характеристики должны быть объектом {название: значение}')
+        value_length = ProductTechnicalDataValue._meta.get_field('value').max_length
+        specs = []
+        for spec_name, value in row_specs.items():
+            technical_data = self.technical_data.get((product_type_id, spec_name))
+            if technical_data is None:
+                raise ImportRowError(f'параметр "{spec_name}" не найден для типа товара')
+            if isinstance(value, (dict, list)) or len(str(value)) > value_length:
+                raise ImportRowError(f'некорректное значение параметра "{spec_name}"')
+            specs.append((technical_data, str(value)))
+
+        return product, specs
+
+    def save_batch(self, batch, result):
+        slugs = [product.slug for line, (product, specs) in batch]
+        taken = set(Product.objects.filter(slug__in=slugs).values_list('slug', flat=True))
+
+        rows = []
+        for line, (product, specs) in batch:
+            if product.slug in taken:
+                result.add_error(line, f'товар с URL "{product.slug}" уже существует')
+                continue
+            taken.add(product.slug)
+            rows.append((product, specs))
+
+        if not rows:
+            return
+
+        with transaction.atomic():
+            products = Product.objects.bulk_create([product for product, specs in rows])
+            values = []
+            for product, (_, specs) in zip(products, rows):
+                for technical_data, value in specs:
+                    spec_value = ProductTechnicalDataValue(
+                        product_id=product.pk, technical_data=technical_data, value=value
+                    )
+                    spec_value.fill_typed_values(technical_data)
+                    values.append(spec_value)
+            ProductTechnicalDataValue.objects.bulk_create(values, batch_size=self.batch_size)
+            bump_versions(*{category_version(product.category_id) for product in products})
+
+        result.created += len(products)
+        result.values_created += len(values)
+
+
+class Echo:
+    """Буфер для csv.writer, который сразу возвращает записанную строку"""
+
+    def write(self, value):
+        return value
+
+
+def export_products(file_format, chunk_size=2000):
+    """Генератор строк выгрузки товара.
+
+    Товар читается пачками по первичному ключу, поэтому в памяти
+    никогда не держится вся таблица products.
+    """
+    if file_format not in FORMATS:
+        raise ImportRowError(f'Неизвестный формат файла: {file_format}')
+
+    spec_names = sorted(set(ProductTechnicalData.objects.values_list('name', flat=True)))
+    writer = csv.writer(Echo())
+    if file_format == 'csv':
+        yield writer.writerow(COLUMNS + tuple(SPEC_PREFIX + name for name in spec_names))
+
+    last_id = 0
+    while True:
+        chunk = list(Product.objects.filter(id__gt=last_id).order_by('id').values_list(
+            'id', 'name', 'description', 'category__name', 'manufacturer__name',
+            'product_type__name', 'price', 'warranty', 'count', 'discount_id',
+        )[:chunk_size])
+        if not chunk:
+            break
+        last_id = chunk[-1][0]
+
+        specs = defaultdict(dict)
+        for product_id, name, value in ProductTechnicalDataValue.objects.filter(
+            product_id__in=[row[0] for row in chunk]
+        ).values_list('product_id', 'technical_data__name', 'value'):
+            specs[product_id][name] = value
+
+        for pk, *values in chunk:
+            row = dict(zip(COLUMNS, values))
+            row['price'] = str(row['price'])
+            if file_format == 'csv':
+                yield writer.writerow(
+                    [row[column] if row[column] is not None else '' for column in COLUMNS]
+                    + [specs[pk].get(name, '') for name in spec_names]
+                )
+            else:
+                row['specs'] = specs[pk]
+                yield json.dumps(row, ensure_ascii=False) + '\n'
@@ -0,0 +1,242 @@
+import asyncio
+import hashlib
+import time
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.template.loader import render_to_string
+from django.urls import reverse
+from django.utils.safestring import mark_safe
+
+from .models import Category, Product, ProductImage, ProductTechnicalDataValue
+
+CATEGORY_MENU_KEY = 'store:category_menu:%s'
+CATEGORY_MENU_VERSION_KEY = 'store:category_menu:version'
+CATEGORY_MENU_TIMEOUT = 60 * 60 * 24
+
+PRODUCT_DETAILS_KEY = 'store:product_details:%s'
+PRODUCT_DETAILS_TIMEOUT = 60 * 60
+
+# счетчики версий: 'product:<id>', 'category:<id>', 'catalog' (общий,
+# меняется при массовых изменениях: скидки, производители, типы товара)
+# и 'inventory' (меняется при изменении любого товара, для сводок)
+VERSION_KEY = 'store:version:%s'
+CATALOG_VERSION = 'catalog'
+INVENTORY_VERSION = 'inventory'
+# фрагменты страниц, ключ содержит версии, от которых зависит фрагмент
+FRAGMENT_KEY = 'store:fragment:%s:%s'
+FRAGMENT_TIMEOUT = 60 * 60
+
+# копия меню в памяти процесса: (версия, пункты меню)
+_local_category_menu = (None, None)
+
+
+def _new_version():
+    return time.time_ns()
+
+
+def get_category_menu():
+    """Пункты меню категорий [{'name': ..., 'url': ...}, ...].
+
+    Меню хранится в памяти процесса и в общем кэше. Версия меню лежит
+    в общем кэше, поэтому изменение категории в одном процессе
+    сбрасывает копии меню во всех остальных.
+    """
+    global _local_category_menu
+
+    version = cache.get_or_set(CATEGORY_MENU_VERSION_KEY, _new_version, None)
+    local_version, items = _local_category_menu
+    if local_version == version:
+        return items
+
+    key = CATEGORY_MENU_KEY % version
+    items = cache.get(key)
+    if items is None:
+        items = [
+            {'name': name, 'url': reverse('store:category_list', args=[slug])}
+            for name, slug in Category.objects.order_by('id').values_list('name', 'slug')
+        ]
+        cache.set(key, items, CATEGORY_MENU_TIMEOUT)
+
+    _local_category_menu = (version, items)
+    return items
+
+
+def invalidate_category_menu():
+    cache.set(CATEGORY_MENU_VERSION_KEY, _new_version(), None)
+
+
+def _product_specs(product_id):
+    return ProductTechnicalDataValue.objects.filter(
+        product_id=product_id
+    ).order_by('id').values_list('technical_data__name', 'value')
+
+
+def _product_images(product_id):
+    return ProductImage.objects.filter(product_id=product_id).order_by('id')
+
+
+def get_product_details(product_id):
+    """Характеристики и изображения товара для его страницы.
+
+    Возвращает {'specs': [(название, значение), ...], 'images': [ProductImage, ...]}.
+    Данные кэшируются и сбрасываются сигналами при изменении
+    ProductTechnicalDataValue и ProductImage этого товара.
+    """
+    key = PRODUCT_DETAILS_KEY % product_id
+    details = cache.get(key)
+    if details is None:
+        details = {
+            'specs': list(_product_specs(product_id)),
+            'images': list(_product_images(product_id)),
+        }
+        cache.set(key, details, PRODUCT_DETAILS_TIMEOUT)
+    return details
+
+
+async def _alist(queryset):
+    return [item async for item in queryset]
+
+
+async def aget_product_details(product_id):
+    """Асинхронный вариант get_product_details для async-view.
+
+    Характеристики и изображения не зависят друг от друга,
+    поэтому запрашиваются одновременно.
+    """
+    key = PRODUCT_DETAILS_KEY % product_id
+    details = await cache.aget(key)
+    if details is None:
+        specs, images = await asyncio.gather(
+            _alist(_product_specs(product_id)), _alist(_product_images(product_id))
+        )
+        details = {'specs': specs, 'images': images}
+        await cache.aset(key, details, PRODUCT_DETAILS_TIMEOUT)
+    return details
+
+
+def invalidate_product_details(*product_ids):
+    cache.delete_many([PRODUCT_DETAILS_KEY % pk for pk in product_ids])
+
+
+def product_version(product_id):
+    return 'product:%s' % product_id
+
+
+def category_version(category_id):
+    return 'category:%s' % category_id
+
+
+def get_versions(names):
+    """Текущие версии [версия, ...] в порядке names.
+
+    Версия, которой нет в кэше (еще не создана или вытеснена), получает
+    новое значение по времени, поэтому фрагмент, сохраненный
+    со старой версией, не будет прочитан снова.
+    """
+    keys = [VERSION_KEY % name for name in names]
+    versions = cache.get_many(keys)
+    missing = {key: _new_version() for key in keys if key not in versions}
+    if missing:
+        cache.set_many(missing, None)
+        versions.update(missing)
+    return [versions[key] for key in keys]
+
+
+async def aget_versions(names):
+    keys = [VERSION_KEY % name for name in names]
+    versions = await cache.aget_many(keys)
+    missing = {key: _new_version() for key in keys if key not in versions}
+    if missing:
+        await cache.aset_many(missing, None)
+        versions.update(missing)
+    return [versions[key] for key in keys]
+
+
+def bump_versions(*names):
+    """Меняет версии, все фрагменты с прежними версиями перестают читаться.
+
+    Внутри транзакции версии меняются еще раз после ее фиксации:
+    иначе другой запрос мог бы успеть закэшировать с новой версией
+    данные, которые еще не зафиксированы.
+    """
+    names = [name for name in names if name]
+
+    def bump():
+        cache.set_many({VERSION_KEY % name: _new_version() for name in names}, None)
+
+    if names:
+        bump()
+        if connection.in_atomic_block:
+            transaction.on_commit(bump)
+
+
+def bump_product_versions(product_ids, category_ids=None):
+    """Сбрасывает фрагменты товара и категорий, где он показан"""
+    if category_ids is None:
+        category_ids = Product.objects.filter(pk__in=product_ids).values_list(
+            'category_id', flat=True
+        ).distinct()
+    bump_versions(
+        INVENTORY_VERSION,
+        *[product_version(pk) for pk in product_ids],
+        *[category_version(pk) for pk in category_ids]
+    )
+
+
+def fragment_key(name, versions, *vary_on):
+    digest = hashlib.md5(repr((versions, vary_on)).encode()).hexdigest()
+    return FRAGMENT_KEY % (name, digest)
+
+
+def attach_product_rows(products):
+    """Добавляет товару из списка row_html -- строку таблицы товара.
+
+    Строки читаются из кэша одним get_many, ключ строки содержит версию
+    товара и общую версию каталога. Недостающие строки отрисовываются
+    и сохраняются одним set_many.
+    """
+    products = list(products)
+    if not products:
+        return products
+    versions = get_versions([CATALOG_VERSION] + [product_version(p.pk) for p in products])
+    keys = [fragment_key('product_row', (versions[0], version), p.pk)
+            for p, version in zip(products, versions[1:])]
+    rows = cache.get_many(keys)
+
+    rendered = {}
+    for product, key in zip(products, keys):
+        if key not in rows:
+            rows[key] = rendered[key] = render_to_string(
+                'store/includes/product_row.html', {'product': product}
+            )
+        product.row_html = mark_safe(rows[key])
+    if rendered:
+        cache.set_many(rendered, FRAGMENT_TIMEOUT)
+    return products
+
+
+async def aget_product_body(product):
+    """Изображения и описание товара для его страницы: {'gallery': ..., 'info': ...}.
+
+    Фрагменты кэшируются по версии товара и каталога, при промахе
+    данные берутся из aget_product_details.
+    """
+    versions = await aget_versions([CATALOG_VERSION, product_version(product.pk)])
+    key = fragment_key('product_body', versions, product.pk)
+    body = await cache.aget(key)
+    if body is None:
+        details = await aget_product_details(product.pk)
+        context = {
+            'product': product,
+            'data_value': details['specs'],
+            'images': details['images']
+        }
+        body = {
+            name: await sync_to_async(render_to_string)(template, context)
+            for name, template in (('gallery', 'store/includes/product_gallery.html'),
+                                   ('info', 'store/includes/product_info.html'))
+        }
+        await cache.aset(key, body, FRAGMENT_TIMEOUT)
+    return {name: mark_safe(html) for name, html in body.items()}
@@ -0,0 +1,100 @@
+import hmac
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+from .models import ProductChange
+
+# наибольший размер пачки изменений в одном ответе
+MAX_BATCH = 1000
+# долгий опрос: наибольшее ожидание и пауза между чтениями журнала, в секундах
+MAX_WAIT = 30
+POLL_INTERVAL = 1
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(change):
+    return '%s.%s' % (change.transaction_id, change.id)
+
+
+def decode_cursor(cursor):
+    try:
+        transaction_id, pk = cursor.split('.')
+        return int(transaction_id), int(pk)
+    except ValueError:
+        raise InvalidCursor('Некорректный курсор: %s' % cursor)
+
+
+def read_changes(cursor='', limit=500):
+    """Пачка изменений товара после курсора и курсор для следующего чтения.
+
+    Изменения упорядочены по (transaction_id, id) и отдаются только
+    из транзакций старше самой старой незавершенной: номер строки
+    выдается до фиксации, поэтому при чтении по одному id изменение
+    долгой транзакции могло бы зафиксироваться позади курсора
+    и потеряться. Пустой курсор -- чтение с начала журнала.
+    Возвращает ([{'product_id', 'action', 'data', 'changed_in'}, ...], курсор).
+    """
+    limit = max(1, min(int(limit), MAX_BATCH))
+    changes = ProductChange.objects.filter(
+        transaction_id__lt=RawSQL('txid_snapshot_xmin(txid_current_snapshot())', [])
+    )
+    if cursor:
+        transaction_id, pk = decode_cursor(cursor)
+        changes = changes.filter(
+            Q(transaction_id__gt=transaction_id) | Q(transaction_id=transaction_id, id__gt=pk)
+        )
+    changes = list(changes.order_by('transaction_id', 'id')[:limit])
+
+    events = [
+        {
+            'product_id': change.product_id,
+            'action': change.action,
+            'data': change.data,
+            'changed_in': change.changed_in.isoformat(),
+        }
+        for change in changes
+    ]
+    return events, encode_cursor(changes[-1]) if changes else cursor
+
+
+def read_changes_and_release(cursor='', limit=500):
+    """read_changes для долгого опроса: соединение с БД сразу возвращается
+    в пул и не занято, пока запрос ждет новые изменения"""
+    try:
+        return read_changes(cursor, limit)
+    finally:
+        if not connection.in_atomic_block:
+            connection.close()
+
+
+def latest_cursor():
+    """Курсор на конец журнала: потребитель получит только новые изменения.
+
+    Курсор стоит перед самой старой незавершенной транзакцией, поэтому
+    ее изменения не потеряются (часть уже прочитанных может прийти еще раз).
+    """
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT txid_snapshot_xmin(txid_current_snapshot())')
+        xmin = cursor.fetchone()[0]
+    return '%s.%s' % (xmin - 1, 2 ** 63 - 1)
+
+
+def can_read_changes(request):
+    """Журнал читают сотрудники или системы с токеном STORE_CHANGES_TOKEN
+    (заголовок Authorization: Bearer <токен>)"""
+    token = getattr(settings, 'STORE_CHANGES_TOKEN', None)
+    header = request.headers.get('Authorization', '')
+    if token and header.startswith('Bearer '):
+        return hmac.compare_digest(header[len('Bearer '):], token)
+    return request.user.is_authenticated and request.user.is_staff
+
+
+def prune_changes(before):
+    """Удаляет записи журнала старше before (datetime)"""
+    return ProductChange.objects.filter(changed_in__lt=before).delete()[0]
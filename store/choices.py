@@ -0,0 +1,119 @@
+from django import forms
+from django.core.exceptions import ValidationError
+from django.forms.models import ModelChoiceIteratorValue
+from django.urls import reverse
+
+from .models import Manufacturer, ProductTechnicalData
+
+# размер страницы вариантов для lazy_choices
+CHOICES_PAGE_SIZE = 50
+
+
+class PreloadedModelChoiceField(forms.ModelChoiceField):
+    """ModelChoiceField, который может получить варианты загруженными заранее.
+
+    После preload() поле не обращается к БД ни при выводе, ни при проверке
+    значения: в формсете все строки используют одну выборку.
+    """
+
+    preloaded = None
+
+    def preload(self, choices):
+        self.queryset = choices.queryset
+        self.preloaded = choices.objects
+        self.choices = [('', self.empty_label)] + [
+            (ModelChoiceIteratorValue(obj.pk, obj), self.label_from_instance(obj))
+            for obj in choices.objects.values()
+        ]
+
+    def to_python(self, value):
+        if self.preloaded is None or value in self.empty_values:
+            return super().to_python(value)
+        try:
+            return self.preloaded[int(value)]
+        except (KeyError, TypeError, ValueError):
+            raise ValidationError(
+                self.error_messages['invalid_choice'], code='invalid_choice',
+                params={'value': value},
+            )
+
+
+class SharedChoices:
+    """Варианты выбора, загруженные одним запросом для нескольких форм"""
+
+    def __init__(self, queryset):
+        self.queryset = queryset
+        self.objects = {obj.pk: obj for obj in queryset}
+
+
+class LazySelect(forms.Select):
+    """Select, в котором выводится только выбранный вариант.
+
+    Остальные варианты страница подгружает с lazy_choices по мере поиска,
+    поэтому форма не выбирает из БД всех производителей.
+    """
+
+    def __init__(self, choices_name, attrs=None):
+        super().__init__(attrs)
+        self.choices_name = choices_name
+
+    def get_context(self, name, value, attrs):
+        context = super().get_context(name, value, attrs)
+        context['widget']['attrs']['data-choices-url'] = reverse(
+            'store:lazy_choices', args=[self.choices_name]
+        )
+        return context
+
+    def optgroups(self, name, value, attrs=None):
+        iterator = self.choices
+        selected = [v for v in value if str(v).isdigit()]
+        choices = [('', iterator.field.empty_label)]
+        if selected:
+            choices += [iterator.choice(obj) for obj in iterator.queryset.filter(pk__in=selected)]
+        self.choices = choices
+        try:
+            return super().optgroups(name, value, attrs)
+        finally:
+            self.choices = iterator
+
+
+def technical_data_for(product_type):
+    """Параметры, которые можно указать у товара этого типа"""
+    if not str(product_type or '').isdigit():
+        return ProductTechnicalData.objects.none()
+    return ProductTechnicalData.objects.filter(product_type=product_type).order_by('name', 'id')
+
+
+# варианты, которые выдает lazy_choices: имя -> (функция выборки, поле поиска)
+LAZY_CHOICES = {
+    'manufacturer': (
+        lambda params: Manufacturer.objects.order_by('name', 'id'), 'name'
+    ),
+    'technical_data': (
+        lambda params: technical_data_for(params.get('product_type')), 'name'
+    ),
+}
+
+
+def get_choices_page(name, params):
+    """Страница вариантов для LazySelect: {'results': [{'id', 'text'}], 'more'}.
+
+    Количество вариантов не считается, следующая страница определяется
+    по одной лишней строке.
+    """
+    make_queryset, search_field = LAZY_CHOICES[name]
+    queryset = make_queryset(params)
+    q = params.get('q', '').strip()
+    if q:
+        queryset = queryset.filter(**{search_field + '__icontains': q})
+
+    try:
+        page = max(int(params.get('page', 1)), 1)
+    except ValueError:
+        page = 1
+    offset = (page - 1) * CHOICES_PAGE_SIZE
+    rows = list(queryset[offset:offset + CHOICES_PAGE_SIZE + 1])
+    return {
+        'results': [{'id': obj.pk, 'text': str(obj)} for obj in rows[:CHOICES_PAGE_SIZE]],
+        'more': len(rows) > CHOICES_PAGE_SIZE,
+    }
@@ -1,6 +1,9 @@
-from .models import Category
+from django.utils.functional import SimpleLazyObject
+
+from .caching import get_category_menu
 
 def categories(request):
+    # меню читается только если шаблон действительно выводит категории
     return {
-        'categories': Category.objects.all()
-    }
\ No newline at end of file
+        'categories': SimpleLazyObject(get_category_menu)
+    }
@@ -0,0 +1,214 @@
+import collections
+import os
+import threading
+import time
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+class ConnectionPool:
+    """Пул соединений с БД, общий для всех потоков процесса.
+
+    connect() открывает новое соединение, check(conn) проверяет соединение,
+    которое долго простаивало, reset(conn) готовит соединение к возврату
+    в пул (откатывает незавершенную транзакцию). Если check или reset
+    вернули False или упали, соединение закрывается.
+
+    Свободные соединения выдаются в порядке LIFO: чаще используются
+    "теплые" соединения, а лишние дольше простаивают и закрываются
+    по max_idle. Соединение старше max_lifetime секунд закрывается
+    при возврате в пул. Если все size соединений заняты, acquire()
+    ждет освобождения не дольше timeout секунд.
+    """
+
+    def __init__(self, connect, check=None, reset=None, size=10, timeout=10,
+                 max_lifetime=1800, max_idle=600, check_idle=30):
+        self.connect = connect
+        self.check = check
+        self.reset = reset
+        self.size = size
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self.max_idle = max_idle
+        self.check_idle = check_idle
+        self.pid = os.getpid()
+        self.closed = False
+
+        self._cond = threading.Condition()
+        # свободные соединения: (соединение, время возврата в пул)
+        self._idle = collections.deque()
+        # время открытия соединений, которые сейчас открыты
+        self._born = {}
+        self._opening = 0
+        self._in_use = 0
+
+        self.checkouts = 0
+        self.created = 0
+        self.discarded = 0
+        self.waits = 0
+        self.timeouts = 0
+        self.wait_time = 0.0
+        self.max_wait = 0.0
+        self.peak_in_use = 0
+
+    def _checkout(self, deadline):
+        """Берет свободное соединение или место под новое (None), при необходимости ждет"""
+        waited = False
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                while self._idle:
+                    conn, released = self._idle.pop()
+                    if now - released > self.max_idle:
+                        self._discard(conn)
+                        continue
+                    return conn, released, waited
+                if len(self._born) + self._opening < self.size:
+                    self._opening += 1
+                    return None, None, waited
+                if now >= deadline:
+                    self.timeouts += 1
+                    raise PoolTimeout(
+                        'Нет свободного соединения с БД за %s с (занято %s из %s)'
+                        % (self.timeout, self._in_use, self.size)
+                    )
+                waited = True
+                self._cond.wait(deadline - now)
+
+    def acquire(self):
+        started = time.monotonic()
+        deadline = started + self.timeout
+        while True:
+            conn, released, waited = self._checkout(deadline)
+            if conn is None:
+                try:
+                    conn = self.connect()
+                except Exception:
+                    with self._cond:
+                        self._opening -= 1
+                        self._cond.notify()
+                    raise
+                with self._cond:
+                    self._opening -= 1
+                    self._born[conn] = time.monotonic()
+                    self.created += 1
+            elif self.check is not None and time.monotonic() - released > self.check_idle \
+                    and not self._safe_call(self.check, conn):
+                with self._cond:
+                    self._discard(conn)
+                    self._cond.notify()
+                continue
+
+            waited_for = time.monotonic() - started
+            with self._cond:
+                self._in_use += 1
+                self.peak_in_use = max(self.peak_in_use, self._in_use)
+                self.checkouts += 1
+                if waited:
+                    self.waits += 1
+                    self.wait_time += waited_for
+                    self.max_wait = max(self.max_wait, waited_for)
+            return conn
+
+    def release(self, conn):
+        """Возвращает соединение в пул (или закрывает, если оно непригодно)"""
+        keep = not self.closed and not getattr(conn, 'closed', False) \
+            and time.monotonic() - self._born.get(conn, 0) < self.max_lifetime
+        if keep and self.reset is not None:
+            keep = self._safe_call(self.reset, conn)
+        with self._cond:
+            self._in_use -= 1
+            if keep:
+                self._idle.append((conn, time.monotonic()))
+            else:
+                self._discard(conn)
+            self._cond.notify()
+
+    def discard(self, conn):
+        """Закрывает выданное соединение, не возвращая его в пул"""
+        with self._cond:
+            self._in_use -= 1
+            self._discard(conn)
+            self._cond.notify()
+
+    def _discard(self, conn):
+        self._born.pop(conn, None)
+        self.discarded += 1
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    @staticmethod
+    def _safe_call(func, conn):
+        try:
+            return func(conn) is not False
+        except Exception:
+            return False
+
+    def close(self):
+        """Закрывает свободные соединения, занятые закроются при возврате"""
+        with self._cond:
+            self.closed = True
+            while self._idle:
+                self._discard(self._idle.pop()[0])
+            self._cond.notify_all()
+
+    def stats(self):
+        """Состояние и счетчики пула, время в миллисекундах"""
+        with self._cond:
+            return {
+                'size': self.size,
+                'open': len(self._born),
+                'idle': len(self._idle),
+                'in_use': self._in_use,
+                'peak_in_use': self.peak_in_use,
+                'saturation': round(self._in_use / self.size, 2) if self.size else None,
+                'checkouts': self.checkouts,
+                'created': self.created,
+                'discarded': self.discarded,
+                'waits': self.waits,
+                'timeouts': self.timeouts,
+                'wait_ms': round(self.wait_time * 1000, 2),
+                'avg_wait_ms': round(self.wait_time * 1000 / self.waits, 2) if self.waits else 0,
+                'max_wait_ms': round(self.max_wait * 1000, 2),
+            }
+
+
+# пулы процесса: (псевдоним БД, параметры соединения) -> ConnectionPool
+POOLS = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(alias, key, factory):
+    """Пул для псевдонима и параметров соединения, factory() создает новый.
+
+    После fork (gunicorn --preload) унаследованный пул не используется:
+    соединения родителя нельзя делить с дочерним процессом.
+    """
+    with _pools_lock:
+        pool = POOLS.get((alias, key))
+        if pool is None or pool.pid != os.getpid() or pool.closed:
+            pool = POOLS[(alias, key)] = factory()
+        return pool
+
+
+def close_pools():
+    with _pools_lock:
+        for pool in POOLS.values():
+            if pool.pid == os.getpid():
+                pool.close()
+        POOLS.clear()
+
+
+def pool_stats():
+    """Счетчики всех пулов процесса: [{'alias', 'database', ...}]"""
+    with _pools_lock:
+        pools = list(POOLS.items())
+    return [
+        dict(alias=alias, database=dict(key).get('database', ''), **pool.stats())
+        for (alias, key), pool in pools
+        if pool.pid == os.getpid()
+    ]
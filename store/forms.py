@@ -1,8 +1,14 @@
+import codecs
+import datetime
+
 from django import forms
-from django.forms import inlineformset_factory
+from django.forms import BaseInlineFormSet, inlineformset_factory
 
-from .models import (Product, Category, ProductType, 
+from .models import (Product, Category, ProductType, Discount,
                     Manufacturer, ProductTechnicalDataValue)
+from .bulk import ENCODING, guess_format
+from .choices import LazySelect, PreloadedModelChoiceField, SharedChoices, technical_data_for
+from .stock import RECENT, STALE
 
 class AddProductForm(forms.Form):
     """Форма добавления товара"""
@@ -35,8 +41,8 @@ class AddProductForm(forms.Form):
     )
     manufacturer = forms.ModelChoiceField(
         label='Производитель', queryset=Manufacturer.objects.all(),
-        widget=forms.Select(
-            attrs={
+        widget=LazySelect(
+            'manufacturer', attrs={
                 'class': 'form-select'
             }
         )
@@ -107,8 +113,8 @@ class ProductForm(forms.ModelForm):
                     'class': 'form-select'
                 }
             ),
-            'manufacturer': forms.Select(
-                attrs={
+            'manufacturer': LazySelect(
+                'manufacturer', attrs={
                     'class': 'form-select'
                 }
             ),
@@ -136,6 +142,7 @@ class TechnicalDataValueForm(forms.ModelForm):
     class Meta:
         model = ProductTechnicalDataValue
         fields = ['technical_data', 'value']
+        field_classes = {'technical_data': PreloadedModelChoiceField}
 
         widgets = {
             'technical_data': forms.Select(
@@ -151,12 +158,33 @@ class TechnicalDataValueForm(forms.ModelForm):
             
         }
 
-    def __init__(self, *args, **kwargs):
+    def __init__(self, *args, technical_data=None, **kwargs):
         super().__init__(*args, **kwargs)
         self.fields['technical_data'].empty_label = 'Параметр не выбран'
+        if technical_data is not None:
+            self.fields['technical_data'].preload(technical_data)
+
+class BaseTechnicalDataValueFormSet(BaseInlineFormSet):
+    """Формсет характеристик с параметрами выбранного типа товара.
+
+    Параметры выбираются из БД один раз на весь формсет,
+    а не отдельным запросом в каждой строке.
+    """
+
+    def __init__(self, *args, product_type=None, **kwargs):
+        if product_type is None and kwargs.get('instance') is not None:
+            product_type = kwargs['instance'].product_type_id
+        self.technical_data = SharedChoices(technical_data_for(product_type))
+        super().__init__(*args, **kwargs)
+
+    def get_form_kwargs(self, index):
+        kwargs = super().get_form_kwargs(index)
+        kwargs['technical_data'] = self.technical_data
+        return kwargs
 
 TechnicalDataValueFormSet = inlineformset_factory(
-    Product, ProductTechnicalDataValue, form=TechnicalDataValueForm, extra=1,
+    Product, ProductTechnicalDataValue, form=TechnicalDataValueForm,
+    formset=BaseTechnicalDataValueFormSet, extra=1,
     can_delete=True, can_delete_extra=True
 )
 
@@ -174,11 +202,68 @@ class ManufacturerForm(forms.Form):
         }
     ))
 
-class SelectManufacturerForm(forms.Form):
-    """Форма получения выбора производителей"""
+class ProductImportForm(forms.Form):
+    """Форма загрузки товара из файла"""
+
+    file = forms.FileField(label='Файл (CSV или JSONL)', widget=forms.ClearableFileInput(
+        attrs={
+            'class': 'form-control'
+        }
+    ))
+    file_format = forms.ChoiceField(
+        label='Формат', required=False,
+        choices=[('', 'По расширению файла'), ('csv', 'CSV'), ('jsonl', 'JSONL')],
+        widget=forms.Select(
+            attrs={
+                'class': 'form-select'
+            }
+        )
+    )
+
+    def clean_file(self):
+        # файл проверяется целиком до загрузки, чтобы ошибка кодировки
+        # в середине не оставила загруженной только часть товара
+        upload = self.cleaned_data['file']
+        decoder = codecs.getincrementaldecoder(ENCODING)()
+        try:
+            for chunk in upload.chunks():
+                decoder.decode(chunk)
+            decoder.decode(b'', final=True)
+        except UnicodeDecodeError:
+            raise forms.ValidationError('Файл должен быть в кодировке UTF-8')
+        upload.seek(0)
+        return upload
+
+    def clean(self):
+        cleaned_data = super().clean()
+        upload = cleaned_data.get('file')
+        if upload and not cleaned_data.get('file_format'):
+            cleaned_data['file_format'] = guess_format(upload.name)
+            if cleaned_data['file_format'] is None:
+                raise forms.ValidationError('Не удалось определить формат файла')
+        return cleaned_data
+
+class ApplyDiscountForm(forms.Form):
+    """Форма назначения скидки всему товару категории и (или) производителя"""
 
+    discount = forms.ModelChoiceField(
+        label='Скидка', queryset=Discount.objects.all(), required=False,
+        widget=forms.Select(
+            attrs={
+                'class': 'form-select'
+            }
+        )
+    )
+    category = forms.ModelChoiceField(
+        label='Категория', queryset=Category.objects.all(), required=False,
+        widget=forms.Select(
+            attrs={
+                'class': 'form-select'
+            }
+        )
+    )
     manufacturer = forms.ModelChoiceField(
-        label='Производитель', queryset=Manufacturer.objects.all(),
+        label='Производитель', queryset=Manufacturer.objects.all(), required=False,
         widget=forms.Select(
             attrs={
                 'class': 'form-select'
@@ -188,4 +273,57 @@ class SelectManufacturerForm(forms.Form):
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        self.fields['manufacturer'].empty_label = 'Производитель не выбран'
\ No newline at end of file
+        self.fields['discount'].empty_label = 'Снять скидку'
+        self.fields['category'].empty_label = 'Любая категория'
+        self.fields['manufacturer'].empty_label = 'Любой производитель'
+
+    def clean(self):
+        cleaned_data = super().clean()
+        if not cleaned_data.get('category') and not cleaned_data.get('manufacturer'):
+            raise forms.ValidationError('Выберите категорию или производителя')
+        return cleaned_data
+
+# готовые выборки по времени: (название, параметры запроса)
+TIME_WINDOW_PRESETS = [
+    ('Товар более года', 'direction=stale&amount=52&unit=weeks'),
+    ('Товар более 1 дня', 'direction=stale&amount=1&unit=days'),
+    ('Товар более 10 минут', 'direction=stale&amount=10&unit=minutes'),
+    ('Обновлен за сутки', 'direction=recent&amount=1&unit=days'),
+]
+
+class TimeWindowForm(forms.Form):
+    """Форма выборки товара по времени обновления"""
+
+    direction = forms.ChoiceField(
+        label='Товар', choices=[(STALE, 'Не обновлялся больше'), (RECENT, 'Обновлен за последние')],
+        widget=forms.Select(
+            attrs={
+                'class': 'form-select'
+            }
+        )
+    )
+    amount = forms.IntegerField(
+        label='Срок', min_value=1, max_value=100000,
+        widget=forms.NumberInput(
+            attrs={
+                'class': 'form-control'
+            }
+        )
+    )
+    unit = forms.ChoiceField(
+        label='Единица',
+        choices=[('minutes', 'минут'), ('hours', 'часов'), ('days', 'дней'), ('weeks', 'недель')],
+        widget=forms.Select(
+            attrs={
+                'class': 'form-select'
+            }
+        )
+    )
+
+    def clean(self):
+        cleaned_data = super().clean()
+        if cleaned_data.get('amount') and cleaned_data.get('unit'):
+            cleaned_data['window'] = datetime.timedelta(
+                **{cleaned_data['unit']: cleaned_data['amount']}
+            )
+        return cleaned_data
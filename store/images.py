@@ -0,0 +1,85 @@
+import hashlib
+import io
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+from .caching import bump_product_versions, invalidate_product_details
+from .models import ProductImage
+
+# ширины копий изображения, копия не бывает шире оригинала
+RENDITION_WIDTHS = (160, 480, 960, 1600)
+THUMBNAIL_WIDTH = 160
+# формат копии: (формат Pillow, параметры сохранения)
+RENDITION_FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+RENDITIONS_DIR = 'renditions'
+
+
+def get_rendition_widths(width):
+    widths = [w for w in RENDITION_WIDTHS if w < width]
+    if len(widths) < len(RENDITION_WIDTHS):
+        widths.append(width)
+    return widths
+
+
+def build_renditions(image):
+    """Создает уменьшенные копии изображения товара в WebP и JPEG.
+
+    Имена копий содержат хэш содержимого оригинала, поэтому файл
+    по одному адресу никогда не меняется и может кэшироваться
+    браузером и прокси без срока. Уже созданные копии не пересоздаются.
+    Возвращает словарь для ProductImage.renditions.
+    """
+    with image.image.open('rb') as source:
+        content = source.read()
+    digest = hashlib.sha256(content).hexdigest()[:20]
+
+    with Image.open(io.BytesIO(content)) as original:
+        original = ImageOps.exif_transpose(original)
+        renditions = {'source': image.image.name, 'hash': digest}
+
+        for ext, (pil_format, options) in RENDITION_FORMATS.items():
+            renditions[ext] = []
+            for width in get_rendition_widths(original.width):
+                name = '%s/%s/%s-%s.%s' % (RENDITIONS_DIR, digest[:2], digest, width, ext)
+                if not default_storage.exists(name):
+                    height = max(1, round(original.height * width / original.width))
+                    copy = original.convert('RGB').resize((width, height), Image.LANCZOS)
+                    buffer = io.BytesIO()
+                    copy.save(buffer, pil_format, **options)
+                    saved = default_storage.save(name, ContentFile(buffer.getvalue()))
+                    if saved != name:
+                        # копию успел создать другой процесс
+                        default_storage.delete(saved)
+                renditions[ext].append([width, name])
+
+    return renditions
+
+
+def update_renditions(image_id):
+    """Создает копии для изображения и сохраняет их в БД.
+
+    Сохранение идет через update(), чтобы не вызвать сигнал post_save
+    повторно. Если за это время изображение заменили, результат
+    отбрасывается: новое изображение получит свои копии.
+    """
+    image = ProductImage.objects.filter(pk=image_id).first()
+    if image is None or not image.image:
+        return None
+
+    renditions = build_renditions(image)
+    thumbnail = next(
+        (name for width, name in renditions['jpeg'] if width >= THUMBNAIL_WIDTH),
+        renditions['jpeg'][-1][1],
+    )
+    updated = ProductImage.objects.filter(pk=image.pk, image=image.image.name).update(
+        renditions=renditions, thumbnail=thumbnail
+    )
+    if updated:
+        invalidate_product_details(image.product_id)
+        bump_product_versions([image.product_id])
+    return renditions
@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from store.benchmark import compare_with_baseline, load_baseline, run_benchmarks, save_baseline
+
+
+class Command(BaseCommand):
+    help = ('Нагрузочный прогон страниц магазина и процедур из code.sql: '
+            'пропускная способность, перцентили времени и число SQL-запросов')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=50, help='Запросов на поток')
+        parser.add_argument('--concurrency', type=int, default=4, help='Число потоков')
+        parser.add_argument('--only', nargs='*', help='Названия сценариев')
+        parser.add_argument('--host', default='localhost', help='Заголовок Host для запросов')
+        parser.add_argument('--save', help='Сохранить результат как базовый прогон (JSON)')
+        parser.add_argument('--baseline', help='Сравнить с базовым прогоном (JSON)')
+        parser.add_argument('--threshold', type=float, default=0.2,
+                            help='Допустимое ухудшение, доля (0.2 = 20%%)')
+
+    def handle(self, *args, requests, concurrency, only, host, save, baseline, threshold, **options):
+        if concurrency < 1 or requests < 1:
+            raise CommandError('--requests и --concurrency должны быть больше нуля')
+
+        try:
+            base = load_baseline(baseline) if baseline else None
+        except (OSError, ValueError) as error:
+            raise CommandError(f'Не удалось прочитать базовый прогон: {error}')
+
+        results = run_benchmarks(requests, concurrency, only, host)
+
+        self.stdout.write(f'{"сценарий":<32}{"запросов":>9}{"ошибок":>8}{"в сек.":>9}'
+                          f'{"p50":>9}{"p95":>9}{"p99":>9}{"SQL":>6}')
+        for name, result in results.items():
+            self.stdout.write(
+                f'{name:<32}{result["requests"]:>9}{result["errors"]:>8}{result["throughput"]:>9}'
+                f'{result["p50"]:>9}{result["p95"]:>9}{result["p99"]:>9}{str(result["queries"]):>6}'
+            )
+
+        if save:
+            save_baseline(save, results)
+            self.stdout.write(self.style.SUCCESS(f'Результат сохранен в {save}'))
+
+        if base is not None:
+            regressions = compare_with_baseline(results, base, threshold)
+            if regressions:
+                for regression in regressions:
+                    self.stderr.write(regression)
+                raise CommandError(f'Ухудшение относительно {baseline}: {len(regressions)}')
+            self.stdout.write(self.style.SUCCESS('Ухудшений относительно базового прогона нет'))
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from store.images import update_renditions
+from store.models import ProductImage
+
+
+class Command(BaseCommand):
+    help = 'Создание уменьшенных копий (WebP/JPEG) для изображений товара'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='Пересоздать копии для всех изображений')
+
+    def handle(self, *args, all, **options):
+        images = ProductImage.objects.order_by('id')
+        if not all:
+            images = images.filter(thumbnail='')
+
+        done = failed = 0
+        for image_id in images.values_list('id', flat=True).iterator():
+            try:
+                update_renditions(image_id)
+                done += 1
+            except (OSError, ValueError) as error:
+                failed += 1
+                self.stderr.write(f'Изображение {image_id}: {error}')
+
+        self.stdout.write(self.style.SUCCESS(f'Обработано изображений: {done}, с ошибкой: {failed}'))
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from store.bulk import FORMATS, export_products, guess_format
+
+
+class Command(BaseCommand):
+    help = 'Выгрузка товара и его характеристик в файл CSV или JSONL'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Путь к файлу, "-" для вывода в консоль')
+        parser.add_argument('--format', choices=FORMATS, dest='file_format')
+        parser.add_argument('--chunk-size', type=int, default=2000)
+
+    def handle(self, *args, path, file_format, chunk_size, **options):
+        file_format = file_format or guess_format(path) or 'csv'
+
+        try:
+            if path == '-':
+                for line in export_products(file_format, chunk_size):
+                    self.stdout.write(line, ending='')
+                return
+            with open(path, 'w', encoding='utf-8', newline='') as stream:
+                stream.writelines(export_products(file_format, chunk_size))
+        except OSError as error:
+            raise CommandError(error)
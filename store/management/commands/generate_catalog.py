@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from store.benchmark import generate_catalog
+
+
+class Command(BaseCommand):
+    help = 'Заполнение каталога синтетическим товаром для нагрузочных тестов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('products', type=int, help='Количество товара')
+        parser.add_argument('--categories', type=int, default=10)
+        parser.add_argument('--manufacturers', type=int, default=50)
+        parser.add_argument('--product-types', type=int, default=20)
+        parser.add_argument('--images', type=int, default=1, help='Изображений на товар')
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, products, categories, manufacturers, product_types,
+               images, batch_size, seed, **options):
+        created = generate_catalog(
+            products, categories=categories, manufacturers=manufacturers,
+            product_types=product_types, images=images, batch_size=batch_size,
+            seed=seed, stdout=self.stdout,
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Добавлено товаров: {created["products"]}, характеристик: {created["values"]}, '
+            f'изображений: {created["images"]}'
+        ))
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from store.bulk import ENCODING, FORMATS, ProductImporter, guess_format, read_rows
+
+
+class Command(BaseCommand):
+    help = 'Загрузка товара и его характеристик из файла CSV или JSONL'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Путь к файлу')
+        parser.add_argument('--format', choices=FORMATS, dest='file_format')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, path, file_format, batch_size, **options):
+        file_format = file_format or guess_format(path)
+        if file_format is None:
+            raise CommandError('Не удалось определить формат файла, укажите --format')
+
+        try:
+            with open(path, encoding=ENCODING, newline='') as stream:
+                result = ProductImporter(batch_size).run(read_rows(stream, file_format))
+        except (OSError, UnicodeDecodeError) as error:
+            raise CommandError(error)
+
+        for error in result.errors:
+            self.stderr.write(error)
+        self.stdout.write(self.style.SUCCESS(
+            f'Добавлено товаров: {result.created}, характеристик: {result.values_created}, '
+            f'пропущено строк: {result.skipped}'
+        ))
@@ -0,0 +1,74 @@
+import datetime
+import json
+import signal
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+from django.utils import timezone
+
+from store.changes import latest_cursor, prune_changes, read_changes
+
+
+class Command(BaseCommand):
+    help = 'Читает журнал изменений товара (product_changes) по курсору, JSON Lines в stdout'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--cursor', default='',
+                            help='Курсор, с которого читать (latest -- только новые изменения)')
+        parser.add_argument('--cursor-file',
+                            help='Файл, где хранится курсор: читается при запуске '
+                                 'и обновляется после каждой выведенной пачки')
+        parser.add_argument('--limit', type=int, default=500, help='Изменений в пачке')
+        parser.add_argument('--follow', action='store_true',
+                            help='Не завершаться, ждать новые изменения')
+        parser.add_argument('--sleep', type=float, default=1.0,
+                            help='Пауза в секундах, когда новых изменений нет (с --follow)')
+        parser.add_argument('--prune-days', type=int,
+                            help='Удалить записи журнала старше стольких дней и завершиться')
+
+    def handle(self, *args, cursor, cursor_file, limit, follow, sleep, prune_days, **options):
+        if prune_days is not None:
+            deleted = prune_changes(timezone.now() - datetime.timedelta(days=prune_days))
+            self.stderr.write(f'Удалено записей журнала: {deleted}')
+            return
+
+        if cursor_file and not cursor:
+            try:
+                with open(cursor_file, encoding='utf-8') as stream:
+                    cursor = stream.read().strip()
+            except FileNotFoundError:
+                pass
+        if cursor == 'latest':
+            cursor = latest_cursor()
+
+        self.stopping = False
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+
+        total = 0
+        while not self.stopping:
+            close_old_connections()
+            try:
+                events, cursor = read_changes(cursor, limit)
+            except ValueError as error:
+                raise CommandError(error)
+
+            for event in events:
+                self.stdout.write(json.dumps(event, ensure_ascii=False))
+            self.stdout.flush()
+            # курсор сохраняется после вывода: при сбое пачка придет еще раз
+            if cursor_file and events:
+                with open(cursor_file, 'w', encoding='utf-8') as stream:
+                    stream.write(cursor)
+            total += len(events)
+
+            if len(events) < limit:
+                if not follow:
+                    break
+                time.sleep(sleep)
+
+        self.stderr.write(f'Прочитано изменений: {total}, курсор: {cursor}')
+
+    def stop(self, signum, frame):
+        self.stopping = True
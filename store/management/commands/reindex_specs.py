@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from store.models import ProductTechnicalDataValue
+from store.specs import reindex_values
+
+
+class Command(BaseCommand):
+    help = 'Пересчет числовых и списочных значений характеристик для фильтров'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, batch_size, **options):
+        total = reindex_values(ProductTechnicalDataValue.objects.all(), batch_size)
+        self.stdout.write(self.style.SUCCESS(f'Пересчитано значений: {total}'))
@@ -0,0 +1,52 @@
+import signal
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from store.queue import STALE_TIMEOUT, requeue_stale_tasks, run_next_task
+
+
+class Command(BaseCommand):
+    help = 'Воркер очереди фоновых задач (таблица task_queue)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true',
+                            help='Выполнить готовые задачи и завершиться')
+        parser.add_argument('--sleep', type=float, default=1.0,
+                            help='Пауза в секундах, когда очередь пуста')
+        parser.add_argument('--max-tasks', type=int, default=0,
+                            help='Завершиться после стольких задач (0 -- без ограничения)')
+
+    def handle(self, *args, once, sleep, max_tasks, **options):
+        self.stopping = False
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+
+        processed = 0
+        checked_stale = 0
+        while not self.stopping:
+            if time.monotonic() - checked_stale > STALE_TIMEOUT.total_seconds() / 2:
+                requeued = requeue_stale_tasks()
+                if requeued:
+                    self.stderr.write(f'Возвращено в очередь зависших задач: {requeued}')
+                checked_stale = time.monotonic()
+
+            close_old_connections()
+            claimed = run_next_task()
+            if claimed is None:
+                if once:
+                    break
+                time.sleep(sleep)
+                continue
+
+            processed += 1
+            self.stdout.write(f'{claimed}: {claimed.status}')
+            if max_tasks and processed >= max_tasks:
+                break
+
+        self.stdout.write(self.style.SUCCESS(f'Выполнено задач: {processed}'))
+
+    def stop(self, signum, frame):
+        # текущая задача доделывается, новые не берутся
+        self.stopping = True
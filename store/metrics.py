@@ -0,0 +1,260 @@
+import bisect
+import contextvars
+import logging
+import threading
+import time
+from collections import defaultdict
+from contextlib import ExitStack
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+from django.template.backends.django import DjangoTemplates, Template
+
+logger = logging.getLogger('store.slow_query')
+
+METRICS_KEY = 'store:metrics:%s:%s:%s'
+METRICS_NAMES_KEY = 'store:metrics:names'
+METRICS_TIMEOUT = 60 * 60 * 24 * 7
+
+# верхние границы корзин гистограмм, последняя корзина -- все, что больше
+BUCKETS = {
+    'queries': (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89, 144, 233),
+    'sql': (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000),
+    'template': (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000),
+    'total': (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000),
+}
+PERCENTILES = (50, 95, 99)
+
+# замеры текущего запроса, доступны из обертки SQL и из шаблонов
+_current = contextvars.ContextVar('store_request_metrics', default=None)
+
+
+class RequestMetrics:
+    """Замеры одного запроса: число и время SQL, время шаблонов"""
+
+    def __init__(self):
+        self.view_name = None
+        self.queries = 0
+        self.sql = 0.0
+        self.template = 0.0
+        self.started = time.perf_counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = (time.perf_counter() - started) * 1000
+            self.queries += 1
+            self.sql += duration
+            slow_ms = getattr(settings, 'STORE_SLOW_QUERY_MS', None)
+            if slow_ms is not None and duration >= slow_ms:
+                logger.warning(
+                    'Медленный запрос %.1f мс во view %s: %s',
+                    duration, self.view_name, sql,
+                    extra={'view_name': self.view_name, 'duration': duration, 'sql': sql},
+                )
+
+    def server_timing(self, total):
+        return ', '.join((
+            'sql;dur=%.1f;desc="%s SQL"' % (self.sql, self.queries),
+            'tpl;dur=%.1f' % self.template,
+            'total;dur=%.1f' % total,
+        ))
+
+
+class MetricsBuffer:
+    """Гистограммы процесса, которые периодически сливаются в общий кэш.
+
+    В кэше на каждую корзину отдельный счетчик, cache.incr атомарен
+    и в Redis, и в кэше в памяти, поэтому процессы не затирают
+    данные друг друга.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counts = defaultdict(int)
+        self.names = set()
+        self.flushed = time.monotonic()
+
+    def add(self, view_name, values):
+        with self.lock:
+            for metric, value in values.items():
+                bucket = bisect.bisect_left(BUCKETS[metric], value)
+                self.counts[(view_name, metric, bucket)] += 1
+
+            interval = getattr(settings, 'STORE_METRICS_FLUSH_INTERVAL', 10)
+            if time.monotonic() - self.flushed < interval:
+                return
+            counts, self.counts = self.counts, defaultdict(int)
+            self.flushed = time.monotonic()
+
+        self.flush(counts)
+
+    def flush(self, counts):
+        names = {view_name for view_name, metric, bucket in counts}
+        if names - self.names:
+            known = set(cache.get(METRICS_NAMES_KEY) or ())
+            if names - known:
+                cache.set(METRICS_NAMES_KEY, sorted(known | names), METRICS_TIMEOUT)
+            self.names |= known | names
+
+        for (view_name, metric, bucket), count in counts.items():
+            key = METRICS_KEY % (view_name, metric, bucket)
+            cache.add(key, 0, METRICS_TIMEOUT)
+            try:
+                cache.incr(key, count)
+            except ValueError:
+                cache.set(key, count, METRICS_TIMEOUT)
+
+
+_buffer = MetricsBuffer()
+
+
+class RequestMetricsMiddleware:
+    """Число и время SQL-запросов, время шаблонов и общее время по имени URL.
+
+    Учитываются и запросы ORM, и вызовы процедур через connection.cursor().
+    Сотрудникам (и при DEBUG) замеры отдаются в заголовке Server-Timing.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        try:
+            with ExitStack() as stack:
+                self.install_wrappers(stack, metrics)
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+
+        return self.finish(request, response, metrics, request.user.is_staff)
+
+    async def __acall__(self, request):
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        stack = ExitStack()
+        try:
+            # соединения с БД принадлежат потоку, в котором async-view
+            # выполняют запросы (sync_to_async), обертки ставятся там же
+            await sync_to_async(self.install_wrappers)(stack, metrics)
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(stack.close)()
+            _current.reset(token)
+
+        is_staff = await sync_to_async(lambda: request.user.is_staff)()
+        return self.finish(request, response, metrics, is_staff)
+
+    def install_wrappers(self, stack, metrics):
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(metrics))
+
+    def finish(self, request, response, metrics, is_staff):
+        total = (time.perf_counter() - metrics.started) * 1000
+        match = request.resolver_match
+        if match is not None and match.view_name:
+            _buffer.add(match.view_name, {
+                'queries': metrics.queries,
+                'sql': metrics.sql,
+                'template': metrics.template,
+                'total': total,
+            })
+
+        if settings.DEBUG or is_staff:
+            response['Server-Timing'] = metrics.server_timing(total)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        metrics = _current.get()
+        if metrics is not None:
+            metrics.view_name = request.resolver_match.view_name
+
+
+class TimedTemplate(Template):
+
+    def render(self, context=None, request=None):
+        metrics = _current.get()
+        if metrics is None:
+            return super().render(context, request)
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            metrics.template += (time.perf_counter() - started) * 1000
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """Шаблонизатор Django, который засекает время отрисовки шаблонов"""
+
+    def from_string(self, template_code):
+        return TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        template = super().get_template(template_name)
+        return TimedTemplate(template.template, self)
+
+
+def flush_metrics():
+    """Сразу переносит накопленные в процессе замеры в общий кэш"""
+    with _buffer.lock:
+        counts, _buffer.counts = _buffer.counts, defaultdict(int)
+        _buffer.flushed = time.monotonic()
+    _buffer.flush(counts)
+
+
+def percentile(counts, bounds, percent):
+    """Верхняя граница корзины, в которую попадает percent% запросов"""
+    total = sum(counts)
+    if not total:
+        return None
+    threshold = total * percent / 100
+    seen = 0
+    for bucket, count in enumerate(counts):
+        seen += count
+        if seen >= threshold:
+            return bounds[bucket] if bucket < len(bounds) else '> %s' % bounds[-1]
+    return None
+
+
+def get_stats():
+    """Сводка по именам URL: число запросов и перцентили каждой метрики"""
+    names = cache.get(METRICS_NAMES_KEY) or []
+    keys = [
+        METRICS_KEY % (name, metric, bucket)
+        for name in names
+        for metric, bounds in BUCKETS.items()
+        for bucket in range(len(bounds) + 1)
+    ]
+    values = cache.get_many(keys)
+
+    stats = []
+    for name in names:
+        row = {'name': name, 'metrics': {}}
+        for metric, bounds in BUCKETS.items():
+            counts = [
+                values.get(METRICS_KEY % (name, metric, bucket), 0)
+                for bucket in range(len(bounds) + 1)
+            ]
+            row['requests'] = sum(counts)
+            labels = ['≤ %s' % bound for bound in bounds] + ['> %s' % bounds[-1]]
+            row['metrics'][metric] = {
+                'histogram': list(zip(labels, counts)),
+                'percentiles': [percentile(counts, bounds, p) for p in PERCENTILES],
+            }
+        stats.append(row)
+    stats.sort(key=lambda row: row['requests'], reverse=True)
+    return stats
@@ -1,9 +1,42 @@
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.conf import settings
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
+from django.core.files.storage import default_storage
 from django.db import models
 from django.urls import reverse
+from django.utils import timezone
 from django.utils.text import slugify
 from django.core.validators import MaxValueValidator, MinValueValidator
 
-class ProductManager(models.Manager):
+from .units import normalise_enum, parse_number
+
+class ProductQuerySet(models.QuerySet):
+    """Выборки товара"""
+
+    # поля, которые выводятся в таблицах списков товара
+    LISTING_FIELDS = (
+        'name', 'slug', 'price', 'price_discount', 'warranty', 'count',
+        'created_in', 'updated_in',
+        'manufacturer__name', 'product_type__name', 'discount__amount',
+    )
+
+    def for_listing(self):
+        """Товар для страниц со списками: связанные таблицы подгружаются
+        одним JOIN, а неиспользуемые поля (описание и т.п.) не читаются"""
+        return self.select_related(
+            'manufacturer', 'product_type', 'discount'
+        ).only(*self.LISTING_FIELDS).annotate(
+            # миниатюра главного изображения читается в том же запросе
+            main_thumbnail=models.Subquery(
+                ProductImage.objects.filter(
+                    product=models.OuterRef('pk'), main_image=True
+                ).exclude(thumbnail='').order_by('id').values('thumbnail')[:1]
+            )
+        )
+
+class ProductManager(models.Manager.from_queryset(ProductQuerySet)):
     def get_queryset(self):
         return super(ProductManager, self).get_queryset().filter(is_active=True)
 
@@ -87,6 +120,23 @@ class ProductTechnicalData(models.Model):
         max_length=255,
     )
     product_type = models.ForeignKey(ProductType, on_delete=models.RESTRICT)
+    value_type = models.CharField(
+        verbose_name='Тип значения',
+        max_length=16,
+        choices=[
+            ('text', 'Текст'),
+            ('number', 'Число'),
+            ('enum', 'Вариант из списка'),
+        ],
+        default='text',
+        help_text='Числовые и списочные параметры можно использовать в фильтрах'
+    )
+    unit = models.CharField(
+        verbose_name='Единица измерения',
+        max_length=32,
+        blank=True,
+        help_text='Числа в других единицах (например, ТБ вместо ГБ) переводятся в эту'
+    )
 
     class Meta:
         db_table = 'product_technical_data'
@@ -138,14 +188,34 @@ class Product(models.Model):
         Discount, on_delete=models.CASCADE, verbose_name='Скидка', blank=True, null=True
     )
     count = models.IntegerField(verbose_name='Количество товара')
-    objects = models.Manager()
+    # заполняется триггером из code.sql (название, описание и характеристики)
+    search_vector = SearchVectorField(null=True, editable=False)
+    objects = ProductQuerySet.as_manager()
     products = ProductManager()
 
     class Meta:
         db_table = 'products'
         verbose_name = 'Товар'
         verbose_name_plural = 'Товары'
-        ordering = ('-created_in',)
+        ordering = ('-created_in', '-id')
+        indexes = [
+            # постраничный вывод по курсору (store.pagination.CursorPaginator)
+            models.Index(fields=['-created_in', '-id'], name='products_created_id_idx'),
+            models.Index(
+                fields=['category', '-created_in', '-id'],
+                name='products_category_created_idx'
+            ),
+            # фильтр по типу товара в админке
+            models.Index(
+                fields=['product_type', '-created_in', '-id'],
+                name='products_type_created_idx'
+            ),
+            # выборка по времени обновления (store.stock.products_by_age),
+            # индекс читается в обе стороны
+            models.Index(fields=['updated_in', 'id'], name='products_updated_id_idx'),
+            # полнотекстовый поиск (store.search)
+            GinIndex(fields=['search_vector'], name='products_search_idx'),
+        ]
 
     def __str__(self):
         return self.name
@@ -153,8 +223,33 @@ class Product(models.Model):
     def get_absolute_url(self):
         return reverse('store:product_detail', args=[self.slug])
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # категория на момент загрузки: при переносе товара в другую
+        # категорию сбрасываются фрагменты обеих (store.signals)
+        instance._loaded_category_id = instance.__dict__.get('category_id')
+        return instance
+
+    @property
+    def thumbnail_url(self):
+        """Миниатюра главного изображения (есть у товара из for_listing())"""
+        thumbnail = getattr(self, 'main_thumbnail', None)
+        return default_storage.url(thumbnail) if thumbnail else None
+
+    def get_price_discount(self):
+        """Цена со скидкой (то же считает store.pricing одним UPDATE)"""
+        if self.discount_id is None:
+            return self.price
+        price = Decimal(self.price)
+        return (price - price * self.discount.amount / 100).quantize(Decimal('0.01'), ROUND_HALF_UP)
+
     def save(self, *args, **kwargs):
         self.slug = slugify(self.name)
+        self.price_discount = self.get_price_discount()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'price', 'discount'} & set(update_fields):
+            kwargs['update_fields'] = set(update_fields) | {'price_discount'}
         super(Product, self).save(*args, **kwargs)
 
 class ProductTechnicalDataValue(models.Model):
@@ -168,15 +263,45 @@ class ProductTechnicalDataValue(models.Model):
         max_length=255,
         help_text='Значение технического параметра товара (максимум 255 символов)'
     )
+    # типизированные копии value для фильтрации (заполняются в fill_typed_values)
+    value_number = models.DecimalField(
+        max_digits=30, decimal_places=6, blank=True, null=True, editable=False
+    )
+    value_enum = models.CharField(max_length=255, blank=True, editable=False)
 
     class Meta:
         db_table = 'product_technical_data_value'
         verbose_name = 'Значение технических параметров продукта'
         verbose_name_plural = 'Значения технических параметров продуктов'
+        indexes = [
+            # фильтры по характеристикам (store.specs)
+            models.Index(
+                fields=['technical_data', 'value_number', 'product'],
+                name='tdv_number_idx'
+            ),
+            models.Index(
+                fields=['technical_data', 'value_enum', 'product'],
+                name='tdv_enum_idx'
+            ),
+        ]
 
     def __str__(self):
         return self.value
 
+    def fill_typed_values(self, technical_data=None):
+        technical_data = technical_data or self.technical_data
+        self.value_enum = normalise_enum(self.value)
+        self.value_number = None
+        if technical_data.value_type == 'number':
+            self.value_number = parse_number(self.value, technical_data.unit)
+
+    def save(self, *args, **kwargs):
+        self.fill_typed_values()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'value' in update_fields:
+            kwargs['update_fields'] = set(update_fields) | {'value_number', 'value_enum'}
+        super(ProductTechnicalDataValue, self).save(*args, **kwargs)
+
 class ProductImage(models.Model):
     """Таблица изображений товара"""
     product = models.ForeignKey(
@@ -193,8 +318,177 @@ class ProductImage(models.Model):
     created_in = models.DateTimeField(auto_now_add=True, editable=False)
     updated_in = models.DateTimeField(auto_now=True)
     main_image = models.BooleanField(default=False)
+    # уменьшенные копии (store.images): {'webp': [[ширина, имя файла], ...], 'jpeg': [...]}
+    renditions = models.JSONField(default=dict, blank=True, editable=False)
+    thumbnail = models.CharField(max_length=255, blank=True, editable=False)
 
     class Meta:
         db_table = 'product_image'
         verbose_name = 'Изображения продукта'
         verbose_name_plural = 'Изображения продуктов'
+
+    def get_srcset(self, ext):
+        return ', '.join(
+            '%s %sw' % (default_storage.url(name), width)
+            for width, name in self.renditions.get(ext, [])
+        )
+
+    @property
+    def webp_srcset(self):
+        return self.get_srcset('webp')
+
+    @property
+    def jpeg_srcset(self):
+        return self.get_srcset('jpeg')
+
+    @property
+    def display_url(self):
+        """Адрес для src: самая большая копия, а пока копий нет -- оригинал"""
+        if self.has_renditions:
+            return default_storage.url(self.renditions['jpeg'][-1][1])
+        return self.image.url
+
+    @property
+    def has_renditions(self):
+        return self.renditions.get('source') == self.image.name
+
+class StockMovement(models.Model):
+    """Журнал изменений количества товара (записи только добавляются)"""
+    # без внешнего ключа в БД: история остается после удаления товара (del_product)
+    product = models.ForeignKey(
+        Product, on_delete=models.DO_NOTHING, db_constraint=False,
+        related_name='stock_movements', verbose_name='Товар'
+    )
+    delta = models.IntegerField(verbose_name='Изменение')
+    count_after = models.IntegerField(verbose_name='Остаток после изменения')
+    reason = models.CharField(verbose_name='Причина', max_length=255, blank=True)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.SET_NULL,
+        blank=True, null=True, verbose_name='Пользователь'
+    )
+    created_in = models.DateTimeField(auto_now_add=True, editable=False, verbose_name='Создан')
+
+    class Meta:
+        db_table = 'stock_movement'
+        verbose_name = 'Изменение количества товара'
+        verbose_name_plural = 'Изменения количества товара'
+        ordering = ('-created_in', '-id')
+        indexes = [
+            models.Index(fields=['product', '-created_in'], name='stock_movement_product_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.product_id}: {self.delta:+d}'
+
+class ProductChange(models.Model):
+    """Журнал изменений товара для внешних систем (строки пишет триггер из code.sql).
+
+    Триггер видит все изменения таблицы products, в том числе массовые
+    UPDATE и удаление процедурой del_product. Записи читаются по курсору
+    (transaction_id, id), см. store.changes.
+    """
+    CREATE = 'create'
+    UPDATE = 'update'
+    STOCK = 'stock'
+    DELETE = 'delete'
+    ACTIONS = [
+        (CREATE, 'Создан'),
+        (UPDATE, 'Изменен'),
+        (STOCK, 'Изменено количество'),
+        (DELETE, 'Удален'),
+    ]
+
+    id = models.BigAutoField(primary_key=True)
+    # без внешнего ключа: запись об удалении остается после товара
+    product_id = models.BigIntegerField(verbose_name='Товар')
+    action = models.CharField(verbose_name='Изменение', max_length=16, choices=ACTIONS)
+    # строка товара после изменения (для удаления -- пусто)
+    data = models.JSONField(verbose_name='Данные', blank=True, null=True)
+    # номер транзакции, которая записала изменение (txid_current())
+    transaction_id = models.BigIntegerField()
+    changed_in = models.DateTimeField(default=timezone.now, verbose_name='Изменен')
+
+    class Meta:
+        db_table = 'product_changes'
+        verbose_name = 'Изменение товара'
+        verbose_name_plural = 'Изменения товара'
+        ordering = ('transaction_id', 'id')
+        indexes = [
+            models.Index(fields=['transaction_id', 'id'], name='product_changes_cursor_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.product_id}: {self.action}'
+
+class InventoryValuation(models.Model):
+    """Сводка стоимости товара (таблица заполняется триггером из code.sql)"""
+    MANUFACTURER = 'manufacturer'
+    PRODUCT_TYPE = 'product_type'
+
+    scope = models.CharField(max_length=16)
+    scope_id = models.BigIntegerField()
+    products_count = models.BigIntegerField(verbose_name='Количество позиций')
+    total_count = models.BigIntegerField(verbose_name='Количество товара')
+    total_price = models.DecimalField(
+        verbose_name='На сумму', max_digits=20, decimal_places=2
+    )
+
+    class Meta:
+        managed = False
+        db_table = 'inventory_valuation'
+        verbose_name = 'Сводка стоимости товара'
+        verbose_name_plural = 'Сводка стоимости товара'
+
+class Task(models.Model):
+    """Очередь фоновых задач в БД (store.queue), задачи выполняет команда run_tasks"""
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+
+    name = models.CharField(verbose_name='Задача', max_length=255)
+    args = models.JSONField(verbose_name='Аргументы', default=list, blank=True)
+    priority = models.SmallIntegerField(
+        verbose_name='Приоритет', default=0,
+        help_text='Задачи с большим приоритетом выполняются раньше'
+    )
+    status = models.CharField(
+        verbose_name='Статус',
+        max_length=16,
+        choices=[
+            (QUEUED, 'В очереди'),
+            (RUNNING, 'Выполняется'),
+            (DONE, 'Выполнена'),
+            (FAILED, 'Ошибка'),
+        ],
+        default=QUEUED
+    )
+    attempts = models.PositiveSmallIntegerField(verbose_name='Попыток', default=0)
+    max_attempts = models.PositiveSmallIntegerField(verbose_name='Максимум попыток', default=3)
+    run_after = models.DateTimeField(verbose_name='Не раньше', default=timezone.now)
+    last_error = models.TextField(verbose_name='Последняя ошибка', blank=True)
+    created_in = models.DateTimeField(auto_now_add=True, editable=False, verbose_name='Создана')
+    started_in = models.DateTimeField(blank=True, null=True, verbose_name='Начата')
+    finished_in = models.DateTimeField(blank=True, null=True, verbose_name='Завершена')
+
+    class Meta:
+        db_table = 'task_queue'
+        verbose_name = 'Фоновая задача'
+        verbose_name_plural = 'Фоновые задачи'
+        ordering = ('-priority', 'run_after', 'id')
+        indexes = [
+            # выбор следующей задачи воркером: только задачи в очереди
+            models.Index(
+                fields=['-priority', 'run_after', 'id'],
+                condition=models.Q(status='queued'),
+                name='task_queue_ready_idx'
+            ),
+            models.Index(
+                fields=['started_in'],
+                condition=models.Q(status='running'),
+                name='task_queue_running_idx'
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.name} #{self.pk}'
@@ -0,0 +1,233 @@
+import base64
+import binascii
+import datetime
+
+from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger, InvalidPage
+from django.db import connections
+from django.utils.functional import cached_property
+
+# таблицу меньше этого размера (по оценке) дешевле посчитать точно
+ESTIMATE_THRESHOLD = 10000
+# отфильтрованная выборка считается не дальше этой строки
+COUNT_LIMIT = 100000
+
+
+class InvalidCursor(InvalidPage):
+    pass
+
+
+class CursorPage:
+    """Страница товара, полученная по курсору"""
+
+    def __init__(self, object_list, paginator, has_next, has_previous):
+        self.object_list = object_list
+        self.paginator = paginator
+        self._has_next = has_next
+        self._has_previous = has_previous
+
+    def __repr__(self):
+        return '<CursorPage (%s items)>' % len(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+    @property
+    def next_cursor(self):
+        if not self.has_next() or not self.object_list:
+            return None
+        return self.paginator.encode_cursor(self.object_list[-1], 'n')
+
+    @property
+    def previous_cursor(self):
+        if not self.has_previous() or not self.object_list:
+            return None
+        return self.paginator.encode_cursor(self.object_list[0], 'p')
+
+
+class CursorPaginator:
+    """Постраничный вывод по ключу (field, id) без OFFSET и COUNT(*).
+
+    По умолчанию порядок совпадает с Product.Meta.ordering (-created_in, -id),
+    поэтому страницы читаются по индексу на (created_in, id) сколько бы
+    строк ни было в таблице. Для другого поля (например, updated_in)
+    нужен свой индекс на (field, id).
+    """
+    is_cursor = True
+
+    def __init__(self, object_list, per_page, field='created_in', descending=True):
+        self.object_list = object_list
+        self.per_page = int(per_page)
+        self.field = field
+        self.descending = descending
+        sign = '-' if descending else ''
+        self.ordering = (sign + field, sign + 'id')
+
+    def encode_cursor(self, obj, direction):
+        raw = '%s|%s|%s' % (direction, getattr(obj, self.field).isoformat(), obj.pk)
+        return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+    def decode_cursor(self, cursor):
+        try:
+            raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+            direction, value, pk = raw.split('|')
+            value = datetime.datetime.fromisoformat(value)
+            pk = int(pk)
+        except (binascii.Error, UnicodeDecodeError, ValueError):
+            raise InvalidCursor('Некорректный курсор страницы')
+        if direction not in ('n', 'p'):
+            raise InvalidCursor('Некорректный курсор страницы')
+        return direction, value, pk
+
+    def get_queryset(self, cursor):
+        """Запрос строк страницы (на одну больше, чтобы узнать, есть ли еще)"""
+        if not cursor:
+            return 'start', self.object_list.order_by(*self.ordering)[:self.per_page + 1]
+
+        direction, value, pk = self.decode_cursor(cursor)
+        field = self.field
+
+        # следующая страница при обратном порядке -- строки с меньшим
+        # ключом (field, id), предыдущая -- с большим (и наоборот)
+        if (direction == 'n') == self.descending:
+            queryset = self.object_list.filter(**{field + '__lte': value}).exclude(
+                **{field: value, 'id__gte': pk}
+            ).order_by('-' + field, '-id')
+        else:
+            queryset = self.object_list.filter(**{field + '__gte': value}).exclude(
+                **{field: value, 'id__lte': pk}
+            ).order_by(field, 'id')
+        # строки перед курсором читаются в обратном порядке и разворачиваются
+        return direction, queryset[:self.per_page + 1]
+
+    def make_page(self, direction, rows):
+        # соседняя страница в обратную сторону есть, только если строки
+        # по курсору нашлись: сама строка курсора могла быть удалена
+        more = len(rows) > self.per_page
+        if direction == 'start':
+            return CursorPage(rows[:self.per_page], self, more, False)
+        if direction == 'n':
+            return CursorPage(rows[:self.per_page], self, more, bool(rows))
+        return CursorPage(rows[:self.per_page][::-1], self, bool(rows), more)
+
+    def page(self, cursor=None):
+        direction, queryset = self.get_queryset(cursor)
+        rows = list(queryset)
+        # по устаревшей ссылке строк не осталось: выводится первая страница
+        if not rows and direction != 'start':
+            direction, queryset = self.get_queryset(None)
+            rows = list(queryset)
+        return self.make_page(direction, rows)
+
+    async def apage(self, cursor=None):
+        """Страница через асинхронный ORM (для async-view)"""
+        direction, queryset = self.get_queryset(cursor)
+        rows = [row async for row in queryset]
+        if not rows and direction != 'start':
+            direction, queryset = self.get_queryset(None)
+            rows = [row async for row in queryset]
+        return self.make_page(direction, rows)
+
+
+def estimate_count(queryset):
+    """Оценка числа строк таблицы queryset по статистике PostgreSQL.
+
+    pg_class.reltuples обновляется VACUUM и ANALYZE (в том числе
+    autovacuum) и читается без обхода таблицы. Для выборки с условиями,
+    другой СУБД или таблицы без статистики возвращает None.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql' or queryset.query.where or queryset.query.is_sliced:
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT reltuples FROM pg_class WHERE oid = %s::regclass',
+            [connection.ops.quote_name(queryset.model._meta.db_table)]
+        )
+        row = cursor.fetchone()
+    if row is None or row[0] < 0:
+        return None
+    return int(row[0])
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator, который не считает COUNT(*) по всей большой таблице.
+
+    Без фильтров число строк берется из estimate_count(), поэтому
+    номер последней страницы приблизительный. Отфильтрованная выборка
+    и небольшая таблица считаются точно, но не дальше COUNT_LIMIT строк
+    (COUNT по подзапросу с LIMIT).
+    """
+
+    @cached_property
+    def count(self):
+        estimate = estimate_count(self.object_list)
+        if estimate is not None and estimate >= ESTIMATE_THRESHOLD:
+            return estimate
+        return self.object_list.order_by()[:COUNT_LIMIT].count()
+
+
+def get_page(request, object_list, per_page=10, cursor=False, **cursor_options):
+    """Страница для шаблона.
+
+    При cursor=True используется CursorPaginator (параметр ?cursor=),
+    cursor_options -- его field и descending. Иначе обычный Paginator
+    (параметр ?page=) с сокращенным списком страниц.
+    """
+    if cursor:
+        paginator = CursorPaginator(object_list, per_page, **cursor_options)
+        try:
+            page_obj = paginator.page(request.GET.get('cursor'))
+        except InvalidCursor:
+            page_obj = paginator.page()
+        page_obj.query_prefix = get_query_prefix(request)
+        return page_obj
+
+    paginator = Paginator(object_list, per_page)
+    page_number = request.GET.get('page', 1)
+
+    try:
+        page_obj = paginator.page(page_number)
+    except PageNotAnInteger:
+        page_obj = paginator.page(1)
+    except EmptyPage:
+        page_obj = paginator.page(paginator.num_pages)
+
+    page_obj.elided_page_range = paginator.get_elided_page_range(
+        page_obj.number, on_each_side=2, on_ends=1
+    )
+    page_obj.query_prefix = get_query_prefix(request)
+    return page_obj
+
+
+async def aget_page(request, object_list, per_page=10):
+    """Асинхронный вариант get_page(..., cursor=True)"""
+    paginator = CursorPaginator(object_list, per_page)
+    try:
+        page_obj = await paginator.apage(request.GET.get('cursor'))
+    except InvalidCursor:
+        page_obj = await paginator.apage()
+    page_obj.query_prefix = get_query_prefix(request)
+    return page_obj
+
+
+def get_query_prefix(request):
+    """Остальные параметры запроса (фильтры, поиск) для ссылок на страницы"""
+    params = request.GET.copy()
+    params.pop('page', None)
+    params.pop('cursor', None)
+    return params.urlencode() + '&' if params else ''
@@ -0,0 +1,86 @@
+from django.db import models
+from django.db.models import F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Round
+from django.utils import timezone
+
+from .caching import CATALOG_VERSION, bump_versions
+from .models import Discount, Product
+
+PRICE_FIELD = models.DecimalField(max_digits=8, decimal_places=2)
+
+
+def discounted_price(amount):
+    """Выражение цены со скидкой amount (в процентах), как в Product.get_price_discount"""
+    return Round(
+        models.ExpressionWrapper(
+            F('price') - F('price') * amount / Value(100), output_field=PRICE_FIELD
+        ),
+        2, output_field=PRICE_FIELD
+    )
+
+
+def current_price_discount():
+    """Цена со скидкой, которая сейчас назначена товару (без скидки -- цена)"""
+    amount = Subquery(
+        Discount.objects.filter(pk=OuterRef('discount_id')).values('amount')[:1]
+    )
+    return discounted_price(Coalesce(amount, Value(0)))
+
+
+def reprice_products(products):
+    """Пересчитывает price_discount у выбранного товара одним UPDATE.
+
+    Строки, у которых цена со скидкой не изменилась, не перезаписываются.
+    Возвращает количество измененных строк.
+    """
+    price = current_price_discount()
+    updated = Product.objects.filter(
+        pk__in=products.values('pk')
+    ).exclude(price_discount=price).update(
+        price_discount=price, updated_in=timezone.now()
+    )
+    if updated:
+        bump_versions(CATALOG_VERSION)
+    return updated
+
+
+def reprice_discount(discount):
+    """Пересчет всего товара со скидкой (после изменения ее размера).
+
+    Размер скидки известен заранее, поэтому UPDATE обходится без подзапроса.
+    """
+    price = discounted_price(Value(discount.amount))
+    updated = Product.objects.filter(discount_id=discount.pk).exclude(
+        price_discount=price
+    ).update(price_discount=price, updated_in=timezone.now())
+    if updated:
+        bump_versions(CATALOG_VERSION)
+    return updated
+
+
+def apply_discount(products, discount):
+    """Назначает скидку (или снимает при discount=None) выбранному товару.
+
+    Скидка и новая цена записываются одним UPDATE.
+    Возвращает количество измененных строк.
+    """
+    if discount is None:
+        price = F('price')
+    else:
+        price = discounted_price(Value(discount.amount))
+    updated = Product.objects.filter(pk__in=products.values('pk')).update(
+        discount=discount, price_discount=price, updated_in=timezone.now()
+    )
+    if updated:
+        bump_versions(CATALOG_VERSION)
+    return updated
+
+
+def apply_discount_to(discount, category=None, manufacturer=None):
+    """Назначает скидку всему товару категории и (или) производителя"""
+    products = Product.objects.all()
+    if category is not None:
+        products = products.filter(category=category)
+    if manufacturer is not None:
+        products = products.filter(manufacturer=manufacturer)
+    return apply_discount(products, discount)
@@ -0,0 +1,137 @@
+import datetime
+import logging
+import traceback
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Task
+
+logger = logging.getLogger(__name__)
+
+# зарегистрированные задачи: имя -> функция
+TASKS = {}
+
+# задержка перед повтором: RETRY_DELAY * 2 ** (номер попытки - 1) секунд
+RETRY_DELAY = 10
+# задача, которая выполняется дольше, считается брошенной (воркер упал)
+STALE_TIMEOUT = datetime.timedelta(minutes=30)
+
+
+class UnknownTask(Exception):
+    pass
+
+
+def task(name=None, priority=0, max_attempts=3):
+    """Регистрирует функцию как фоновую задачу.
+
+    Функция получает метод enqueue(*args), который ставит ее в очередь.
+    Аргументы задачи хранятся в JSON, поэтому передаются только
+    простые значения (id вместо объектов моделей).
+    """
+    def decorator(func):
+        task_name = name or f'{func.__module__}.{func.__name__}'
+        TASKS[task_name] = func
+
+        def enqueue(*args, **options):
+            return enqueue_task(
+                task_name, args,
+                priority=options.get('priority', priority),
+                max_attempts=options.get('max_attempts', max_attempts),
+                run_after=options.get('run_after'),
+            )
+
+        func.task_name = task_name
+        func.enqueue = enqueue
+        return func
+    return decorator
+
+
+def enqueue_task(name, args=(), priority=0, max_attempts=3, run_after=None):
+    """Ставит задачу в очередь.
+
+    Строка задачи пишется в текущей транзакции, так что воркер увидит
+    задачу только после ее фиксации и не начнет работу над данными,
+    которые еще не сохранены (или откатились).
+    При STORE_TASKS_EAGER = True задача выполняется сразу после
+    фиксации транзакции в текущем процессе.
+    """
+    if name not in TASKS:
+        raise UnknownTask(name)
+
+    if getattr(settings, 'STORE_TASKS_EAGER', False):
+        transaction.on_commit(lambda: TASKS[name](*args))
+        return None
+
+    return Task.objects.create(
+        name=name, args=list(args), priority=priority,
+        max_attempts=max_attempts, run_after=run_after or timezone.now(),
+    )
+
+
+def claim_task():
+    """Забирает следующую готовую задачу и помечает ее как выполняемую.
+
+    SELECT ... FOR UPDATE SKIP LOCKED: несколько воркеров не ждут
+    друг друга и никогда не получают одну и ту же задачу.
+    """
+    with transaction.atomic():
+        claimed = Task.objects.select_for_update(skip_locked=True).filter(
+            status=Task.QUEUED, run_after__lte=timezone.now()
+        ).order_by('-priority', 'run_after', 'id').first()
+        if claimed is None:
+            return None
+        claimed.status = Task.RUNNING
+        claimed.attempts = F('attempts') + 1
+        claimed.started_in = timezone.now()
+        claimed.save(update_fields=['status', 'attempts', 'started_in'])
+    claimed.refresh_from_db(fields=['attempts'])
+    return claimed
+
+
+def run_task(claimed):
+    """Выполняет задачу, при ошибке откладывает повтор или помечает ее как неудачную"""
+    func = TASKS.get(claimed.name)
+    try:
+        if func is None:
+            raise UnknownTask(claimed.name)
+        with transaction.atomic():
+            func(*claimed.args)
+    except Exception as error:
+        logger.warning('Задача %s завершилась с ошибкой: %s', claimed, error)
+        claimed.last_error = traceback.format_exc()
+        if claimed.attempts < claimed.max_attempts and not isinstance(error, UnknownTask):
+            claimed.status = Task.QUEUED
+            claimed.run_after = timezone.now() + datetime.timedelta(
+                seconds=RETRY_DELAY * 2 ** (claimed.attempts - 1)
+            )
+        else:
+            claimed.status = Task.FAILED
+            claimed.finished_in = timezone.now()
+    else:
+        claimed.status = Task.DONE
+        claimed.finished_in = timezone.now()
+    claimed.save(update_fields=['status', 'run_after', 'last_error', 'finished_in'])
+    return claimed.status
+
+
+def run_next_task():
+    """Выполняет одну задачу, возвращает ее или None, если очередь пуста"""
+    claimed = claim_task()
+    if claimed is not None:
+        run_task(claimed)
+    return claimed
+
+
+def requeue_stale_tasks(timeout=STALE_TIMEOUT):
+    """Возвращает в очередь задачи, которые слишком долго выполняются.
+
+    Задачи, у которых закончились попытки, помечаются как неудачные.
+    """
+    stale = Task.objects.filter(status=Task.RUNNING, started_in__lt=timezone.now() - timeout)
+    stale.filter(attempts__gte=F('max_attempts')).update(
+        status=Task.FAILED, finished_in=timezone.now(), last_error='Превышено время выполнения'
+    )
+    return stale.update(status=Task.QUEUED, run_after=timezone.now())
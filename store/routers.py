@@ -0,0 +1,148 @@
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+# запросы, которые прошли меньше STORE_REPLICA_STICKY_SECONDS назад
+# после записи, читают с основной БД (реплика может отставать)
+STICKY_COOKIE = 'store_primary'
+
+_state = ContextVar('store_db_routing', default=None)
+
+
+class RoutingState:
+
+    def __init__(self, pinned=False):
+        # запрос прочитает свои изменения из прошлого запроса
+        self.pinned = pinned
+        # чтение разрешено с реплики (отчеты)
+        self.reporting = False
+        # в этом запросе уже была запись
+        self.wrote = False
+
+
+def get_replicas():
+    return getattr(settings, 'STORE_REPLICA_DATABASES', [])
+
+
+def get_read_database():
+    """Псевдоним БД для чтения: реплика внутри read_from_replica, иначе основная.
+
+    Основная БД используется и в отчетах, если реплик нет, если запрос
+    недавно что-то записал или если открыта транзакция на основной БД.
+    """
+    state = _state.get()
+    replicas = get_replicas()
+    if state is None or not state.reporting or state.pinned or state.wrote or not replicas:
+        return DEFAULT_DB_ALIAS
+    if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+        return DEFAULT_DB_ALIAS
+    return random.choice(replicas)
+
+
+def get_read_connection():
+    """Соединение для чтения через connection.cursor(), например вызова процедур"""
+    return connections[get_read_database()]
+
+
+@contextmanager
+def read_from_replica():
+    """Чтение ORM внутри блока (отчеты) может идти с реплики"""
+    state = _state.get()
+    token = None
+    if state is None:
+        state = RoutingState()
+        token = _state.set(state)
+    previous, state.reporting = state.reporting, True
+    try:
+        yield
+    finally:
+        state.reporting = previous
+        if token is not None:
+            _state.reset(token)
+
+
+def replica_reads(view):
+    """Декоратор view с тяжелыми отчетами, которые читают с реплики"""
+    if iscoroutinefunction(view):
+        @wraps(view)
+        async def wrapper(*args, **kwargs):
+            with read_from_replica():
+                return await view(*args, **kwargs)
+    else:
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            with read_from_replica():
+                return view(*args, **kwargs)
+    return wrapper
+
+
+class ReplicaRouter:
+    """Чтение в отчетах -- с реплик, все остальное -- с основной БД"""
+
+    def db_for_read(self, model, **hints):
+        return get_read_database()
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None:
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # реплики содержат те же данные, что и основная БД
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # схема на реплики приходит с репликацией
+        return False if db in get_replicas() else None
+
+
+class ReplicaStickinessMiddleware:
+    """Запоминает в cookie, что пользователь недавно записывал данные.
+
+    Пока cookie живет (STORE_REPLICA_STICKY_SECONDS), отчеты этого
+    пользователя читают с основной БД и показывают его изменения,
+    даже если реплика еще не догнала основную БД.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        state = RoutingState(pinned=STICKY_COOKIE in request.COOKIES)
+        token = _state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _state.reset(token)
+        return self.finish(response, state)
+
+    async def __acall__(self, request):
+        state = RoutingState(pinned=STICKY_COOKIE in request.COOKIES)
+        token = _state.set(state)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _state.reset(token)
+        return self.finish(response, state)
+
+    def finish(self, response, state):
+        if state.wrote and get_replicas():
+            response.set_cookie(
+                STICKY_COOKIE, '1', max_age=settings.STORE_REPLICA_STICKY_SECONDS,
+                httponly=True, samesite='Lax'
+            )
+        return response
@@ -0,0 +1,86 @@
+from django.contrib.postgres.search import SearchQuery, SearchRank, TrigramSimilarity
+from django.db.models import Count, F, Q
+
+from .models import Product
+
+SEARCH_CONFIG = 'russian'
+FACET_LIMIT = 20
+
+# фасеты: параметр запроса -> (поле фильтра, поле названия)
+FACETS = {
+    'category': ('category_id', 'category__name'),
+    'manufacturer': ('manufacturer_id', 'manufacturer__name'),
+    'product_type': ('product_type_id', 'product_type__name'),
+}
+DISCOUNT_CHOICES = ('yes', 'no')
+
+
+def clean_filters(params):
+    """Фильтры поиска из параметров запроса.
+
+    Фасет -- id записи, значение не числом (или не из DISCOUNT_CHOICES)
+    считается не выбранным, а не ломает запрос к БД.
+    """
+    filters = {}
+    for name in FACETS:
+        value = params.get(name, '')
+        filters[name] = value if value.isascii() and value.isdigit() and len(value) <= 18 else ''
+    discount = params.get('discount', '')
+    filters['discount'] = discount if discount in DISCOUNT_CHOICES else ''
+    return filters
+
+
+def search_products(query, filters=None):
+    """Поиск товара по названию, описанию и значениям характеристик.
+
+    Используется tsvector (products.search_vector, заполняется триггером
+    из code.sql) с русской морфологией, а если по нему ничего не нашлось,
+    нечеткий поиск по названию через pg_trgm.
+    filters -- словарь {'category': id, 'manufacturer': id,
+    'product_type': id, 'discount': 'yes' | 'no'}.
+    Возвращает (queryset товара, фасеты).
+    """
+    filters = filters or {}
+    products = Product.products.all()
+
+    for name, (field, _) in FACETS.items():
+        if filters.get(name):
+            products = products.filter(**{field: filters[name]})
+    if filters.get('discount') == 'yes':
+        products = products.filter(discount__isnull=False)
+    elif filters.get('discount') == 'no':
+        products = products.filter(discount__isnull=True)
+
+    search_query = SearchQuery(query, config=SEARCH_CONFIG, search_type='websearch')
+    matched = products.filter(search_vector=search_query)
+    rank = SearchRank(F('search_vector'), search_query)
+
+    if not matched.exists():
+        matched = products.filter(name__trigram_similar=query)
+        rank = TrigramSimilarity('name', query)
+
+    found = matched.annotate(rank=rank).order_by('-rank', '-created_in', '-id')
+
+    return found, get_facets(matched)
+
+
+def get_facets(products):
+    """Количество найденного товара по категориям, производителям,
+    типам товара и наличию скидки"""
+    products = products.order_by()
+    facets = {}
+    for name, (field, label_field) in FACETS.items():
+        facets[name] = list(
+            products.values(value=F(field), label=F(label_field))
+            .annotate(count=Count('pk')).order_by('-count', 'label')[:FACET_LIMIT]
+        )
+
+    discount = products.aggregate(
+        yes=Count('pk', filter=Q(discount__isnull=False)),
+        no=Count('pk', filter=Q(discount__isnull=True)),
+    )
+    facets['discount'] = [
+        {'value': 'yes', 'label': 'Со скидкой', 'count': discount['yes']},
+        {'value': 'no', 'label': 'Без скидки', 'count': discount['no']},
+    ]
+    return facets
@@ -0,0 +1,162 @@
+import atexit
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth.backends import ModelBackend
+from django.contrib.sessions.backends import cached_db
+from django.contrib.sessions.middleware import SessionMiddleware as BaseSessionMiddleware
+from django.core.cache import cache, caches
+from django.db import DatabaseError, connection
+
+logger = logging.getLogger(__name__)
+
+USER_KEY = 'store:user:%s'
+USER_TIMEOUT = 60 * 60
+REFRESH_KEY = 'store:session-refresh:%s'
+# как часто продлевается срок сессии, данные которой не менялись, в секундах
+REFRESH_INTERVAL = 5 * 60
+# как часто продленные сроки переносятся в БД, в секундах
+FLUSH_INTERVAL = 10
+
+
+class ExpiryBuffer:
+    """Новые сроки сессий процесса, которые записываются в БД пачкой.
+
+    Кэш получает новый срок сразу, БД -- с задержкой до FLUSH_INTERVAL:
+    копия в БД нужна, только если сессия вытеснена из кэша.
+    Сроки записывает и таймер, и выход из процесса, так что они
+    не теряются, если после запроса процесс простаивает или завершается.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pending = {}
+        self.flushed = time.monotonic()
+        self.timer = None
+
+    def add(self, session_key, expire_date):
+        with self.lock:
+            self.pending[session_key] = expire_date
+            if self.timer is None:
+                self.timer = threading.Timer(FLUSH_INTERVAL, self.flush_by_timer)
+                self.timer.daemon = True
+                self.timer.start()
+
+    def flush(self, force=False):
+        with self.lock:
+            if not self.pending or (not force and time.monotonic() - self.flushed < FLUSH_INTERVAL):
+                return 0
+            pending, self.pending = self.pending, {}
+            self.flushed = time.monotonic()
+
+        model = SessionStore.get_model_class()
+        try:
+            model.objects.bulk_update(
+                [model(session_key=key, expire_date=date) for key, date in pending.items()],
+                ['expire_date'], batch_size=500
+            )
+        except DatabaseError:
+            # сроки вернутся в очередь, если их еще не заменили более новые
+            with self.lock:
+                self.pending = {**pending, **self.pending}
+            raise
+        return len(pending)
+
+    def flush_by_timer(self):
+        with self.lock:
+            self.timer = None
+        try:
+            self.flush(force=True)
+        except DatabaseError as error:
+            logger.warning('Сроки сессий не записаны: %s', error)
+        finally:
+            # у потока таймера свое соединение с БД
+            connection.close()
+
+
+_expiry = ExpiryBuffer()
+
+
+def flush_session_expiry(force=False):
+    return _expiry.flush(force)
+
+
+@atexit.register
+def _flush_at_exit():
+    try:
+        _expiry.flush(force=True)
+    except DatabaseError as error:
+        logger.warning('Сроки сессий не записаны: %s', error)
+
+
+class SessionStore(cached_db.SessionStore):
+    """Сессия в кэше с копией в БД (как cached_db), но без лишних записей.
+
+    Если данные не отличаются от загруженных, сессия в БД не пишется:
+    в кэше продлевается срок, а expire_date в БД обновляется
+    позже вместе с другими сессиями (ExpiryBuffer).
+    """
+
+    _loaded = None
+
+    def load(self):
+        data = super().load()
+        self._loaded = self.serializer().dumps(data)
+        return data
+
+    def is_unchanged(self):
+        return self._loaded is not None and self.session_key is not None \
+            and self.serializer().dumps(self._get_session()) == self._loaded
+
+    def save(self, must_create=False):
+        if not must_create and self.is_unchanged():
+            self.extend_expiry()
+            return
+        super().save(must_create)
+        self._loaded = self.serializer().dumps(self._session)
+        self._cache.set(REFRESH_KEY % self.session_key, 1, REFRESH_INTERVAL)
+
+    def extend_expiry(self):
+        self._cache.set(self.cache_key, self._session, self.get_expiry_age())
+        _expiry.add(self.session_key, self.get_expiry_date())
+        _expiry.flush()
+
+
+class SessionMiddleware(BaseSessionMiddleware):
+    """SessionMiddleware, который продлевает сессию не чаще REFRESH_INTERVAL.
+
+    Стандартный продлевает сессию (и cookie) только при изменении
+    данных или на каждом запросе (SESSION_SAVE_EVERY_REQUEST).
+    """
+
+    def process_response(self, request, response):
+        session = getattr(request, 'session', None)
+        if session is not None and session.accessed and not session.modified \
+                and session.session_key and not session.is_empty() and response.status_code != 500 \
+                and caches[settings.SESSION_CACHE_ALIAS].add(
+                    REFRESH_KEY % session.session_key, 1, REFRESH_INTERVAL):
+            session.modified = True
+        return super().process_response(request, response)
+
+
+class CachedModelBackend(ModelBackend):
+    """ModelBackend, который берет пользователя сессии из кэша.
+
+    Кэш сбрасывается при сохранении и удалении пользователя
+    и при выходе (store.signals).
+    """
+
+    def get_user(self, user_id):
+        key = USER_KEY % user_id
+        user = cache.get(key)
+        if user is None:
+            user = super().get_user(user_id)
+            if user is not None:
+                cache.set(key, user, USER_TIMEOUT)
+        return user
+
+
+def invalidate_user(user_id):
+    cache.delete(USER_KEY % user_id)
@@ -0,0 +1,31 @@
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.views import redirect_to_login
+from django.http import Http404
+from django.shortcuts import render
+
+# шаблон может обращаться к БД (меню категорий, пользователь),
+# поэтому в async-view он отрисовывается в потоке
+arender = sync_to_async(render)
+
+
+async def aget_object_or_404(queryset, **kwargs):
+    """get_object_or_404 через асинхронный ORM"""
+    try:
+        return await queryset.aget(**kwargs)
+    except queryset.model.DoesNotExist:
+        raise Http404(f'{queryset.model._meta.object_name} не найден')
+
+
+def alogin_required(view_func):
+    """login_required для async-view (в Django 4.1 он их не поддерживает)"""
+
+    @wraps(view_func)
+    async def _wrapped_view(request, *args, **kwargs):
+        is_authenticated = await sync_to_async(lambda: request.user.is_authenticated)()
+        if is_authenticated:
+            return await view_func(request, *args, **kwargs)
+        return redirect_to_login(request.get_full_path())
+
+    return _wrapped_view
@@ -0,0 +1,68 @@
+from django.conf import settings
+from django.contrib.auth.signals import user_logged_out
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .caching import (CATALOG_VERSION, bump_product_versions, bump_versions, category_version,
+                      invalidate_category_menu, invalidate_product_details)
+from .models import (Category, Discount, Manufacturer, Product, ProductImage, ProductTechnicalData,
+                     ProductTechnicalDataValue, ProductType)
+from .pricing import reprice_discount
+from .sessions import invalidate_user
+from .specs import batch_saving_product
+from .tasks import build_renditions, reindex_specs
+
+@receiver([post_save, post_delete], sender=Category)
+def category_changed(sender, instance, **kwargs):
+    invalidate_category_menu()
+    bump_versions(category_version(instance.pk))
+
+@receiver([post_save, post_delete], sender=Product)
+def product_changed(sender, instance, **kwargs):
+    categories = {instance.category_id, getattr(instance, '_loaded_category_id', None)}
+    bump_product_versions([instance.pk], categories - {None})
+
+@receiver([post_save, post_delete], sender=Discount)
+@receiver([post_save, post_delete], sender=Manufacturer)
+@receiver([post_save, post_delete], sender=ProductType)
+def catalog_changed(sender, **kwargs):
+    # скидки, производители и типы показаны в строках всего каталога
+    bump_versions(CATALOG_VERSION)
+
+@receiver([post_save, post_delete], sender=ProductTechnicalDataValue)
+@receiver([post_save, post_delete], sender=ProductImage)
+def product_details_changed(sender, instance, **kwargs):
+    # save_spec_formset сбрасывает кэш товара сам, один раз
+    if batch_saving_product.get() == instance.product_id:
+        return
+    invalidate_product_details(instance.product_id)
+    bump_product_versions([instance.product_id])
+
+@receiver(post_save, sender=ProductTechnicalData)
+def technical_data_changed(sender, instance, created, **kwargs):
+    # название, тип значения или единица могли измениться: пересчитать
+    # value_number/value_enum и сбросить характеристики товара в кэше
+    if not created:
+        reindex_specs.enqueue(instance.pk)
+
+@receiver(post_save, sender=ProductImage)
+def product_image_saved(sender, instance, **kwargs):
+    # новое или замененное изображение: создать уменьшенные копии в фоне
+    if instance.image and not instance.has_renditions:
+        build_renditions.enqueue(instance.pk)
+
+@receiver(post_save, sender=Discount)
+def discount_changed(sender, instance, created, **kwargs):
+    # размер скидки мог измениться: пересчитать цену всего товара с ней
+    if not created:
+        reprice_discount(instance)
+
+@receiver([post_save, post_delete], sender=settings.AUTH_USER_MODEL)
+def user_changed(sender, instance, **kwargs):
+    # в том числе правка профиля, отключение аккаунта и вход (last_login)
+    invalidate_user(instance.pk)
+
+@receiver(user_logged_out)
+def user_left(sender, request, user, **kwargs):
+    if user is not None:
+        invalidate_user(user.pk)
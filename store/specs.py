@@ -0,0 +1,155 @@
+import re
+from contextvars import ContextVar
+
+from django.db.models import Exists, OuterRef
+
+from .caching import CATALOG_VERSION, bump_product_versions, bump_versions, invalidate_product_details
+from .models import ProductTechnicalData, ProductTechnicalDataValue
+from .units import normalise_enum, parse_number
+
+# параметры запроса: spec_<id>=значение (можно несколько), spec_<id>_min, spec_<id>_max
+SPEC_PARAM_RE = re.compile(r'^spec_(\d+)(?:_(min|max))?$')
+
+
+def parse_spec_filters(params):
+    """Условия по характеристикам из параметров запроса.
+
+    Возвращает {id параметра: {'min': str, 'max': str, 'values': [str, ...]}}.
+    """
+    filters = {}
+    for key in params:
+        match = SPEC_PARAM_RE.match(key)
+        if match is None:
+            continue
+        values = [value for value in params.getlist(key) if value.strip()]
+        if not values:
+            continue
+        condition = filters.setdefault(int(match.group(1)), {'min': None, 'max': None, 'values': []})
+        if match.group(2):
+            condition[match.group(2)] = values[0]
+        else:
+            condition['values'].extend(values)
+    return filters
+
+
+def filter_by_specs(products, params):
+    """Отбор товара по нескольким характеристикам сразу.
+
+    Каждое условие -- отдельный EXISTS по product_technical_data_value,
+    который читается по индексу (technical_data, value_number | value_enum).
+    Границы диапазона можно указывать в других единицах ('1 ТБ').
+    """
+    filters = parse_spec_filters(params)
+    if not filters:
+        return products
+
+    technical_data = ProductTechnicalData.objects.in_bulk(list(filters))
+    for technical_data_id, condition in filters.items():
+        parameter = technical_data.get(technical_data_id)
+        if parameter is None:
+            continue
+
+        values = ProductTechnicalDataValue.objects.filter(
+            product=OuterRef('pk'), technical_data_id=technical_data_id
+        )
+        for bound, lookup in (('min', 'value_number__gte'), ('max', 'value_number__lte')):
+            if condition[bound] is not None:
+                number = parse_number(condition[bound], parameter.unit)
+                if number is not None:
+                    values = values.filter(**{lookup: number})
+        if condition['values']:
+            values = values.filter(
+                value_enum__in=[normalise_enum(value) for value in condition['values']]
+            )
+
+        products = products.filter(Exists(values))
+    return products
+
+
+def get_spec_filter_options(products):
+    """Параметры для формы фильтра по товару из products.
+
+    Возвращает числовые и списочные параметры их типов товара,
+    для списочных -- с вариантами значений.
+    """
+    parameters = list(ProductTechnicalData.objects.filter(
+        product_type__in=products.order_by().values('product_type').distinct()
+    ).exclude(value_type='text').order_by('product_type_id', 'name'))
+
+    options = {}
+    enum_ids = [p.pk for p in parameters if p.value_type == 'enum']
+    if enum_ids:
+        for technical_data_id, value in ProductTechnicalDataValue.objects.filter(
+            technical_data_id__in=enum_ids
+        ).values_list('technical_data_id', 'value_enum').distinct().order_by(
+            'technical_data_id', 'value_enum'
+        ):
+            options.setdefault(technical_data_id, []).append(value)
+
+    for parameter in parameters:
+        parameter.options = options.get(parameter.pk, [])
+    return parameters
+
+
+def reindex_values(values, batch_size=1000):
+    """Пересчитывает value_number/value_enum (после смены типа или единицы параметра)"""
+    batch = []
+    total = 0
+    for value in values.select_related('technical_data').order_by('pk').iterator(batch_size):
+        value.fill_typed_values()
+        batch.append(value)
+        if len(batch) >= batch_size:
+            ProductTechnicalDataValue.objects.bulk_update(batch, ['value_number', 'value_enum'])
+            total += len(batch)
+            batch = []
+    if batch:
+        ProductTechnicalDataValue.objects.bulk_update(batch, ['value_number', 'value_enum'])
+        total += len(batch)
+    if total:
+        # варианты фильтров на страницах категорий
+        bump_versions(CATALOG_VERSION)
+    return total
+
+
+# товар, формсет характеристик которого сейчас сохраняется: сигналы
+# строк этого товара не сбрасывают кэш, это делается один раз в конце
+batch_saving_product = ContextVar('batch_saving_product', default=None)
+
+
+def save_spec_formset(formset, product, batch_size=1000):
+    """Сохраняет формсет характеристик товара пакетами.
+
+    Строки без изменений не записываются, новые добавляются одним
+    bulk_create, измененные -- bulk_update, удаленные -- одним
+    DELETE ... WHERE id IN. Кэш товара сбрасывается здесь один раз,
+    а не на каждую строку.
+    Возвращает (добавлено, изменено, удалено).
+    """
+    formset.save(commit=False)
+
+    token = batch_saving_product.set(product.pk)
+    try:
+        deleted = [obj.pk for obj in formset.deleted_objects]
+        if deleted:
+            ProductTechnicalDataValue.objects.filter(product=product, pk__in=deleted).delete()
+
+        changed = [obj for obj, fields in formset.changed_objects]
+        for obj in changed:
+            obj.fill_typed_values()
+        if changed:
+            ProductTechnicalDataValue.objects.bulk_update(
+                changed, ['technical_data', 'value', 'value_number', 'value_enum'],
+                batch_size=batch_size
+            )
+
+        for obj in formset.new_objects:
+            obj.product = product
+            obj.fill_typed_values()
+        ProductTechnicalDataValue.objects.bulk_create(formset.new_objects, batch_size=batch_size)
+    finally:
+        batch_saving_product.reset(token)
+
+    if deleted or changed or formset.new_objects:
+        invalidate_product_details(product.pk)
+        bump_product_versions([product.pk], [product.category_id])
+    return len(formset.new_objects), len(changed), len(deleted)
@@ -0,0 +1,95 @@
+import datetime
+
+from django.db import transaction
+from django.db.models import Case, Count, F, IntegerField, Q, Value, When
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from .caching import bump_product_versions
+from .models import Product, StockMovement
+
+
+def adjust_stock(adjustments, user=None, reason=''):
+    """Изменяет количество товара и записывает изменения в журнал.
+
+    adjustments -- словарь {id товара: изменение количества}.
+    Все изменения выполняются одним UPDATE с F(), остаток не опускается
+    ниже нуля. В журнал пишется фактическое изменение (с учетом этого
+    ограничения). Возвращает словарь {id товара: остаток после изменения},
+    товары, которых нет в БД, в него не попадают.
+    """
+    adjustments = {int(pk): int(delta) for pk, delta in adjustments.items() if int(delta)}
+    if not adjustments:
+        return {}
+
+    with transaction.atomic():
+        products = Product.objects.filter(pk__in=adjustments)
+
+        # остатки до изменения читаются под блокировкой строк; строки
+        # блокируются в одном порядке, чтобы пакетные изменения из разных
+        # запросов не ждали друг друга по кругу
+        rows = list(products.select_for_update().order_by('pk').values_list(
+            'pk', 'count', 'category_id'
+        ))
+        if not rows:
+            return {}
+
+        delta = Case(
+            *[When(pk=pk, then=Value(delta)) for pk, delta in adjustments.items()],
+            default=Value(0), output_field=IntegerField()
+        )
+        products.update(count=Greatest(F('count') + delta, Value(0)), updated_in=timezone.now())
+
+        # пока строки заблокированы, новый остаток равен вычисленному в UPDATE
+        before = {pk: count for pk, count, category_id in rows}
+        counts = {pk: max(count + adjustments[pk], 0) for pk, count in before.items()}
+        bump_product_versions(counts, {category_id for pk, count, category_id in rows})
+        StockMovement.objects.bulk_create([
+            StockMovement(
+                product_id=pk, delta=count - before[pk], count_after=count,
+                reason=reason, user=user
+            )
+            for pk, count in counts.items()
+        ])
+
+    return counts
+
+
+# направление выборки по времени: давно не обновлялся / обновлен недавно
+STALE = 'stale'
+RECENT = 'recent'
+
+
+def products_by_age(window, direction=STALE, queryset=None):
+    """Товар, который не обновлялся дольше window (STALE) или обновлен
+    за последние window (RECENT), window -- timedelta.
+
+    Условие по updated_in читается по индексу products_updated_id_idx,
+    он же дает порядок для постраничного вывода по курсору.
+    """
+    if queryset is None:
+        queryset = Product.objects.all()
+    moment = timezone.now() - window
+    if direction == STALE:
+        return queryset.filter(updated_in__lt=moment)
+    return queryset.filter(updated_in__gte=moment)
+
+
+def staleness_histogram(queryset=None, days=30):
+    """Сколько товара не обновлялось 0, 1, ... days и больше полных дней.
+
+    Считается одним запросом в БД (COUNT ... FILTER по каждому дню).
+    Возвращает [(дней, количество), ...] для всех дней от 0 до days,
+    последний элемент -- days и больше.
+    """
+    if queryset is None:
+        queryset = Product.objects.all()
+    now = timezone.now()
+    bounds = [now - datetime.timedelta(days=day) for day in range(days + 1)]
+    counts = {
+        'day_%s' % day: Count('id', filter=Q(updated_in__lte=bounds[day], updated_in__gt=bounds[day + 1]))
+        for day in range(days)
+    }
+    counts['day_%s' % days] = Count('id', filter=Q(updated_in__lte=bounds[days]))
+    totals = queryset.order_by().aggregate(**counts)
+    return [(day, totals['day_%s' % day]) for day in range(days + 1)]
@@ -0,0 +1,43 @@
+from django.db import connection
+
+from .caching import bump_product_versions, invalidate_product_details
+from .images import update_renditions
+from .models import ProductTechnicalDataValue
+from .queue import task
+from .specs import reindex_values
+
+# фоновые задачи магазина, выполняются командой run_tasks
+
+
+@task(name='store.delete_product', priority=10)
+def delete_product(product_id):
+    with connection.cursor() as c:
+        c.execute("CALL del_product(%s::int)", (product_id,))
+
+
+@task(name='store.create_manufacturer', priority=10)
+def create_manufacturer(name, country):
+    with connection.cursor() as c:
+        c.execute("CALL create_manufacturer(%s, %s)", (name, country))
+
+
+@task(name='store.build_renditions')
+def build_renditions(image_id):
+    update_renditions(image_id)
+
+
+# сколько товаров сбрасывается в кэше за раз после изменения параметра
+REINDEX_BATCH_SIZE = 1000
+
+
+@task(name='store.reindex_specs', priority=-10)
+def reindex_specs(technical_data_id):
+    values = ProductTechnicalDataValue.objects.filter(technical_data_id=technical_data_id)
+    reindex_values(values)
+
+    # название и единица параметра показаны в характеристиках товара
+    product_ids = list(values.order_by('product_id').values_list('product_id', flat=True).distinct())
+    for start in range(0, len(product_ids), REINDEX_BATCH_SIZE):
+        batch = product_ids[start:start + REINDEX_BATCH_SIZE]
+        invalidate_product_details(*batch)
+        bump_product_versions(batch)
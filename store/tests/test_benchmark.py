@@ -0,0 +1,26 @@
+from django.test import TestCase
+
+from store.benchmark import compare_with_baseline, generate_catalog, run_benchmarks
+from store.models import Product, ProductImage, ProductTechnicalDataValue
+
+
+class TestBenchmark(TestCase):
+
+    def test_generate_and_run(self):
+        created = generate_catalog(7, categories=2, manufacturers=2, product_types=2, batch_size=3)
+        self.assertEqual(created, {'products': 7, 'values': 35, 'images': 7})
+        self.assertEqual(Product.objects.count(), 7)
+        self.assertEqual(ProductTechnicalDataValue.objects.exclude(value_enum='').count(), 35)
+        self.assertEqual(ProductImage.objects.count(), 7)
+
+        # страницы, которым не нужны объекты из code.sql
+        only = ['product_all', 'product_detail', 'category_list', 'discount_search']
+        results = run_benchmarks(requests=2, concurrency=1, only=only, host='testserver')
+        self.assertEqual(sorted(results), sorted(only))
+        self.assertEqual(results['product_all']['requests'], 2)
+        self.assertFalse(any(result['errors'] for result in results.values()))
+        self.assertEqual(compare_with_baseline(results, results), [])
+
+        worse = {name: dict(result, queries=result['queries'] + 1 if result['queries'] is not None else None)
+                 for name, result in results.items()}
+        self.assertIn('product_all: SQL-запросов', compare_with_baseline(worse, results)[0])
@@ -0,0 +1,128 @@
+import io
+import json
+import os
+import tempfile
+
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+
+from store.models import (Category, Discount, Manufacturer, Product, ProductType,
+                          ProductTechnicalData, ProductTechnicalDataValue)
+
+
+class TestProductImportExport(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='user', password='password')
+        self.client.force_login(self.user)
+        Category.objects.create(name='Ноутбуки', slug='notebooks')
+        Manufacturer.objects.create(name='Lenovo', country='Китай')
+        product_type = ProductType.objects.create(name='Ноутбук')
+        ProductTechnicalData.objects.create(name='RAM', product_type=product_type)
+
+    def test_import_csv_upload(self):
+        content = (
+            'name,description,category,manufacturer,product_type,price,warranty,count,discount,spec:RAM\n'
+            'ThinkPad X1,,Ноутбуки,Lenovo,Ноутбук,1000,12,5,,16\n'
+            'ThinkPad T14,,Ноутбуки,Lenovo,Ноутбук,900,12,3,,\n'
+            'Unknown,,Ноутбуки,Nobody,Ноутбук,900,12,3,,\n'
+        ).encode()
+        response = self.client.post(reverse('store:import_products'), {
+            'file': SimpleUploadedFile('products.csv', content),
+        })
+
+        result = response.context['result']
+        self.assertEqual((result.created, result.values_created, result.skipped), (2, 1, 1))
+        self.assertEqual(Product.objects.get(slug='thinkpad-x1').price_discount, 1000)
+        self.assertEqual(ProductTechnicalDataValue.objects.get().value, '16')
+
+    def test_import_checks_encoding_and_price(self):
+        header = 'name,category,manufacturer,product_type,price,warranty,count\n'
+        content = header + (
+            'ThinkPad X1,Ноутбуки,Lenovo,Ноутбук,1000,12,5\n'
+            'ThinkPad NaN,Ноутбуки,Lenovo,Ноутбук,NaN,12,5\n'
+            'ThinkPad Inf,Ноутбуки,Lenovo,Ноутбук,Infinity,12,5\n'
+            'ThinkPad Gold,Ноутбуки,Lenovo,Ноутбук,1000000,12,5\n'
+        )
+        # файл из Excel: UTF-8 с меткой BOM перед заголовком
+        response = self.client.post(reverse('store:import_products'), {
+            'file': SimpleUploadedFile('products.csv', content.encode('utf-8-sig')),
+        })
+        result = response.context['result']
+        self.assertEqual((result.created, result.skipped), (1, 3))
+        self.assertEqual(Product.objects.get().name, 'ThinkPad X1')
+
+        response = self.client.post(reverse('store:import_products'), {
+            'file': SimpleUploadedFile('products.csv', content.encode('cp1251')),
+        })
+        self.assertIsNone(response.context['result'])
+        self.assertTrue(response.context['import_form'].has_error('file'))
+        self.assertEqual(Product.objects.count(), 1)
+
+    def test_import_jsonl_wrong_types(self):
+        valid = {
+            'name': 'ThinkPad X1', 'category': 'Ноутбуки', 'manufacturer': 'Lenovo',
+            'product_type': 'Ноутбук', 'price': '1000', 'warranty': 12, 'count': 5,
+        }
+        rows = [
+            {'name': 123},
+            {'category': 5},
+            {'specs': ['RAM', '16']},
+            {'specs': 'RAM=16'},
+            {'specs': {'RAM': {'value': 16}}},
+            {'discount': [1]},
+            {'name': 'x' * 256},
+            {'description': 'x' * 100001},
+            {'count': 2 ** 40},
+        ]
+        content = ''.join(json.dumps({**valid, **row}) + '\n' for row in rows)
+        response = self.client.post(reverse('store:import_products'), {
+            'file': SimpleUploadedFile('products.jsonl', content.encode()),
+        })
+
+        result = response.context['result']
+        self.assertEqual((result.created, result.skipped), (0, len(rows)))
+        self.assertFalse(Product.objects.exists())
+
+    def test_import_rounds_discount_like_product_save(self):
+        discount = Discount.objects.create(amount=10, reason='Распродажа')
+        self.client.post(reverse('store:import_products'), {
+            'file': SimpleUploadedFile('products.jsonl', json.dumps({
+                'name': 'ThinkPad X1', 'category': 'Ноутбуки', 'manufacturer': 'Lenovo',
+                'product_type': 'Ноутбук', 'price': '10.05', 'warranty': 12, 'count': 5,
+                'discount': discount.pk,
+            }).encode()),
+        })
+        product = Product.objects.get()
+        # 10.05 - 1.005 = 9.045, ROUND_HALF_UP как в Product.get_price_discount
+        self.assertEqual(str(product.price_discount), '9.05')
+        product.save()
+        product.refresh_from_db()
+        self.assertEqual(str(product.price_discount), '9.05')
+
+    def test_export_and_import_jsonl(self):
+        self.client.post(reverse('store:import_products'), {
+            'file': SimpleUploadedFile('products.jsonl', (
+                '{"name": "ThinkPad X1", "category": "Ноутбуки", "manufacturer": "Lenovo", '
+                '"product_type": "Ноутбук", "price": "1000", "warranty": 12, "count": 5, '
+                '"specs": {"RAM": "16"}}\n'
+            ).encode()),
+        })
+
+        response = self.client.get(reverse('store:export_products'), {'format': 'jsonl'})
+        exported = b''.join(response.streaming_content).decode()
+        self.assertIn('"specs": {"RAM": "16"}', exported)
+
+        Product.objects.all().delete()
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'products.jsonl')
+            with open(path, 'w', encoding='utf-8') as stream:
+                stream.write(exported)
+            out = io.StringIO()
+            call_command('import_products', path, stdout=out)
+
+        self.assertIn('Добавлено товаров: 1', out.getvalue())
+        self.assertEqual(ProductTechnicalDataValue.objects.get().value, '16')
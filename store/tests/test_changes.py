@@ -0,0 +1,46 @@
+from unittest import skipUnless
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from store.changes import read_changes
+from store.models import ProductChange
+
+
+@skipUnless(connection.vendor == 'postgresql', 'Журнал читается по номерам транзакций PostgreSQL')
+class TestProductChanges(TestCase):
+
+    def setUp(self):
+        # в рабочей БД записи делает триггер из code.sql
+        ProductChange.objects.bulk_create([
+            ProductChange(product_id=1, action=ProductChange.CREATE, data={'count': 5}, transaction_id=1),
+            ProductChange(product_id=1, action=ProductChange.STOCK, data={'count': 3}, transaction_id=1),
+            ProductChange(product_id=1, action=ProductChange.DELETE, transaction_id=2),
+        ])
+
+    def test_read_by_cursor(self):
+        events, cursor = read_changes('', limit=2)
+        self.assertEqual([e['action'] for e in events], ['create', 'stock'])
+
+        events, cursor = read_changes(cursor, limit=2)
+        self.assertEqual([e['action'] for e in events], ['delete'])
+
+        self.assertEqual(read_changes(cursor), ([], cursor))
+        with self.assertRaises(ValueError):
+            read_changes('bad')
+
+    @override_settings(STORE_CHANGES_TOKEN='secret')
+    def test_long_poll_endpoint(self):
+        url = reverse('store:product_changes')
+        self.assertEqual(self.client.get(url, {'wait': 0}).status_code, 403)
+
+        response = self.client.get(url, {'wait': 0}, HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(len(response.json()['events']), 3)
+
+        staff = User.objects.create_user(username='staff', password='password', is_staff=True)
+        self.client.force_login(staff)
+        response = self.client.get(url, {'wait': 0, 'cursor': response.json()['cursor']})
+        self.assertEqual(response.json()['events'], [])
+        self.assertEqual(self.client.get(url, {'cursor': 'bad'}).status_code, 400)
@@ -0,0 +1,73 @@
+import threading
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from store.dbpool import ConnectionPool, PoolTimeout
+
+
+class FakeConnection:
+
+    def __init__(self):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class TestConnectionPool(SimpleTestCase):
+
+    def test_reuse_and_stats(self):
+        pool = ConnectionPool(FakeConnection, size=2)
+
+        first = pool.acquire()
+        pool.release(first)
+        self.assertIs(pool.acquire(), first)
+        second = pool.acquire()
+
+        stats = pool.stats()
+        self.assertEqual(stats['created'], 2)
+        self.assertEqual(stats['checkouts'], 3)
+        self.assertEqual(stats['in_use'], 2)
+        self.assertEqual(stats['saturation'], 1)
+
+        pool.release(second)
+        pool.release(first)
+        self.assertEqual(pool.stats()['idle'], 2)
+
+    def test_wait_and_timeout(self):
+        pool = ConnectionPool(FakeConnection, size=1, timeout=0.05)
+        conn = pool.acquire()
+
+        with self.assertRaises(PoolTimeout):
+            pool.acquire()
+
+        pool.timeout = 5
+        threading.Timer(0.05, pool.release, [conn]).start()
+        self.assertIs(pool.acquire(), conn)
+
+        stats = pool.stats()
+        self.assertEqual(stats['timeouts'], 1)
+        self.assertEqual(stats['waits'], 1)
+        self.assertGreater(stats['max_wait_ms'], 0)
+
+    def test_discard_broken_and_old(self):
+        pool = ConnectionPool(FakeConnection, reset=lambda conn: False, size=1)
+        conn = pool.acquire()
+        pool.release(conn)
+        self.assertTrue(conn.closed)
+
+        pool = ConnectionPool(FakeConnection, size=1, max_lifetime=60)
+        conn = pool.acquire()
+        with mock.patch('store.dbpool.time.monotonic', return_value=10 ** 9):
+            pool.release(conn)
+        self.assertTrue(conn.closed)
+        self.assertEqual(pool.stats()['open'], 0)
+
+    def test_check_idle_connection(self):
+        pool = ConnectionPool(FakeConnection, check=lambda conn: False, size=1, check_idle=0)
+        conn = pool.acquire()
+        pool.release(conn)
+
+        self.assertIsNot(pool.acquire(), conn)
+        self.assertTrue(conn.closed)
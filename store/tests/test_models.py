@@ -1,6 +1,10 @@
+from decimal import Decimal
+
 from django.test import TestCase
 
-from store.models import Category
+from store.models import Category, ProductTechnicalData, ProductTechnicalDataValue, ProductType
+from store.queue import run_next_task
+from store.tests.test_views import create_products
 
 class TestCategoriesModel(TestCase):
 
@@ -11,4 +15,36 @@ class TestCategoriesModel(TestCase):
     def test_category_model_entry(self):
         data = self.data1
         self.assertTrue(isinstance(data, Category))
-        self.assertEqual(str(data), 'Test')
\ No newline at end of file
+        self.assertEqual(str(data), 'Test')
+
+class TestTechnicalDataValueModel(TestCase):
+
+    def setUp(self):
+        product_type = ProductType.objects.create(name='Ноутбук')
+        self.storage = ProductTechnicalData.objects.create(
+            name='Накопитель', product_type=product_type, value_type='number', unit='ГБ'
+        )
+        self.product = create_products(1)[0]
+
+    def test_typed_values_are_normalised(self):
+        value = ProductTechnicalDataValue.objects.create(
+            product=self.product, technical_data=self.storage, value='1 ТБ'
+        )
+        self.assertEqual(value.value_number, 1024)
+        self.assertEqual(value.value_enum, '1 тб')
+
+        value.value = '512,5 Гб'
+        value.save(update_fields=['value'])
+        value.refresh_from_db()
+        self.assertEqual(value.value_number, Decimal('512.5'))
+
+    def test_typed_values_follow_parameter_unit(self):
+        value = ProductTechnicalDataValue.objects.create(
+            product=self.product, technical_data=self.storage, value='2 ТБ'
+        )
+        self.storage.unit = 'ТБ'
+        self.storage.save()
+        # пересчет идет фоновой задачей
+        run_next_task()
+        value.refresh_from_db()
+        self.assertEqual(value.value_number, 2)
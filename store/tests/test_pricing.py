@@ -0,0 +1,64 @@
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from store.models import Discount, Product
+from store.pricing import apply_discount, reprice_products
+from store.tests.test_views import create_products
+
+
+class TestPricing(TestCase):
+
+    def setUp(self):
+        self.products = create_products(4)
+        self.discount = Discount.objects.get(amount=10)
+
+    def prices(self):
+        return list(Product.objects.order_by('id').values_list('discount__amount', 'price_discount'))
+
+    def test_save_computes_price_discount(self):
+        product = self.products[1]
+        product.price = Decimal('999.99')
+        product.save(update_fields=['price'])
+        product.refresh_from_db()
+        self.assertEqual(product.price_discount, Decimal('899.99'))
+
+    def test_discount_change_reprices_in_one_update(self):
+        self.discount.amount = 25
+        with CaptureQueriesContext(connection) as queries:
+            self.discount.save()
+        self.assertEqual(len(queries), 2)
+        self.assertEqual(self.prices(), [
+            (None, Decimal('1000.00')), (25, Decimal('750.00')),
+            (None, Decimal('1000.00')), (25, Decimal('750.00')),
+        ])
+
+    def test_apply_and_remove_discount(self):
+        manufacturer = self.products[0].manufacturer
+        with self.assertNumQueries(1):
+            apply_discount(Product.objects.filter(manufacturer=manufacturer), self.discount)
+        self.assertEqual(self.prices()[0], (10, Decimal('900.00')))
+
+        apply_discount(Product.objects.all(), None)
+        self.assertEqual(set(self.prices()), {(None, Decimal('1000.00'))})
+
+    def test_reprice_skips_unchanged_rows(self):
+        Product.objects.filter(pk=self.products[1].pk).update(price_discount=1)
+        self.assertEqual(reprice_products(Product.objects.all()), 1)
+        self.assertEqual(self.prices()[1], (10, Decimal('900.00')))
+
+    def test_apply_discount_view(self):
+        self.client.force_login(User.objects.create_user(username='user', password='password'))
+        url = reverse('store:apply_discount')
+
+        response = self.client.post(url, {'discount': self.discount.pk})
+        self.assertFormError(response.context['discount_form'], None, 'Выберите категорию или производителя')
+
+        category = self.products[0].category
+        response = self.client.post(url, {'discount': self.discount.pk, 'category': category.pk})
+        self.assertEqual(response.context['updated'], 4)
+        self.assertEqual(Product.objects.filter(discount=self.discount).count(), 4)
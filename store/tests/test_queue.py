@@ -0,0 +1,74 @@
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from store import queue
+from store.models import Product, Task
+from store.tests.test_views import create_products
+
+calls = []
+
+
+@queue.task(name='test.record', max_attempts=2)
+def record(value):
+    if value == 'fail':
+        raise ValueError('ошибка задачи')
+    calls.append(value)
+
+
+class TestTaskQueue(TestCase):
+
+    def setUp(self):
+        calls.clear()
+
+    def test_priority_and_status(self):
+        low = record.enqueue('low')
+        high = record.enqueue('high', priority=5)
+
+        self.assertEqual(queue.run_next_task().pk, high.pk)
+        self.assertEqual(queue.run_next_task().pk, low.pk)
+        self.assertIsNone(queue.run_next_task())
+        self.assertEqual(calls, ['high', 'low'])
+        self.assertEqual(
+            list(Task.objects.values_list('status', 'attempts')), [(Task.DONE, 1), (Task.DONE, 1)]
+        )
+
+    def test_retry_then_fail(self):
+        failing = record.enqueue('fail')
+
+        with self.assertLogs('store.queue', 'WARNING'):
+            self.assertEqual(queue.run_next_task().status, Task.QUEUED)
+        failing.refresh_from_db()
+        self.assertIn('ошибка задачи', failing.last_error)
+        # повтор отложен
+        self.assertIsNone(queue.run_next_task())
+
+        Task.objects.update(run_after=failing.created_in)
+        with self.assertLogs('store.queue', 'WARNING'):
+            self.assertEqual(queue.run_next_task().status, Task.FAILED)
+        self.assertEqual(Task.objects.get().attempts, 2)
+
+    @override_settings(STORE_TASKS_EAGER=True)
+    def test_eager(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertIsNone(record.enqueue('eager'))
+        self.assertEqual(calls, ['eager'])
+        self.assertFalse(Task.objects.exists())
+
+    def test_delete_product_in_background(self):
+        user = User.objects.create_user(username='user', password='password')
+        self.client.force_login(user)
+        product = create_products(1)[0]
+
+        with mock.patch('store.tasks.connection') as connection:
+            response = self.client.get(reverse('store:delete_product', args=[product.pk]))
+            self.assertRedirects(response, reverse('store:product_all'))
+            self.assertFalse(Product.products.filter(pk=product.pk).exists())
+
+            task = queue.run_next_task()
+        self.assertEqual((task.name, task.args, task.status), ('store.delete_product', [product.pk], Task.DONE))
+        connection.cursor().__enter__().execute.assert_called_once_with(
+            'CALL del_product(%s::int)', (product.pk,)
+        )
@@ -0,0 +1,63 @@
+from unittest import skipUnless
+
+from django.conf import settings
+from django.db import connections
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from store.models import Product
+from store.routers import (STICKY_COOKIE, ReplicaRouter, ReplicaStickinessMiddleware,
+                           read_from_replica)
+from store.tests.test_views import create_products
+
+
+@override_settings(STORE_REPLICA_DATABASES=['replica'])
+class TestReplicaRouter(SimpleTestCase):
+
+    def setUp(self):
+        self.router = ReplicaRouter()
+
+    def test_reporting_reads(self):
+        self.assertEqual(self.router.db_for_read(Product), 'default')
+        with read_from_replica():
+            self.assertEqual(self.router.db_for_read(Product), 'replica')
+            self.assertEqual(self.router.db_for_write(Product), 'default')
+            # после записи запрос читает свои изменения с основной БД
+            self.assertEqual(self.router.db_for_read(Product), 'default')
+
+    def test_sticky_after_write(self):
+        factory = RequestFactory()
+        router = self.router
+
+        def write(request):
+            router.db_for_write(Product)
+            return HttpResponse()
+
+        def report(request):
+            with read_from_replica():
+                return HttpResponse(router.db_for_read(Product))
+
+        response = ReplicaStickinessMiddleware(write)(factory.post('/'))
+        self.assertEqual(response.cookies[STICKY_COOKIE]['max-age'], settings.STORE_REPLICA_STICKY_SECONDS)
+
+        request = factory.get('/')
+        request.COOKIES[STICKY_COOKIE] = '1'
+        self.assertEqual(ReplicaStickinessMiddleware(report)(request).content, b'default')
+        response = ReplicaStickinessMiddleware(report)(factory.get('/'))
+        self.assertEqual(response.content, b'replica')
+        self.assertNotIn(STICKY_COOKIE, response.cookies)
+
+
+# с двумя локальными БД: DB_REPLICA_NAME в .env
+@skipUnless('replica' in settings.DATABASES, 'Реплика не настроена')
+class TestReplicaDatabase(TransactionTestCase):
+    databases = '__all__'
+
+    def test_reports_read_from_replica(self):
+        create_products(2)
+
+        with CaptureQueriesContext(connections['replica']) as queries:
+            with read_from_replica():
+                self.assertEqual(Product.objects.count(), 2)
+        self.assertEqual(len(queries), 1)
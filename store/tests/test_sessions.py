@@ -0,0 +1,84 @@
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from store.sessions import REFRESH_KEY, USER_KEY, ExpiryBuffer, SessionStore, flush_session_expiry
+
+
+class TestCachedSessions(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username='user', password='password', email='user@example.com',
+            first_name='Иван', last_name='Иванов'
+        )
+        self.client.login(username='user', password='password')
+        self.url = reverse('account:dashboard')
+
+    def tables(self):
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(self.client.get(self.url).status_code, 200)
+        return [q['sql'] for q in ctx.captured_queries]
+
+    def test_session_and_user_are_read_from_cache(self):
+        self.tables()
+        self.assertEqual(self.tables(), [])
+
+    def test_unchanged_session_is_not_written(self):
+        session = SessionStore(self.client.session.session_key)
+        session['_auth_user_id'] = session['_auth_user_id']
+        with CaptureQueriesContext(connection) as ctx:
+            session.save()
+        self.assertEqual(ctx.captured_queries, [])
+
+        session['cart'] = [1]
+        session.save()
+        self.assertEqual(SessionStore(session.session_key).load()['cart'], [1])
+
+    def test_expiry_is_extended_behind(self):
+        session_key = self.client.session.session_key
+        Session.objects.filter(pk=session_key).update(expire_date='2000-01-01T00:00:00Z')
+        cache.delete(REFRESH_KEY % session_key)
+
+        response = self.client.get(self.url)
+        self.assertIn('sessionid', response.cookies)
+        self.assertEqual(flush_session_expiry(force=True), 1)
+        self.assertGreater(Session.objects.get(pk=session_key).expire_date.year, 2000)
+
+        # следующий запрос в пределах REFRESH_INTERVAL сессию не продлевает
+        self.assertNotIn('sessionid', self.client.get(self.url).cookies)
+
+    def test_expiry_is_flushed_by_timer(self):
+        # после последнего запроса процесс может простаивать: сроки пишет таймер
+        buffer = ExpiryBuffer()
+        with mock.patch('store.sessions.FLUSH_INTERVAL', 0.2), \
+                mock.patch.object(buffer, 'flush') as flush:
+            buffer.add('key', None)
+            timer = buffer.timer
+            buffer.add('other', None)
+            timer.join()
+        flush.assert_called_once_with(force=True)
+        self.assertIsNone(buffer.timer)
+
+    def test_user_cache_is_invalidated(self):
+        self.client.get(self.url)
+        self.assertIsNotNone(cache.get(USER_KEY % self.user.pk))
+
+        self.client.post(reverse('account:edit_details'), {
+            'email': 'user@example.com', 'first_name': 'Петр', 'last_name': 'Иванов'
+        })
+        self.assertIsNone(cache.get(USER_KEY % self.user.pk))
+        response = self.client.get(self.url)
+        self.assertEqual(response.wsgi_request.user.first_name, 'Петр')
+
+        self.client.get(reverse('account:delete_user'))
+        self.assertIsNone(cache.get(USER_KEY % self.user.pk))
+        self.assertFalse(User.objects.get(pk=self.user.pk).is_active)
+        self.assertFalse(self.client.get(self.url).wsgi_request.user.is_authenticated)
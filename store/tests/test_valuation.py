@@ -0,0 +1,61 @@
+from decimal import Decimal
+from unittest import skipUnless
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase
+from django.urls import reverse
+
+from store.models import InventoryValuation, Manufacturer, Product
+from store.tests.test_views import create_products
+
+
+def valuation_sql():
+    """Таблица сводки, функции и триггер из code.sql (без заполнения и прав)"""
+    sql = (settings.BASE_DIR / 'code.sql').read_text(encoding='utf-8')
+    start = sql.index('CREATE TABLE inventory_valuation')
+    return sql[start:sql.index('-- первоначальное заполнение', start)]
+
+
+@skipUnless(connection.vendor == 'postgresql', 'Сводку поддерживает триггер PostgreSQL')
+class TestInventoryValuation(TestCase):
+
+    def setUp(self):
+        # в тестовой БД нет объектов code.sql, триггер создается в транзакции теста
+        with connection.cursor() as cursor:
+            cursor.execute(valuation_sql())
+        user = User.objects.create_user(username='user', password='password')
+        self.client.force_login(user)
+
+    def totals(self):
+        response = self.client.get(reverse('store:sum_count'))
+        valuation = response.context['valuation']
+        return valuation['total_count'], valuation['total_price']
+
+    def test_trigger_keeps_totals(self):
+        first, second = create_products(2)
+        self.assertEqual(self.totals(), (10, Decimal('10000')))
+        self.assertFalse(InventoryValuation.objects.exclude(
+            scope__in=[InventoryValuation.MANUFACTURER, InventoryValuation.PRODUCT_TYPE]
+        ).exists())
+
+        Product.objects.filter(pk=first.pk).update(count=2, price=500)
+        self.assertEqual(self.totals(), (7, Decimal('6000')))
+
+        # перенос товара к другому производителю не меняет итог
+        Product.objects.filter(pk=second.pk).update(manufacturer=first.manufacturer)
+        self.assertEqual(self.totals(), (7, Decimal('6000')))
+        by_manufacturer = InventoryValuation.objects.get(
+            scope=InventoryValuation.MANUFACTURER, scope_id=first.manufacturer_id
+        )
+        self.assertEqual((by_manufacturer.products_count, by_manufacturer.total_count), (2, 7))
+        self.assertFalse(InventoryValuation.objects.filter(
+            scope=InventoryValuation.MANUFACTURER, scope_id=second.manufacturer_id,
+            products_count__gt=0,
+        ).exists())
+
+        Product.objects.filter(pk=first.pk).delete()
+        self.assertEqual(self.totals(), (5, Decimal('5000')))
+        self.assertIn(Manufacturer.objects.get(pk=first.manufacturer_id).name.encode(),
+                      self.client.get(reverse('store:sum_count')).content)
@@ -0,0 +1,671 @@
+import base64
+import datetime
+import io
+import shutil
+import tempfile
+from unittest import mock
+from unittest import skipUnless
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.contrib.postgres.search import SearchVector
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import AsyncClient, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image as PILImage
+
+from store.analytics import get_analytics
+from store.caching import get_category_menu
+from store.pagination import CursorPaginator, EstimatedCountPaginator, estimate_count
+from store.stock import RECENT, adjust_stock, products_by_age, staleness_histogram
+from store.metrics import flush_metrics
+from store.queue import run_next_task
+from store.models import (Category, Discount, Manufacturer, Product, ProductImage, ProductType,
+                          ProductTechnicalData, ProductTechnicalDataValue, StockMovement, Task)
+
+
+def create_products(number, **kwargs):
+    category = Category.objects.get_or_create(name='Ноутбуки', slug='notebooks')[0]
+    product_type = ProductType.objects.get_or_create(name='Ноутбук')[0]
+    discount = Discount.objects.get_or_create(amount=10, reason='Распродажа')[0]
+    start = Product.objects.count()
+    products = []
+    for i in range(start, start + number):
+        manufacturer = Manufacturer.objects.create(name=f'Бренд {i}', country='Россия')
+        products.append(Product.objects.create(
+            name=f'Товар {i}', product_type=product_type, category=category,
+            manufacturer=manufacturer, discount=discount if i % 2 else None,
+            price=1000, price_discount=900, warranty=12, count=5, **kwargs
+        ))
+    return products
+
+
+class TestProductListViews(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='user', password='password')
+        self.client.force_login(self.user)
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries)
+
+    def test_list_views_query_count_does_not_depend_on_rows(self):
+        urls = [
+            reverse('store:product_all'),
+            reverse('store:category_list', args=['notebooks']),
+            reverse('store:discount_search'),
+        ]
+        create_products(1)
+        # первый запрос заполняет кэш меню категорий
+        self.client.get(urls[0])
+        few = [self.count_queries(url) for url in urls]
+        create_products(9)
+        many = [self.count_queries(url) for url in urls]
+        self.assertEqual(few, many)
+
+    def test_product_all_cursor_pages(self):
+        products = create_products(25)
+        url = reverse('store:product_all')
+
+        seen = []
+        response = self.client.get(url)
+        pages = [response.context['page_obj']]
+        while pages[-1].has_next():
+            response = self.client.get(url, {'cursor': pages[-1].next_cursor})
+            pages.append(response.context['page_obj'])
+        for page in pages:
+            seen.extend(p.pk for p in page)
+
+        self.assertEqual([len(page) for page in pages], [10, 10, 5])
+        self.assertEqual(seen, [p.pk for p in reversed(products)])
+
+        response = self.client.get(url, {'cursor': pages[-1].previous_cursor})
+        self.assertEqual(list(response.context['page_obj']), list(pages[1]))
+
+    def test_product_all_invalid_cursor(self):
+        create_products(3)
+        response = self.client.get(reverse('store:product_all'), {'cursor': 'bad'})
+        self.assertEqual(len(response.context['page_obj']), 3)
+
+    def test_product_all_empty_cursor_page(self):
+        products = create_products(3)
+        url = reverse('store:product_all')
+        # устаревшая ссылка: строк за курсором (или перед ним) уже нет
+        for raw in ('n|2000-01-01T00:00:00+00:00|1', 'p|2100-01-01T00:00:00+00:00|1'):
+            cursor = base64.urlsafe_b64encode(raw.encode()).decode()
+            response = self.client.get(url, {'cursor': cursor})
+            self.assertEqual(response.status_code, 200)
+            page = response.context['page_obj']
+            self.assertEqual([p.pk for p in page], [p.pk for p in reversed(products)])
+            self.assertFalse(page.has_previous())
+            self.assertFalse(page.has_next())
+
+    def test_cursor_page_neighbours_follow_rows(self):
+        paginator = CursorPaginator(Product.objects.all(), 2)
+        for direction in ('n', 'p'):
+            page = paginator.make_page(direction, [])
+            self.assertFalse(page.has_next() or page.has_previous())
+            self.assertIsNone(page.next_cursor)
+            self.assertIsNone(page.previous_cursor)
+
+
+class TestCategoryMenu(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='user', password='password')
+        self.client.force_login(self.user)
+        Category.objects.create(name='Ноутбуки', slug='notebooks')
+
+    def test_menu_is_cached_and_invalidated(self):
+        self.assertEqual(
+            get_category_menu(),
+            [{'name': 'Ноутбуки', 'url': reverse('store:category_list', args=['notebooks'])}]
+        )
+        with self.assertNumQueries(0):
+            get_category_menu()
+
+        Category.objects.create(name='Мониторы', slug='monitors')
+        self.assertEqual([c['name'] for c in get_category_menu()], ['Ноутбуки', 'Мониторы'])
+
+        Category.objects.filter(slug='monitors').get().delete()
+        self.assertEqual([c['name'] for c in get_category_menu()], ['Ноутбуки'])
+
+    def test_login_page_does_not_read_categories(self):
+        self.client.logout()
+        with self.assertNumQueries(0):
+            self.client.get(reverse('account:login'))
+
+
+class TestStockAdjustment(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='user', password='password')
+        self.client.force_login(self.user)
+        self.first, self.second, self.third = create_products(3)
+
+    def test_product_detail_count_is_floored_at_zero(self):
+        url = self.first.get_absolute_url()
+        self.client.post(url, {'count_up': '3', 'count_down': ''})
+        self.client.post(url, {'count_up': '', 'count_down': '100'})
+
+        self.first.refresh_from_db()
+        self.assertEqual(self.first.count, 0)
+        # в журнале -- фактическое изменение, а не запрошенное
+        self.assertEqual(
+            list(self.first.stock_movements.order_by('id').values_list('delta', 'count_after')),
+            [(3, 8), (-8, 0)]
+        )
+
+    def test_stock_batch(self):
+        response = self.client.post(reverse('store:stock_batch'), {
+            'reason': 'Приемка',
+            'adjustments': [
+                {'product': self.first.pk, 'delta': 2},
+                {'product': self.second.slug, 'delta': -1},
+                {'product': self.first.pk, 'delta': 3},
+                {'product': 'missing', 'delta': 1},
+                {'product': 0, 'delta': 1},
+                {'product': self.third.pk, 'delta': 1},
+                {'product': self.third.pk, 'delta': -1},
+            ]
+        }, content_type='application/json')
+
+        # изменения, которые в сумме равны нулю, не делают товар отсутствующим
+        self.assertEqual(response.json(), {
+            'counts': {str(self.first.pk): 10, str(self.second.pk): 4},
+            'missing': ['missing', 0],
+        })
+        self.assertEqual(StockMovement.objects.filter(reason='Приемка').count(), 2)
+
+    def test_stock_batch_bad_request(self):
+        for adjustments in ([{}], [{'product': [1], 'delta': 1}], [{'product': {'id': 1}, 'delta': 1}]):
+            response = self.client.post(
+                reverse('store:stock_batch'), {'adjustments': adjustments},
+                content_type='application/json'
+            )
+            self.assertEqual(response.status_code, 400)
+
+
+class TestProductDetail(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='user', password='password')
+        self.client.force_login(self.user)
+        self.product = create_products(1)[0]
+        self.technical_data = ProductTechnicalData.objects.create(
+            name='RAM', product_type=self.product.product_type
+        )
+        ProductTechnicalDataValue.objects.create(
+            product=self.product, technical_data=self.technical_data, value='16'
+        )
+        # первый запрос заполняет кэш меню категорий и характеристик
+        self.client.get(self.product.get_absolute_url())
+
+    def test_product_detail_uses_cached_details(self):
+        # сессия и пользователь -- из кэша, сам товар со связанными таблицами
+        with self.assertNumQueries(1):
+            response = self.client.get(self.product.get_absolute_url())
+        # описание товара -- из кэша фрагментов, без отрисовки
+        self.assertContains(response, 'RAM: 16')
+        self.assertNotIn('data_value', response.context)
+
+    def test_product_detail_cache_is_invalidated(self):
+        ProductTechnicalDataValue.objects.filter(product=self.product).get().delete()
+        response = self.client.get(self.product.get_absolute_url())
+        self.assertEqual(response.context['data_value'], [])
+        self.assertNotContains(response, 'RAM: 16')
+
+    def test_product_detail_follows_parameter_rename(self):
+        self.technical_data.name = 'Память'
+        self.technical_data.save()
+        self.assertEqual(run_next_task().status, Task.DONE)
+        response = self.client.get(self.product.get_absolute_url())
+        self.assertContains(response, 'Память: 16')
+        self.assertNotContains(response, 'RAM: 16')
+
+
+class TestTimeWindow(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='user', password='password')
+        self.client.force_login(self.user)
+        self.products = create_products(5)
+        now = timezone.now()
+        for days, product in enumerate(self.products):
+            Product.objects.filter(pk=product.pk).update(updated_in=now - datetime.timedelta(days=days * 2))
+
+    def test_stale_and_recent(self):
+        stale = products_by_age(datetime.timedelta(days=3))
+        self.assertEqual(set(stale), set(self.products[2:]))
+        recent = products_by_age(datetime.timedelta(days=3), RECENT)
+        self.assertEqual(set(recent), set(self.products[:2]))
+
+    def test_stale_pages_oldest_first(self):
+        url = reverse('store:time_product')
+        params = {'direction': 'stale', 'amount': 1, 'unit': 'days'}
+        response = self.client.get(url, params)
+        page_obj = response.context['page_obj']
+        self.assertEqual(list(page_obj), self.products[:0:-1])
+
+        paginator = CursorPaginator(products_by_age(datetime.timedelta(days=1)), 2,
+                                    field='updated_in', descending=False)
+        first = paginator.page()
+        second = paginator.page(first.next_cursor)
+        self.assertEqual(list(first) + list(second), self.products[:0:-1])
+        self.assertEqual(list(paginator.page(second.previous_cursor)), list(first))
+
+    def test_invalid_window(self):
+        response = self.client.get(reverse('store:time_product'), {'amount': 0})
+        self.assertNotIn('page_obj', response.context)
+
+    def test_staleness_histogram(self):
+        histogram = staleness_histogram(days=5)
+        self.assertEqual(histogram, [(0, 1), (1, 0), (2, 1), (3, 0), (4, 1), (5, 2)])
+
+
+class TestFragmentCache(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='user', password='password')
+        self.client.force_login(self.user)
+        self.first, self.second = create_products(2)
+        self.category_url = reverse('store:category_list', args=[self.first.category.slug])
+
+    def test_category_page_is_cached_and_invalidated(self):
+        self.client.get(self.category_url)
+        # сессия, пользователь и содержимое -- из кэша, запрос только категории
+        with self.assertNumQueries(1):
+            response = self.client.get(self.category_url)
+        self.assertContains(response, self.first.name)
+
+        self.first.name = 'Renamed laptop'
+        self.first.save()
+        self.assertContains(self.client.get(self.category_url), 'Renamed laptop')
+
+        # перенос в другую категорию сбрасывает и прежнюю
+        other = Category.objects.create(name='Мониторы', slug='monitors')
+        moved = Product.objects.get(pk=self.first.pk)
+        moved.category = other
+        moved.save()
+        self.assertNotContains(self.client.get(self.category_url), 'Renamed laptop')
+
+    def test_rows_follow_bulk_changes(self):
+        self.client.get(reverse('store:product_all'))
+        Manufacturer.objects.filter(pk=self.first.manufacturer_id).get().save()
+        Product.objects.filter(pk=self.second.pk).update(warranty=36)
+        adjust_stock({self.second.pk: 1})
+
+        response = self.client.get(reverse('store:product_all'))
+        self.assertContains(response, '<td>36</td>')
+
+    def test_discount_change_updates_product_body(self):
+        self.client.get(self.second.get_absolute_url())
+        discount = self.second.discount
+        discount.reason = 'Черная пятница'
+        discount.save()
+        self.assertContains(self.client.get(self.second.get_absolute_url()), 'Черная пятница')
+
+
+@skipUnless(connection.vendor == 'postgresql', 'Полнотекстовый поиск работает только в PostgreSQL')
+class TestSearch(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='user', password='password')
+        self.client.force_login(self.user)
+        self.first, self.second = create_products(2)
+        Product.objects.filter(pk=self.first.pk).update(name='Игровые ноутбуки')
+        # в рабочей БД search_vector заполняет триггер из code.sql
+        Product.objects.update(search_vector=SearchVector('name', config='russian'))
+
+    def test_search_with_facets(self):
+        response = self.client.get(reverse('store:search'), {'q': 'ноутбук'})
+
+        self.assertEqual([p.pk for p in response.context['page_obj']], [self.first.pk])
+        facets = response.context['facets']
+        self.assertEqual(
+            [(item['label'], item['count']) for item in facets['manufacturer']],
+            [(self.first.manufacturer.name, 1)]
+        )
+        self.assertEqual([item['count'] for item in facets['discount']], [0, 1])
+
+    def test_search_filter(self):
+        response = self.client.get(reverse('store:search'), {
+            'q': 'ноутбук', 'manufacturer': self.first.manufacturer_id, 'discount': 'no'
+        })
+        self.assertEqual([p.pk for p in response.context['page_obj']], [self.first.pk])
+        self.assertTrue(response.context['facets']['discount'][1]['selected'])
+
+    def test_search_ignores_bad_filters(self):
+        response = self.client.get(reverse('store:search'), {
+            'q': 'ноутбук', 'category': 'abc', 'manufacturer': '1e3', 'discount': 'maybe'
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([p.pk for p in response.context['page_obj']], [self.first.pk])
+        self.assertEqual(set(response.context['filters'].values()), {''})
+
+
+class TestSpecFilters(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='user', password='password')
+        self.client.force_login(self.user)
+        self.products = create_products(3)
+        product_type = self.products[0].product_type
+        ram = ProductTechnicalData.objects.create(
+            name='RAM', product_type=product_type, value_type='number', unit='ГБ'
+        )
+        color = ProductTechnicalData.objects.create(
+            name='Цвет', product_type=product_type, value_type='enum'
+        )
+        for product, memory, shade in zip(self.products, ['8 ГБ', '16 ГБ', '32768 МБ'], ['Черный', 'черный', 'Белый']):
+            ProductTechnicalDataValue.objects.create(product=product, technical_data=ram, value=memory)
+            ProductTechnicalDataValue.objects.create(product=product, technical_data=color, value=shade)
+        self.ram, self.color = ram, color
+
+    def test_category_filter_by_several_specs(self):
+        url = reverse('store:category_list', args=['notebooks'])
+        response = self.client.get(url, {
+            f'spec_{self.ram.pk}_min': '16', f'spec_{self.color.pk}': 'ЧЕРНЫЙ'
+        })
+        self.assertEqual([p.pk for p in response.context['page_obj']], [self.products[1].pk])
+
+        response = self.client.get(url, {f'spec_{self.ram.pk}_min': '0.02 ТБ'})
+        self.assertEqual([p.pk for p in response.context['page_obj']], [self.products[2].pk])
+
+        self.assertEqual(
+            [(p.name, p.options) for p in response.context['spec_filters']],
+            [('RAM', []), ('Цвет', ['белый', 'черный'])]
+        )
+
+
+class TestProductForm(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='user', password='password')
+        self.client.force_login(self.user)
+        self.product, self.other = create_products(2)
+        self.ram, self.ssd = [
+            ProductTechnicalData.objects.create(name=name, product_type=self.product.product_type)
+            for name in ('RAM', 'SSD')
+        ]
+        ProductTechnicalData.objects.create(
+            name='Мощность', product_type=ProductType.objects.create(name='Блок питания')
+        )
+        self.url = reverse('store:update_product', args=[self.product.pk])
+        # первый запрос заполняет кэш меню категорий
+        self.client.get(self.url)
+
+    def count_queries(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        return response, len(ctx.captured_queries)
+
+    def test_choices_are_loaded_once(self):
+        ProductTechnicalDataValue.objects.create(product=self.product, technical_data=self.ram, value='16')
+        response, queries = self.count_queries()
+
+        ProductTechnicalDataValue.objects.create(product=self.product, technical_data=self.ssd, value='512')
+        self.assertEqual(self.count_queries()[1], queries)
+
+        # параметры только своего типа, производители -- только выбранный
+        self.assertContains(response, '>SSD</option>')
+        self.assertNotContains(response, 'Мощность')
+        self.assertContains(response, self.product.manufacturer.name)
+        self.assertNotContains(response, self.other.manufacturer.name)
+
+    def test_update_with_technical_data(self):
+        response = self.client.post(self.url, {
+            'name': 'Новый', 'description': '', 'price': 1000, 'warranty': 12, 'count': 5,
+            'product_type': self.product.product_type_id, 'category': self.product.category_id,
+            'manufacturer': self.other.manufacturer_id, 'discount': '',
+            'variants-TOTAL_FORMS': 1, 'variants-INITIAL_FORMS': 0,
+            'variants-0-technical_data': self.ram.pk, 'variants-0-value': '32',
+        })
+        self.assertRedirects(response, reverse('store:product_all'), fetch_redirect_response=False)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.manufacturer_id, self.other.manufacturer_id)
+        self.assertEqual(self.product.producttechnicaldatavalue_set.get().value, '32')
+
+    def test_formset_is_saved_in_batches(self):
+        values = [
+            ProductTechnicalDataValue.objects.create(product=self.product, technical_data=td, value=value)
+            for td, value in [(self.ram, '8'), (self.ram, '16'), (self.ssd, '256'), (self.ssd, '512')]
+        ]
+        data = {
+            'name': self.product.name, 'description': self.product.description,
+            'price': self.product.price, 'warranty': self.product.warranty, 'count': self.product.count,
+            'product_type': self.product.product_type_id, 'category': self.product.category_id,
+            'manufacturer': self.product.manufacturer_id, 'discount': self.product.discount_id or '',
+            'variants-TOTAL_FORMS': 6, 'variants-INITIAL_FORMS': 4,
+        }
+        for i, value in enumerate(values):
+            data.update({
+                f'variants-{i}-id': value.pk, f'variants-{i}-technical_data': value.technical_data_id,
+                f'variants-{i}-value': value.value,
+            })
+        data.update({
+            'variants-0-DELETE': 'on', 'variants-1-DELETE': 'on',
+            'variants-2-value': '1 ТБ',
+            'variants-4-technical_data': self.ram.pk, 'variants-4-value': '32',
+            'variants-5-technical_data': self.ram.pk, 'variants-5-value': '64',
+        })
+
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.post(self.url, data)
+        writes = [
+            q['sql'].split()[0] for q in ctx.captured_queries
+            if q['sql'].startswith(('INSERT', 'UPDATE', 'DELETE')) and 'product_technical_data_value' in q['sql']
+        ]
+        self.assertEqual(sorted(writes), ['DELETE', 'INSERT', 'UPDATE'])
+        # товар без изменений не перезаписывается, обновляется только updated_in
+        product_updates = [q['sql'] for q in ctx.captured_queries if q['sql'].startswith('UPDATE "products"')]
+        self.assertEqual(len(product_updates), 1)
+        self.assertIn('SET "updated_in"', product_updates[0])
+        self.assertNotIn('"name"', product_updates[0])
+        self.assertEqual(
+            sorted(self.product.producttechnicaldatavalue_set.values_list('value', flat=True)),
+            ['1 ТБ', '32', '512', '64']
+        )
+
+    def test_lazy_choices(self):
+        url = reverse('store:lazy_choices', args=['manufacturer'])
+        response = self.client.get(url, {'q': self.other.manufacturer.name})
+        self.assertEqual(response.json(), {
+            'results': [{'id': self.other.manufacturer_id, 'text': self.other.manufacturer.name}],
+            'more': False,
+        })
+
+        url = reverse('store:lazy_choices', args=['technical_data'])
+        response = self.client.get(url, {'product_type': self.product.product_type_id})
+        self.assertEqual([item['text'] for item in response.json()['results']], ['RAM', 'SSD'])
+        self.assertEqual(self.client.get(url).json()['results'], [])
+        self.assertEqual(self.client.get(reverse('store:lazy_choices', args=['user'])).status_code, 404)
+
+
+class TestProductAdmin(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_superuser(username='admin', password='password')
+        self.client.force_login(self.user)
+        self.url = reverse('admin:store_product_changelist')
+
+    def count_queries(self, params=None):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries)
+
+    def test_changelist_query_count_does_not_depend_on_rows(self):
+        create_products(2)
+        # первый запрос кэширует пользователя
+        self.count_queries()
+        queries = self.count_queries()
+        create_products(6)
+        self.assertEqual(self.count_queries(), queries)
+        self.assertLessEqual(self.count_queries({'is_active__exact': 1}), queries)
+
+        product = Product.objects.first()
+        response = self.client.get(reverse('admin:store_product_change', args=[product.pk]))
+        self.assertContains(response, 'admin-autocomplete')
+
+    @skipUnless(connection.vendor == 'postgresql', 'Оценка по статистике PostgreSQL')
+    def test_estimated_count(self):
+        create_products(3)
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE products')
+        self.assertEqual(estimate_count(Product.objects.all()), 3)
+        self.assertIsNone(estimate_count(Product.objects.filter(is_active=True)))
+
+        with mock.patch('store.pagination.ESTIMATE_THRESHOLD', 1):
+            with mock.patch('store.pagination.estimate_count', return_value=1000000):
+                self.assertEqual(EstimatedCountPaginator(Product.objects.all(), 10).num_pages, 100000)
+        with mock.patch('store.pagination.COUNT_LIMIT', 2):
+            self.assertEqual(EstimatedCountPaginator(Product.objects.filter(is_active=True), 10).count, 2)
+
+
+class TestAnalytics(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='user', password='password')
+        self.client.force_login(self.user)
+        self.products = create_products(3)
+
+    def test_summary_for_every_dimension(self):
+        analytics = get_analytics()
+        self.assertEqual(analytics['total']['products'], 3)
+        self.assertEqual(analytics['total']['units'], 15)
+        self.assertEqual(analytics['total']['stock_value'], 15000)
+        self.assertEqual(len(analytics['manufacturer']), 3)
+        self.assertEqual(
+            [(row['name'], row['products'], row['discounted_value']) for row in analytics['category']],
+            [('Ноутбуки', 3, 14500)]
+        )
+
+        # повторно -- из кэша, после изменения товара -- заново
+        with self.assertNumQueries(0):
+            get_analytics()
+        adjust_stock({self.products[0].pk: 5})
+        self.assertEqual(get_analytics()['total']['units'], 20)
+
+    def test_dashboard_and_api(self):
+        product = self.products[1]
+        response = self.client.get(reverse('store:selection_manufacturer'), {
+            'dimension': 'manufacturer', 'sort': 'units', 'id': product.manufacturer_id
+        })
+        self.assertEqual(len(response.context['rows']), 3)
+        self.assertEqual([p.pk for p in response.context['page_obj']], [product.pk])
+
+        data = self.client.get(reverse('store:analytics')).json()
+        self.assertEqual(data['total']['products'], 3)
+        self.assertEqual(len(data['product_type']), 1)
+
+
+class TestRequestMetrics(TestCase):
+
+    def setUp(self):
+        flush_metrics()
+        cache.clear()
+        create_products(3)
+        self.user = User.objects.create_user(username='user', password='password')
+        self.staff = User.objects.create_user(username='staff', password='password', is_staff=True)
+
+    def test_server_timing_for_staff_only(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('store:product_all'))
+        self.assertNotIn('Server-Timing', response)
+
+        self.client.force_login(self.staff)
+        response = self.client.get(reverse('store:product_all'))
+        self.assertRegex(response['Server-Timing'], r'^sql;dur=[\d.]+;desc="\d+ SQL", tpl;dur=[\d.]+, total;dur=[\d.]+$')
+
+    def test_stats_page(self):
+        self.client.force_login(self.user)
+        self.client.get(reverse('store:product_all'))
+        self.assertEqual(self.client.get(reverse('store:metrics')).status_code, 302)
+
+        self.client.force_login(self.staff)
+        response = self.client.get(reverse('store:metrics'))
+        stats = {row['name']: row for row in response.context['stats']}
+        self.assertEqual(stats['store:product_all']['requests'], 1)
+        self.assertIsNotNone(stats['store:product_all']['metrics']['total']['percentiles'][0])
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class TestProductImages(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='user', password='password')
+        self.client.force_login(self.user)
+        self.product = create_products(1)[0]
+
+    def tearDown(self):
+        shutil.rmtree(settings.MEDIA_ROOT, ignore_errors=True)
+
+    def upload(self, width, height):
+        buffer = io.BytesIO()
+        PILImage.new('RGB', (width, height), 'red').save(buffer, 'PNG')
+        return SimpleUploadedFile('photo.png', buffer.getvalue(), content_type='image/png')
+
+    def test_renditions_and_thumbnail(self):
+        image = ProductImage.objects.create(
+            product=self.product, image=self.upload(1000, 500), main_image=True
+        )
+        self.assertFalse(image.has_renditions)
+        self.assertEqual(run_next_task().status, Task.DONE)
+        image.refresh_from_db()
+
+        self.assertTrue(image.has_renditions)
+        self.assertEqual([width for width, name in image.renditions['webp']], [160, 480, 960, 1000])
+        self.assertIn(image.renditions['hash'], image.thumbnail)
+        self.assertTrue(image.thumbnail.endswith('-160.jpeg'))
+
+        response = self.client.get(reverse('store:product_all'))
+        self.assertContains(response, 'src="%s%s"' % (settings.MEDIA_URL, image.thumbnail))
+
+        response = self.client.get(self.product.get_absolute_url())
+        self.assertContains(response, '-960.webp 960w')
+        self.assertContains(response, 'href="%s"' % image.image.url)
+
+
+class TestAsyncCatalogViews(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.products = create_products(12)
+        self.staff = User.objects.create_user(username='staff', password='password', is_staff=True)
+        self.async_client.force_login(self.staff)
+
+    async def test_list_and_detail_under_asgi(self):
+        response = await self.async_client.get(reverse('store:product_all'))
+        self.assertEqual(len(response.context['page_obj']), 10)
+        self.assertTrue(response.context['page_obj'].has_next())
+        self.assertIn('Server-Timing', response)
+
+        next_page = await self.async_client.get(
+            reverse('store:product_all'), {'cursor': response.context['page_obj'].next_cursor}
+        )
+        self.assertEqual(len(next_page.context['page_obj']), 2)
+
+        product = self.products[0]
+        response = await self.async_client.get(product.get_absolute_url())
+        self.assertEqual(response.context['product'], product)
+        self.assertEqual(response.context['images'], [])
+
+        response = await self.async_client.get(reverse('store:product_detail', args=['missing']))
+        self.assertEqual(response.status_code, 404)
+
+    async def test_login_required(self):
+        response = await AsyncClient().get(reverse('store:discount_search'))
+        self.assertEqual(response.status_code, 302)
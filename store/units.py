@@ -0,0 +1,75 @@
+import re
+from decimal import Decimal, InvalidOperation
+
+# единица -> (базовая единица, множитель к базовой)
+UNITS = {
+    'кб': ('байт', Decimal(1024)),
+    'kb': ('байт', Decimal(1024)),
+    'мб': ('байт', Decimal(1024 ** 2)),
+    'mb': ('байт', Decimal(1024 ** 2)),
+    'гб': ('байт', Decimal(1024 ** 3)),
+    'gb': ('байт', Decimal(1024 ** 3)),
+    'тб': ('байт', Decimal(1024 ** 4)),
+    'tb': ('байт', Decimal(1024 ** 4)),
+    'гц': ('гц', Decimal(1)),
+    'hz': ('гц', Decimal(1)),
+    'кгц': ('гц', Decimal(10 ** 3)),
+    'khz': ('гц', Decimal(10 ** 3)),
+    'мгц': ('гц', Decimal(10 ** 6)),
+    'mhz': ('гц', Decimal(10 ** 6)),
+    'ггц': ('гц', Decimal(10 ** 9)),
+    'ghz': ('гц', Decimal(10 ** 9)),
+    'мм': ('м', Decimal('0.001')),
+    'mm': ('м', Decimal('0.001')),
+    'см': ('м', Decimal('0.01')),
+    'cm': ('м', Decimal('0.01')),
+    'м': ('м', Decimal(1)),
+    'm': ('м', Decimal(1)),
+    'дюйм': ('м', Decimal('0.0254')),
+    'дюйма': ('м', Decimal('0.0254')),
+    'дюймов': ('м', Decimal('0.0254')),
+    '"': ('м', Decimal('0.0254')),
+    'г': ('кг', Decimal('0.001')),
+    'g': ('кг', Decimal('0.001')),
+    'кг': ('кг', Decimal(1)),
+    'kg': ('кг', Decimal(1)),
+    'вт': ('вт', Decimal(1)),
+    'w': ('вт', Decimal(1)),
+    'квт': ('вт', Decimal(1000)),
+    'kw': ('вт', Decimal(1000)),
+    'мач': ('мач', Decimal(1)),
+    'mah': ('мач', Decimal(1)),
+}
+
+NUMBER_RE = re.compile(r'^\s*([-+]?\d+(?:[.,]\d+)?)\s*(.*?)\s*$')
+
+
+def normalise_enum(value):
+    """Значение для точного сравнения: нижний регистр, одиночные пробелы"""
+    return ' '.join(str(value).lower().split())[:255]
+
+
+def parse_number(value, unit=''):
+    """Число из строки вида '16 ГБ', '2,5 ГГц', '15.6"'.
+
+    Если у параметра задана единица измерения unit, число переводится в нее
+    ('1 ТБ' при unit='ГБ' -> 1024). Возвращает None, если строка не начинается
+    с числа или единицы несовместимы.
+    """
+    match = NUMBER_RE.match(str(value))
+    if match is None:
+        return None
+    try:
+        number = Decimal(match.group(1).replace(',', '.'))
+    except InvalidOperation:
+        return None
+
+    value_unit = match.group(2).lower().rstrip('.')
+    unit = unit.lower().rstrip('.')
+    if not value_unit or not unit or value_unit == unit:
+        return number
+
+    source, target = UNITS.get(value_unit), UNITS.get(unit)
+    if source is None or target is None or source[0] != target[0]:
+        return None
+    return (number * source[1] / target[1]).quantize(Decimal('0.000001'))
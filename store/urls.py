@@ -17,5 +17,14 @@ urlpatterns = [
     path('time_product/', views.time_product, name='time_product'),
     path('create_manufacturer/', views.create_manufacturer, name='create_manufacturer'),
     path('selection_manufacturer/', views.selection_manufacturer, name='selection_manufacturer'),
+    path('analytics/', views.analytics_summary, name='analytics'),
     path('discount_search/', views.discount_search, name='discount_search'),
+    path('import_products/', views.import_products, name='import_products'),
+    path('export_products/', views.export_products, name='export_products'),
+    path('stock/batch/', views.stock_batch, name='stock_batch'),
+    path('discount/apply/', views.apply_discount, name='apply_discount'),
+    path('search/', views.search, name='search'),
+    path('metrics/', views.metrics, name='metrics'),
+    path('changes/', views.product_changes, name='product_changes'),
+    path('choices/<str:name>/', views.lazy_choices, name='lazy_choices'),
 ]
@@ -1,73 +1,122 @@
+from asgiref.sync import sync_to_async
 from django.shortcuts import render, get_object_or_404
 from django.shortcuts import redirect
-from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils import timezone
+from django.utils.functional import cached_property
+from django.utils.safestring import mark_safe
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views.decorators.http import require_POST
 from django.contrib.auth.decorators import login_required
-from django.db import connection
+from django.contrib.admin.views.decorators import staff_member_required
+from django.db import transaction
 from django.forms import inlineformset_factory
-from django.db.models import Sum, Avg
-from django.db.models import FloatField
+from django.db.models import F, Q, Sum
 
 from django.views.generic.edit import (
     CreateView, UpdateView
 )
 
-from .models import (Category, Product, ProductTechnicalDataValue)
+from .models import (Category, Product, ProductTechnicalDataValue,
+                     InventoryValuation, Manufacturer, ProductType)
+from . import tasks
+from .analytics import DIMENSIONS, METRICS, get_analytics
+from .choices import LAZY_CHOICES, get_choices_page
+from .changes import (MAX_WAIT, POLL_INTERVAL, can_read_changes, latest_cursor,
+                      read_changes_and_release)
+from .caching import (CATALOG_VERSION, FRAGMENT_TIMEOUT, aget_product_body, aget_versions,
+                      attach_product_rows, bump_product_versions, category_version,
+                      fragment_key)
+from .dbpool import pool_stats
+from .metrics import PERCENTILES, flush_metrics, get_stats
+from .pagination import aget_page, get_page
+from .search import clean_filters, search_products
+from .shortcuts import aget_object_or_404, alogin_required, arender
+from .specs import filter_by_specs, get_spec_filter_options, save_spec_formset
+from .pricing import apply_discount_to
+from .routers import replica_reads
+from .stock import RECENT, adjust_stock, products_by_age, staleness_histogram
 from .forms import (AddProductForm, EditProductForm, 
                     ProductForm, TechnicalDataValueFormSet,
-                    ManufacturerForm, SelectManufacturerForm)
+                    ManufacturerForm,
+                    ProductImportForm, ApplyDiscountForm, TimeWindowForm,
+                    TIME_WINDOW_PRESETS)
+from .bulk import ENCODING, FORMATS, ProductImporter, export_products as export_product_rows, read_rows
 
-import datetime
-from django.utils import timezone
+import asyncio
+import io
+import json
+import time
 
 class ProductInline():
     form_class = ProductForm
     model = Product
     template_name = "store/product_create_or_update.html"
 
+    @cached_property
+    def named_formsets(self):
+        # формсеты создаются один раз на запрос: проверка и вывод
+        # используют одни и те же загруженные варианты
+        return self.get_named_formsets()
+
+    def get_product_type(self):
+        if self.request.method == 'POST':
+            return self.request.POST.get('product_type')
+        return getattr(self.object, 'product_type_id', None)
+
     def form_valid(self, form):
-        named_formsets = self.get_named_formsets()
+        named_formsets = self.named_formsets
         if not all((x.is_valid() for x in named_formsets.values())):
             return self.render_to_response(self.get_context_data(form=form))
 
-        self.object = form.save()
-
-        # for every formset, attempt to find a specific formset save function
-        # otherwise, just save.
-        for name, formset in named_formsets.items():
-            formset_save_func = getattr(self, 'formset_{0}_valid'.format(name), None)
-            if formset_save_func is not None:
-                formset_save_func(formset)
-            else:
-                formset.save()
+        # товар и характеристики сохраняются вместе, фоновые задачи
+        # из сигналов попадают в очередь только после фиксации
+        with transaction.atomic():
+            # товар без изменений не перезаписывается
+            product_saved = form.instance.pk is None or form.has_changed()
+            self.object = form.save() if product_saved else form.instance
+
+            # for every formset, attempt to find a specific formset save function
+            # otherwise, just save.
+            formsets_written = False
+            for name, formset in named_formsets.items():
+                formset_save_func = getattr(self, 'formset_{0}_valid'.format(name), None)
+                if formset_save_func is not None:
+                    formsets_written = formset_save_func(formset) or formsets_written
+                else:
+                    formset.save()
+                    formsets_written = formsets_written or formset.has_changed()
+
+            # изменились только характеристики: время изменения товара
+            # обновляется без перезаписи всей строки
+            if formsets_written and not product_saved:
+                Product.objects.filter(pk=self.object.pk).update(updated_in=timezone.now())
         return redirect('store:product_all')
 
     def formset_variants_valid(self, formset):
-        variants = formset.save(commit=False)  # self.save_formset(formset, contact)
-        # add this 2 lines, if you have can_delete=True parameter 
-        # set in inlineformset_factory func
-        for obj in formset.deleted_objects:
-            obj.delete()
-        for variant in variants:
-            variant.product = self.object
-            variant.save()
+        return any(save_spec_formset(formset, self.object))
 
 class ProductCreate(ProductInline, CreateView):
 
     def get_context_data(self, **kwargs):
         ctx = super(ProductCreate, self).get_context_data(**kwargs)
-        ctx['named_formsets'] = self.get_named_formsets()
+        ctx['named_formsets'] = self.named_formsets
         return ctx
 
     def get_named_formsets(self):
         if self.request.method == "GET":
             return {
-                'variants': TechnicalDataValueFormSet(prefix='variants'),
+                'variants': TechnicalDataValueFormSet(
+                    prefix='variants', product_type=self.get_product_type()
+                ),
             }
         else:
             return {
                 'variants': TechnicalDataValueFormSet(
                     self.request.POST or None, 
-                    self.request.FILES or None, prefix='variants'
+                    self.request.FILES or None, prefix='variants',
+                    product_type=self.get_product_type()
                 ),
             }
 
@@ -75,108 +124,94 @@ class ProductUpdate(ProductInline, UpdateView):
 
     def get_context_data(self, **kwargs):
         ctx = super(ProductUpdate, self).get_context_data(**kwargs)
-        ctx['named_formsets'] = self.get_named_formsets()
+        ctx['named_formsets'] = self.named_formsets
         return ctx
 
     def get_named_formsets(self):
         return {
             'variants': TechnicalDataValueFormSet(
                 self.request.POST or None, 
-                self.request.FILES or None, instance=self.object, prefix='variants'
+                self.request.FILES or None, instance=self.object, prefix='variants',
+                product_type=self.get_product_type()
             ),
         }
 
 
-@login_required
 # функция для отображения всех товаров
-def product_all(request):
-    products = Product.products.all()
-
-    paginator = Paginator(products, 10)
-    page_number = request.GET.get('page', 1)
-
-    try:
-        page_obj = paginator.page(page_number)
-    except PageNotAnInteger:
-        page_obj = paginator.page(1)
-    except EmptyPage:
-        page_obj = paginator.page(paginator.num_pages)
+@alogin_required
+async def product_all(request):
+    products = await sync_to_async(filter_by_specs)(Product.products.for_listing(), request.GET)
+    page_obj = await aget_page(request, products)
+    # строки таблицы -- из кэша фрагментов
+    await sync_to_async(attach_product_rows)(page_obj)
 
     context = {
         'page_obj': page_obj
     }
 
-    return render(request, 'store/index.html', context)
+    return await arender(request, 'store/index.html', context)
 
 # функция для отображения страницы товара
-@login_required
-def product_detail(request, slug):
-    product = get_object_or_404(Product, slug=slug)
-
-    # Получение характеристик товара и их значений 
-    # вызывая функцию sql
-    id_product = product.pk
-
-    c = connection.cursor()
-    try:
-        c.callproc('data_value_product', (id_product,))
-        data_value = c.fetchall()
-    finally:
-        c.close()
+@alogin_required
+async def product_detail(request, slug):
+    product = await aget_object_or_404(
+        Product.objects.select_related(
+            'manufacturer', 'product_type', 'category', 'discount'
+        ),
+        slug=slug
+    )
 
     up_count = request.POST.get("count_up", '')
     down_count = request.POST.get('count_down', '')
 
-    if up_count != '':
-        product.count += int(up_count)
-
-        product.save()
-
-        if down_count == '':
-
-            return redirect(product.get_absolute_url())
-
-
-    if down_count != '':
-
-        if int(down_count) > product.count:
-            product.count = 0
-        else:
-            product.count -= int(down_count)
-
-        product.save()
+    if up_count != '' or down_count != '':
+        delta = int(up_count or 0) - int(down_count or 0)
+        await sync_to_async(adjust_stock)(
+            {product.pk: delta}, user=request.user,
+            reason='Изменение на странице товара'
+        )
 
         return redirect(product.get_absolute_url())
 
+    # описание и изображения товара -- из кэша фрагментов
+    body = await aget_product_body(product)
+
     context = {
         'product': product,
-        'data_value': data_value
+        'body': body
     }
 
-    return render(request, 'store/product_single.html', context)
+    return await arender(request, 'store/product_single.html', context)
 
 # функция для отображения товара по категориям
-@login_required
-def category_list(request, category_slug):
-    category = get_object_or_404(Category, slug=category_slug, is_active=True)
-    products = Product.products.filter(category=category)
-
-    paginator = Paginator(products, 10)
-    page_number = request.GET.get('page', 1)
-
-    try:
-        page_obj = paginator.page(page_number)
-    except PageNotAnInteger:
-        page_obj = paginator.page(1)
-    except EmptyPage:
-        page_obj = paginator.page(paginator.num_pages)
+@alogin_required
+async def category_list(request, category_slug):
+    category = await aget_object_or_404(Category.objects, slug=category_slug, is_active=True)
+
+    # содержимое страницы (фильтры и таблица) -- из кэша фрагментов,
+    # ключ зависит от версии категории и параметров запроса
+    versions = await aget_versions([CATALOG_VERSION, category_version(category.pk)])
+    key = fragment_key('category', versions, request.GET.urlencode())
+    content = await cache.aget(key)
+    if content is None:
+        products = Product.products.for_listing().filter(category=category)
+        spec_filters = await sync_to_async(get_spec_filter_options)(products)
+        filtered = await sync_to_async(filter_by_specs)(products, request.GET)
+        page_obj = await aget_page(request, filtered)
+        await sync_to_async(attach_product_rows)(page_obj)
+        content = await sync_to_async(render_to_string)('store/includes/category_content.html', {
+            'category': category,
+            'page_obj': page_obj,
+            'spec_filters': spec_filters
+        })
+        await cache.aset(key, content, FRAGMENT_TIMEOUT)
 
     context = {
         'category': category, 
-        'page_obj': page_obj
+        'content': mark_safe(content)
     }
 
-    return render(request, 'store/category.html', context)
+    return await arender(request, 'store/category.html', context)
 
 # функция для добавления товара
 @login_required
@@ -242,12 +277,10 @@ def delete_product(request, id):
 
     product = get_object_or_404(Product, id=id)
 
-    c = connection.cursor()
-    try:
-        # c.callproc('del_product', [product.pk,])
-        c.execute("CALL del_product(%s::int)", (product.pk,))
-    finally:
-        c.close()
+    # товар сразу скрывается из каталога, а del_product вызывается в фоне
+    Product.objects.filter(pk=product.pk).update(is_active=False)
+    bump_product_versions([product.pk], [product.category_id])
+    tasks.delete_product.enqueue(product.pk)
 
     # product.delete()
 
@@ -255,94 +288,67 @@ def delete_product(request, id):
 
 # функция для получения о общем количестве товара и на какую сумму
 @login_required
+@replica_reads
 def sum_count(request):
 
-    # общее количество товара
-    total_count = Product.objects.aggregate(Sum('count')) 
-
-    total_price = 0
-
-    c = connection.cursor()
-    try:
-        c.execute("CALL sum_count_price()")
-        total_price = c.fetchall()
-    finally:
-        c.close()
-
-    c = connection.cursor()
-    try:
-        c.execute("SELECT * FROM sum_price_view")
-        products_view = c.fetchall()
-    finally:
-        c.close()
-
-    paginator = Paginator(products_view, 10)
-    page_number = request.GET.get('page', 1)
-
-    try:
-        page_obj = paginator.page(page_number)
-    except PageNotAnInteger:
-        page_obj = paginator.page(1)
-    except EmptyPage:
-        page_obj = paginator.page(paginator.num_pages)
+    # общие суммы складываются из строк производителей в сводке,
+    # которую поддерживает триггер (code.sql)
+    valuation = InventoryValuation.objects.filter(
+        scope=InventoryValuation.MANUFACTURER
+    ).aggregate(total_count=Sum('total_count'), total_price=Sum('total_price'))
+
+    # разбивка по производителям и типам товара (по наибольшей сумме)
+    rollups = {}
+    for scope, model in ((InventoryValuation.MANUFACTURER, Manufacturer),
+                         (InventoryValuation.PRODUCT_TYPE, ProductType)):
+        rows = list(InventoryValuation.objects.filter(
+            scope=scope, products_count__gt=0
+        ).order_by('-total_price')[:10])
+        names = model.objects.in_bulk([row.scope_id for row in rows])
+        for row in rows:
+            row.name = names.get(row.scope_id)
+        rollups[scope] = rows
+
+    # строки сводки выбираются постранично в самой БД
+    products = Product.objects.for_listing().annotate(
+        count_price=F('price') * F('count')
+    )
+    page_obj = get_page(request, products, cursor=True)
 
     context = {
         'page_obj': page_obj,
-        'total_price': total_price,
-        'total_count': total_count,
-        'products_view': products_view
+        'valuation': valuation,
+        'manufacturer_rollup': rollups[InventoryValuation.MANUFACTURER],
+        'product_type_rollup': rollups[InventoryValuation.PRODUCT_TYPE],
     }
 
     return render(request, 'store/sum_count.html', context)
 
 # функция для выборки товара по времени
 @login_required
+@replica_reads
 def time_product(request):
 
-    time = request.POST.get("lr_action", None)
-
-    if time != '':
+    form = TimeWindowForm(request.GET or None)
 
-        time_now = timezone.now()
-
-        if time == 'one':
-            time_now -= datetime.timedelta(weeks=52)
-
-            products = Product.objects.all().exclude(updated_in__gte = time_now)
-
-        elif time == 'two':
-            time_now -= datetime.timedelta(minutes=10)
-
-            # вывод товара за последние 10 минут
-            # products = Product.objects.all().filter(updated_in__gte = time_now)
-
-            # весь товар не за последние 10 минут
-            products = Product.objects.all().exclude(updated_in__gte = time_now)
-
-        elif time == 'tree':
-            time_now -= datetime.timedelta(days=1)
-
-            products = Product.objects.all().exclude(updated_in__gte = time_now)
-
-    if 'products' in dir():
-
-        paginator = Paginator(products, 10)
-        page_number = request.GET.get('page', 1)
-
-        try:
-            page_obj = paginator.page(page_number)
-        except PageNotAnInteger:
-            page_obj = paginator.page(1)
-        except EmptyPage:
-            page_obj = paginator.page(paginator.num_pages)
-
-        context = {
-            'page_obj': page_obj
-        }
-
-    else:
+    context = {
+        'form': form,
+        'presets': TIME_WINDOW_PRESETS,
+        # сколько товара не обновлялось 0, 1, ... 30 и больше дней
+        'histogram': staleness_histogram()
+    }
 
-        context = {}
+    if form.is_valid():
+        direction = form.cleaned_data['direction']
+        products = products_by_age(
+            form.cleaned_data['window'], direction, Product.objects.for_listing()
+        )
+        # давно не обновлявшийся товар -- начиная с самого старого,
+        # недавно обновленный -- начиная с самого свежего
+        context['page_obj'] = get_page(
+            request, products, cursor=True,
+            field='updated_in', descending=direction == RECENT
+        )
 
     return render(request, 'store/time_product.html', context)
 
@@ -355,11 +361,7 @@ def create_manufacturer(request):
         name = request.POST.get('name')
         country = request.POST.get('country')
 
-        c = connection.cursor()
-        try:
-            c.execute("CALL create_manufacturer(%s, %s)", (name, country))
-        finally:
-            c.close()
+        tasks.create_manufacturer.enqueue(name, country)
 
         return redirect('store:product_all')
 
@@ -373,101 +375,249 @@ def create_manufacturer(request):
 
     return render(request, 'store/create_manufacturer.html', context)
 
-# функция для выборки товара по производителю
+# функция для сравнения производителей, категорий и типов товара
+# GET ?dimension=manufacturer|category|product_type&sort=<показатель>&id=<строка, товар которой показать>
 @login_required
+@replica_reads
 def selection_manufacturer(request):
 
-    selectform = SelectManufacturerForm()
+    analytics = get_analytics()
+
+    dimension = request.GET.get('dimension')
+    if dimension not in DIMENSIONS:
+        dimension = 'manufacturer'
+    sort = request.GET.get('sort')
+    if sort not in METRICS:
+        sort = 'stock_value'
+
+    # строки сводки общие для всех запросов (из кэша), поэтому копируются
+    top = max((row['stock_value'] for row in analytics[dimension]), default=0)
+    rows = sorted(
+        (dict(row, share=round(row['stock_value'] * 100 / top) if top else 0)
+         for row in analytics[dimension]),
+        key=lambda row: row[sort] or 0, reverse=True
+    )
 
-    manufacture_id = request.POST.get("manufacturer", None)
+    selected = next((row for row in rows if str(row['id']) == request.GET.get('id')), None)
+    page_obj = None
+    if selected is not None:
+        products = Product.products.for_listing().filter(**{DIMENSIONS[dimension][0]: selected['id']})
+        page_obj = get_page(request, products, cursor=True)
 
-    check = request.POST.get('check-box', None)
+    context = {
+        'total': analytics['total'],
+        'rows': rows,
+        'dimension': dimension,
+        'sort': sort,
+        'selected': selected,
+        'page_obj': page_obj,
+    }
 
-    if manufacture_id != '':
+    return render(request, 'store/selection_manafacturer.html', context)
 
-        products = Product.objects.all().filter(manufacturer = manufacture_id)
+# функция со сводкой по производителям, категориям и типам товара в JSON
+@login_required
+@replica_reads
+def analytics_summary(request):
 
-        if check == 'check':
+    return JsonResponse(get_analytics())
 
-            total_count = Product.objects.filter(
-                manufacturer = manufacture_id).aggregate(sum = Sum('count')
-            )
+# функция для отображения товара со скидкой и без
+@alogin_required
+async def discount_search(request):
+
+    products = await sync_to_async(filter_by_specs)(Product.objects.for_listing(), request.GET)
+    page_obj = await aget_page(request, products)
+
+    context = {
+        'page_obj': page_obj,
+    }
 
-            avg_price = Product.objects.filter(
-                manufacturer = manufacture_id).aggregate(avg = Avg('price', 
-                output_field=FloatField())
+    return await arender(request, 'store/discount_search.html', context)
+
+# функция для загрузки товара из файла
+@login_required
+def import_products(request):
+
+    result = None
+
+    if request.method == 'POST':
+        import_form = ProductImportForm(request.POST, request.FILES)
+        if import_form.is_valid():
+            stream = io.TextIOWrapper(
+                import_form.cleaned_data['file'], encoding=ENCODING, newline=''
+            )
+            result = ProductImporter().run(
+                read_rows(stream, import_form.cleaned_data['file_format'])
             )
+    else:
+        import_form = ProductImportForm()
 
-            c = connection.cursor()
-            try:
-                c.execute("CALL sum_count_price_manufactur(%s)", (manufacture_id,))
-                total_price = c.fetchall()
-            finally:
-                c.close()
+    context = {
+        'import_form': import_form,
+        'result': result
+    }
 
-    if 'products' in dir() and 'total_count' in dir():
+    return render(request, 'store/product_import.html', context)
 
-        paginator = Paginator(products, 10)
-        page_number = request.GET.get('page', 1)
+# функция для выгрузки товара в файл
+@login_required
+def export_products(request):
 
-        try:
-            page_obj = paginator.page(page_number)
-        except PageNotAnInteger:
-            page_obj = paginator.page(1)
-        except EmptyPage:
-            page_obj = paginator.page(paginator.num_pages)
+    file_format = request.GET.get('format', 'csv')
+    if file_format not in FORMATS:
+        file_format = 'csv'
 
-        context = {
-            'page_obj': page_obj,
-            'selectform': selectform,
-            'total_count': total_count,
-            'total_price': total_price,
-            'avg_price': avg_price
-        }
+    content_type = 'text/csv' if file_format == 'csv' else 'application/x-ndjson'
+    response = StreamingHttpResponse(
+        export_product_rows(file_format), content_type=f'{content_type}; charset=utf-8'
+    )
+    response['Content-Disposition'] = f'attachment; filename="products.{file_format}"'
 
-    elif 'products' in dir():
+    return response
 
-        paginator = Paginator(products, 10)
-        page_number = request.GET.get('page', 1)
+# функция для пакетного изменения количества товара (например, со сканера склада)
+# тело запроса: {"reason": "...", "adjustments": [{"product": id или slug, "delta": 5}, ...]}
+@login_required
+@require_POST
+def stock_batch(request):
 
-        try:
-            page_obj = paginator.page(page_number)
-        except PageNotAnInteger:
-            page_obj = paginator.page(1)
-        except EmptyPage:
-            page_obj = paginator.page(paginator.num_pages)
+    try:
+        data = json.loads(request.body)
+        items = [(item['product'], int(item['delta'])) for item in data['adjustments']]
+        # товар указывается числом (id) или строкой (slug)
+        if not all(isinstance(key, (int, str)) and not isinstance(key, bool) for key, delta in items):
+            raise TypeError
+    except (ValueError, KeyError, TypeError):
+        return JsonResponse({'error': 'Некорректный формат запроса'}, status=400)
+
+    # товар можно указать по id или по slug, существующий товар
+    # находится одним запросом по обоим
+    pks = {key for key, delta in items if isinstance(key, int)}
+    slugs = {key for key, delta in items if not isinstance(key, int)}
+    found = Product.objects.filter(Q(pk__in=pks) | Q(slug__in=slugs)).values_list('pk', 'slug')
+    ids = {}
+    for pk, slug in found:
+        ids[pk] = ids[slug] = pk
+
+    adjustments = {}
+    missing = []
+    for key, delta in items:
+        pk = ids.get(key)
+        if pk is None:
+            missing.append(key)
+            continue
+        adjustments[pk] = adjustments.get(pk, 0) + delta
+
+    counts = adjust_stock(adjustments, user=request.user, reason=data.get('reason', ''))
+
+    return JsonResponse({'counts': counts, 'missing': missing})
+
+# функция для назначения скидки товару категории и (или) производителя
+@login_required
+def apply_discount(request):
 
-        context = {
-            'page_obj': page_obj,
-            'selectform': selectform,
-        }
+    updated = None
 
+    if request.method == 'POST':
+        discount_form = ApplyDiscountForm(request.POST)
+        if discount_form.is_valid():
+            updated = apply_discount_to(
+                discount_form.cleaned_data['discount'],
+                category=discount_form.cleaned_data['category'],
+                manufacturer=discount_form.cleaned_data['manufacturer'],
+            )
     else:
+        discount_form = ApplyDiscountForm()
 
-        context = {
-            'selectform': selectform
-        }
+    context = {
+        'discount_form': discount_form,
+        'updated': updated
+    }
 
-    return render(request, 'store/selection_manafacturer.html', context)
+    return render(request, 'store/apply_discount.html', context)
 
-# функция для отображения товара со скидкой и без
+# функция для поиска товара по названию, описанию и характеристикам
 @login_required
-def discount_search(request):
+def search(request):
 
-    products = Product.objects.all()
-        
-    paginator = Paginator(products, 10)
-    page_number = request.GET.get('page', 1)
+    query = request.GET.get('q', '').strip()
+    filters = clean_filters(request.GET)
 
-    try:
-        page_obj = paginator.page(page_number)
-    except PageNotAnInteger:
-        page_obj = paginator.page(1)
-    except EmptyPage:
-        page_obj = paginator.page(paginator.num_pages)
+    context = {
+        'query': query,
+        'filters': filters
+    }
+
+    if query:
+        products, facets = search_products(query, filters)
+        page_obj = get_page(request, products.for_listing())
+
+        # ссылки фасетов: текущий запрос с выбранным (или снятым) значением
+        for name, items in facets.items():
+            for item in items:
+                params = request.GET.copy()
+                params.pop('page', None)
+                selected = str(item['value']) == filters[name]
+                if selected:
+                    params.pop(name, None)
+                else:
+                    params[name] = item['value']
+                item['selected'] = selected
+                item['url'] = '?' + params.urlencode()
+
+        context.update({
+            'page_obj': page_obj,
+            'facets': facets
+        })
+
+    return render(request, 'store/search.html', context)
+
+# функция для просмотра замеров запросов по страницам (только для сотрудников)
+@staff_member_required
+def metrics(request):
+
+    flush_metrics()
 
     context = {
-        'page_obj': page_obj,
+        'stats': get_stats(),
+        'percentiles': PERCENTILES,
+        'pools': pool_stats()
     }
 
-    return render(request, 'store/discount_search.html', context)
\ No newline at end of file
+    return render(request, 'store/metrics.html', context)
+
+# функция для чтения журнала изменений товара внешними системами (долгий опрос)
+# GET ?cursor=<курсор из прошлого ответа>&limit=500&wait=25
+# ответ: {"events": [...], "cursor": "..."}, пустой список -- за wait секунд изменений не было
+async def product_changes(request):
+
+    if not await sync_to_async(can_read_changes)(request):
+        return JsonResponse({'error': 'Нет доступа'}, status=403)
+
+    cursor = request.GET.get('cursor', '')
+    try:
+        limit = int(request.GET.get('limit', 500))
+        wait = min(max(float(request.GET.get('wait', 25)), 0), MAX_WAIT)
+        if cursor == 'latest':
+            cursor = await sync_to_async(latest_cursor)()
+        events, cursor = await sync_to_async(read_changes_and_release)(cursor, limit)
+    except ValueError as error:
+        return JsonResponse({'error': str(error)}, status=400)
+
+    deadline = time.monotonic() + wait
+    while not events and time.monotonic() < deadline:
+        await asyncio.sleep(POLL_INTERVAL)
+        events, cursor = await sync_to_async(read_changes_and_release)(cursor, limit)
+
+    return JsonResponse({'events': events, 'cursor': cursor})
+
+# функция для подгрузки вариантов больших списков выбора (производитель, параметры)
+# GET ?q=<поиск>&page=1[&product_type=<id>], ответ: {"results": [{"id", "text"}], "more": true}
+@login_required
+def lazy_choices(request, name):
+
+    if name not in LAZY_CHOICES:
+        return JsonResponse({'error': 'Неизвестный список'}, status=404)
+
+    return JsonResponse(get_choices_page(name, request.GET))